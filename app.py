@@ -16,8 +16,10 @@ st.set_page_config(
     layout="centered",
 )
 
-from mahjong import auth, session  # noqa: E402 - set_page_config より後に読む必要がある
+from mahjong import auth, repo, session  # noqa: E402 - set_page_config より後に読む必要がある
 
+# 前回の実行で読んだデータを持ち越さない（他の人の書き込みが見えなくなるため）
+repo.begin_run()
 auth.require_login()
 
 groups = session.my_groups()
@@ -20,7 +20,7 @@ from typing import Any
 
 import streamlit as st
 
-from .db import ConfigError, get_client, reset_client
+from .db import ConfigError, get_client, get_config, has_client, reset_client
 from .errors import is_network_error, describe
 
 # Cookie 名と保持期間。長すぎるとトークン流出時の危険が増すため2週間にする。
@@ -152,6 +152,11 @@ def current_user() -> dict[str, Any] | None:
     クライアントはブラウザセッション専用（db.get_client 参照）なので、
     ここで得られるセッションは必ず「この画面を見ている本人」のもの。
     """
+    if not (st.session_state.get("auth_user") or has_client() or _read_token()):
+        # 初めての訪問者。ログイン画面を出すだけなら通信部品を読み込まずに済む。
+        # 設定の誤りはここで知らせる（ログインを押すまで気づけないのは不親切）。
+        get_config()
+        return None
     client = get_client()
 
     if st.session_state.get("auth_user"):
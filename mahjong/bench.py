@@ -0,0 +1,264 @@
+"""手元で測るためのベンチマーク。通信はしない。
+
+    python -m mahjong.bench clients [--sessions 200]
+    python -m mahjong.bench imports [--check] [--budget-ms 150]
+    python -m mahjong.bench aggregate [--entries 100000] [--players 40]
+
+clients:
+    ブラウザセッション1つぶんのクライアントを作る時間と、作ったあと手元に残るメモリを
+    `supabase.create_client()`（旧実装）と `db.DataClient` で比べる。
+    大会の夜は 8〜16 台のスマホが同じ1台のアプリサーバーにつながるので、
+    セッションごとのコストがそのまま台数倍になる。
+
+imports:
+    `mahjong.*` の各モジュールと `views/*.py` の各画面について、streamlit を読んだあと
+    追加で何ミリ秒かかり、どの重い部品（pandas・altair・supabase の通信部品）を
+    読み込んだかを、1つずつ新しいプロセスで測る。デプロイや台数の増減で
+    プロセスが立ち上がるたびに、最初のログイン画面が出るまでこれだけ待たされる。
+    --check を付けると、予算（既定 150ms）を超えたものや、読んではいけない重い部品を
+    読んだものがあれば終了コード 1 で終わる。
+
+aggregate:
+    グループ通算の順位表（`stats.aggregate()`）を、乱数で作った記録で
+    `stats.tally()`（1行ずつ数える）と `columnar.tally()`（NumPy の列持ち）で比べる。
+    列持ちは「RoundEntry から配列を作る」ぶんと「数える」ぶんを分けて出す。
+    成績画面の調子の推移（`columnar.form()`、全員・全窓）にかかる時間も並べる。
+
+数字はマシンによって変わるので、同じマシンで「前」と「後」を並べて見ること。
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import gc
+import json
+import pkgutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from . import db
+
+_URL = "https://bench.supabase.co"
+_KEY = "sb_publishable_bench"
+
+
+def _full_client() -> Any:
+    from supabase import ClientOptions, create_client
+
+    return create_client(
+        _URL,
+        _KEY,
+        options=ClientOptions(
+            auto_refresh_token=False, persist_session=True, httpx_client=db._shared_http()
+        ),
+    )
+
+
+def _data_client() -> Any:
+    return db.DataClient(_URL, _KEY, db._shared_http())
+
+
+def measure(make: Callable[[], Any], sessions: int) -> tuple[float, float]:
+    """(1セッションあたりの作成時間 ms, 1セッションあたりに残るメモリ KiB)。"""
+    make()  # import と共有の接続プールの初期化を測定から外す
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    kept = [make() for _ in range(sessions)]
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed / sessions * 1000, (after - before) / sessions / 1024
+
+
+def clients(sessions: int) -> None:
+    print(f"セッション {sessions} 個ぶん（1個あたり）")
+    print(f"  {'':24}  作成時間  残るメモリ")
+    for label, make in (
+        ("supabase.create_client", _full_client),
+        ("db.DataClient", _data_client),
+    ):
+        ms, kib = measure(make, sessions)
+        print(f"  {label:24}{ms:>8.2f}ms{kib:>9.1f}KiB")
+
+
+# --- 起動時の import ---
+
+ROOT = Path(__file__).resolve().parent.parent
+VIEWS_DIR = ROOT / "views"
+
+# 1つの読み込みにかかってよい時間（streamlit 本体の分は除く）
+IMPORT_BUDGET_MS = 150.0
+
+# 重い部品。起動時には読まず、必要になった画面・処理で初めて読む。
+HEAVY_MODULES = ("pandas", "altair", "numpy", "pyarrow", "postgrest", "supabase_auth", "supabase")
+
+# 起動時には読まれず、使う処理の中で初めて読むモジュール（中身が重い部品そのもの）
+_ON_DEMAND = ("mahjong.bench", "mahjong.columnar")
+
+_PROBE = """
+import json, sys, time
+import streamlit
+before = set(sys.modules)
+started = time.perf_counter()
+exec(compile(sys.argv[1], "<imports>", "exec"), {})
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps([elapsed, sorted({m.split(".")[0] for m in set(sys.modules) - before})]))
+"""
+
+
+@dataclass(frozen=True)
+class ImportCost:
+    target: str
+    ms: float
+    heavy: tuple[str, ...]
+
+    def violations(self, budget_ms: float) -> list[str]:
+        found = []
+        if self.ms > budget_ms:
+            found.append(f"{self.ms:.0f}ms > {budget_ms:.0f}ms")
+        if self.heavy:
+            found.append("読み込んではいけない: " + ", ".join(self.heavy))
+        return found
+
+
+def import_targets() -> dict[str, str]:
+    """測るもの → それを読み込む Python 文。"""
+    import mahjong
+
+    targets = {}
+    for info in pkgutil.walk_packages(mahjong.__path__, "mahjong."):
+        if info.name not in _ON_DEMAND:
+            targets[info.name] = f"import {info.name}"
+    for path in sorted(VIEWS_DIR.glob("*.py")):
+        targets[f"views/{path.name}"] = "\n".join(ast.unparse(node) for node in _leading_imports(path))
+    return targets
+
+
+def _leading_imports(path: Path) -> list[ast.stmt]:
+    """画面の先頭の import 文。
+
+    画面はスクリプトなので実行はせず、最初に何かを描くまでに読む分だけを取り出す。
+    グラフの直前で読む pandas / altair のように、途中の import は数えない。
+    """
+    imports = []
+    for node in ast.parse(path.read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.ImportFrom) and node.module == "__future__":
+            continue  # 連結して流すので、先頭以外に来ると構文エラーになる
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(node)
+        elif not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant)):
+            break  # docstring 以外の最初の文
+    return imports
+
+
+def measure_import(statements: str, repeat: int = 3) -> tuple[float, tuple[str, ...]]:
+    """新しいプロセスで statements を流し、(最短の ms, 読み込んだ重い部品)。"""
+    best, heavy = float("inf"), ()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE, statements],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        ms, loaded = json.loads(out.strip().splitlines()[-1])
+        best = min(best, ms)
+        heavy = tuple(m for m in HEAVY_MODULES if m in loaded)
+    return best, heavy
+
+
+def import_costs(repeat: int = 3) -> list[ImportCost]:
+    return [
+        ImportCost(target, *measure_import(statements, repeat))
+        for target, statements in import_targets().items()
+    ]
+
+
+def imports(check: bool, budget_ms: float, repeat: int) -> int:
+    failed = 0
+    print(f"streamlit を読んだあとの追加分（{repeat} 回の最短、予算 {budget_ms:.0f}ms）")
+    for cost in import_costs(repeat):
+        problems = cost.violations(budget_ms)
+        failed += bool(problems)
+        heavy = ", ".join(cost.heavy) or "-"
+        mark = "  ← " + " / ".join(problems) if problems else ""
+        print(f"  {cost.target:28}{cost.ms:>7.0f}ms  重い部品: {heavy}{mark}")
+    return 1 if check and failed else 0
+
+
+# --- 成績の集計 ---
+
+
+def _random_entries(count: int, players: int) -> list[Any]:
+    import random
+
+    from .stats import RoundEntry
+
+    rng = random.Random(0)
+    entries = []
+    for _ in range(count // 4):
+        seated = rng.sample(range(players), 4)
+        for rank, pid in enumerate(seated, start=1):
+            entries.append(
+                RoundEntry(f"p{pid}", rank, rng.randint(-80, 80), rng.random() < 0.05, 4, "東南西北"[rank - 1])
+            )
+    return entries
+
+
+def _best_ms(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def aggregate(count: int, players: int, repeat: int) -> None:
+    from . import columnar, stats
+
+    entries = _random_entries(count, players)
+    columns = columnar.EntryColumns.from_entries(entries)
+    assert stats.tally(entries, 4) == columnar.tally(columns, 4)
+    print(f"記録 {len(entries):,} 行・{players} 人（{repeat} 回の最短）")
+    for label, fn in (
+        ("stats.tally", lambda: stats.tally(entries, 4)),
+        ("EntryColumns.from_entries", lambda: columnar.EntryColumns.from_entries(entries)),
+        ("columnar.tally", lambda: columnar.tally(columns, 4)),
+        ("columnar.form", lambda: columnar.form(columns, 4)),
+    ):
+        print(f"  {label:28}{_best_ms(fn, repeat):>8.1f}ms")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m mahjong.bench")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sub = commands.add_parser("clients", help="セッションごとのクライアントの作成コスト")
+    sub.add_argument("--sessions", type=int, default=200)
+    sub = commands.add_parser("imports", help="起動時の import にかかる時間と重い部品")
+    sub.add_argument("--check", action="store_true", help="予算超え・重い部品があれば失敗する")
+    sub.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    sub.add_argument("--repeat", type=int, default=3)
+    sub = commands.add_parser("aggregate", help="順位表の集計（1行ずつ／列持ち）")
+    sub.add_argument("--entries", type=int, default=100_000)
+    sub.add_argument("--players", type=int, default=40)
+    sub.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if args.command == "clients":
+        clients(args.sessions)
+    elif args.command == "imports":
+        sys.exit(imports(args.check, args.budget_ms, args.repeat))
+    elif args.command == "aggregate":
+        aggregate(args.entries, args.players, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
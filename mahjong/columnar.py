@@ -0,0 +1,247 @@
+"""成績集計の列持ち（NumPy）版。
+
+`stats.tally()` は記録をプレイヤーごとのリストに振り分け、そのリストを
+ポイント・順位・ラス・飛びと何周も回していた。グループ通算で10万行を超えると
+順位表1つに1秒近くかかる。ここでは記録を列ごとの配列にし、player_id を
+0, 1, 2, ... の番号に置き換えて、`np.bincount` でプレイヤーごとに一度に数える。
+
+結果は `stats.tally()` と同じ `PlayerTally` なので、`stats.from_tallies()` を通せば
+順位表はまったく同じになる（tests/test_stats.py が乱数の記録で突き合わせる）。
+プレイヤーの並びも「記録に初めて出てきた順」で揃えてある。
+
+numpy は読み込みに時間がかかるので、起動時には読まない。`stats.aggregate()` は
+記録の多いときだけここを読み、成績画面は `queries.fetch_entry_columns()` で
+v_round_entries の行から直接この形を作る（グラフのために pandas、つまり numpy を
+どのみち読む画面なので）。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, Sequence
+
+import numpy as np
+
+from .rules import KAZE_NAMES
+from .stats import MAX_SEATS, PlayerTally, RoundEntry
+
+# 風の番号。0 は「記録に風が無い」
+KAZE_CODES = {kaze: code for code, kaze in enumerate(KAZE_NAMES, start=1)}
+
+
+@dataclass(frozen=True)
+class EntryColumns:
+    """`RoundEntry` の並びを列ごとの配列にしたもの。どの配列も同じ長さ。
+
+    Attributes:
+        player_ids: 番号 → player_id（記録に初めて出てきた順）。
+        player: 各行のプレイヤー番号（player_ids の添字）。
+        kaze: 各行の風の番号（`KAZE_CODES`、無ければ 0）。
+    """
+
+    player_ids: tuple[str, ...]
+    player: np.ndarray
+    rank: np.ndarray
+    point: np.ndarray
+    tobi: np.ndarray
+    table_size: np.ndarray
+    kaze: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.player)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[RoundEntry]) -> "EntryColumns":
+        index: dict[str, int] = {}
+        player, rank, point, tobi, size, kaze = [], [], [], [], [], []
+        for e in entries:
+            player.append(index.setdefault(e.player_id, len(index)))
+            rank.append(e.rank)
+            point.append(e.point)
+            tobi.append(e.tobi)
+            size.append(e.table_size)
+            kaze.append(KAZE_CODES.get(e.kaze, 0))
+        return cls(
+            player_ids=tuple(index),
+            player=np.array(player, dtype=np.intp),
+            rank=np.array(rank, dtype=np.int64),
+            point=np.array(point, dtype=np.int64),
+            tobi=np.array(tobi, dtype=bool),
+            table_size=np.array(size, dtype=np.int64),
+            kaze=np.array(kaze, dtype=np.int8),
+        )
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[dict[str, Any]]) -> "EntryColumns":
+        """v_round_entries の行（`queries._PROFILES["stats"]` の列）から直接作る。
+
+        10万行では、行ごとに RoundEntry を作るだけで数百ミリ秒かかっていた。
+        """
+        index: dict[str, int] = {}
+        return cls(
+            player=np.fromiter(
+                (index.setdefault(r["player_id"], len(index)) for r in rows), np.intp, len(rows)
+            ),
+            player_ids=tuple(index),
+            rank=np.fromiter((r["rank"] for r in rows), np.int64, len(rows)),
+            point=np.fromiter((r["point"] for r in rows), np.int64, len(rows)),
+            tobi=np.fromiter((bool(r["tobi"]) for r in rows), bool, len(rows)),
+            table_size=np.fromiter((r.get("table_size") or 0 for r in rows), np.int64, len(rows)),
+            kaze=np.fromiter(
+                (KAZE_CODES.get(r.get("kaze") or "", 0) for r in rows), np.int8, len(rows)
+            ),
+        )
+
+
+def as_columns(entries: Sequence[RoundEntry] | EntryColumns) -> EntryColumns:
+    return entries if isinstance(entries, EntryColumns) else EntryColumns.from_entries(entries)
+
+
+def tally(columns: EntryColumns, player_count: int) -> dict[str, PlayerTally]:
+    """`stats.tally()` と同じものを、配列の演算だけで作る。"""
+    n = len(columns.player_ids)
+    if n == 0:
+        return {}
+    player, rank, point = columns.player, columns.rank, columns.point
+
+    def count(mask: np.ndarray) -> np.ndarray:
+        return np.bincount(player[mask], minlength=n)
+
+    def total(values: np.ndarray) -> np.ndarray:
+        # weights を渡すと float64 で足される。ポイントは 2**53 に遠く届かないので
+        # 丸め直せば整数の和と一致する。
+        return np.rint(np.bincount(player, weights=values, minlength=n)).astype(np.int64)
+
+    games = np.bincount(player, minlength=n)
+    # 想定外の順位（0 や 9）は段には数えず、平均順位には足す（stats.tally() と同じ）
+    valid = (rank >= 1) & (rank <= MAX_SEATS)
+    counts = np.bincount(
+        player[valid] * MAX_SEATS + (rank[valid] - 1), minlength=n * MAX_SEATS
+    ).reshape(n, MAX_SEATS)
+    size = np.where(columns.table_size != 0, columns.table_size, player_count)
+    best = np.full(n, np.iinfo(np.int64).min)
+    worst = np.full(n, np.iinfo(np.int64).max)
+    np.maximum.at(best, player, point)
+    np.minimum.at(worst, player, point)
+
+    found = zip(
+        columns.player_ids, games.tolist(), total(point).tolist(), total(rank).tolist(),
+        counts.tolist(), count(rank == size).tolist(), count(columns.tobi).tolist(),
+        best.tolist(), worst.tolist(),
+    )
+    return {
+        pid: PlayerTally(
+            player_id=pid,
+            games=g,
+            total_point=t,
+            rank_sum=r,
+            rank_counts=tuple(c),
+            last_count=last,
+            tobi_count=tobi,
+            best_point=hi,
+            worst_point=lo,
+        )
+        for pid, g, t, r, c, last, tobi, hi, lo in found
+    }
+
+
+# --- 調子の推移（移動平均と指数平滑） ---------------------------------------
+
+# 推移を出す指標（Form の値の列の並び）
+FORM_METRICS = ("rank", "point", "top", "last")
+# 画面に出す窓の大きさ（半荘）
+FORM_WINDOWS = (10, 30, 100)
+
+
+@dataclass(frozen=True)
+class Form:
+    """全員ぶんの調子の推移。行はプレイヤーごとにまとめ、その中は時系列順。
+
+    Attributes:
+        game: 各行がその人の何半荘目か（1から）。
+        mean: 窓 → 直近 window 半荘の平均（行 × `FORM_METRICS` の2次元配列）。
+            半荘数が窓に満たない間は、そこまでの全半荘の平均（`stats.rank_trend()` と同じ）。
+        ewma: 窓 → 指数平滑（α = 2 / (window + 1)、最初の半荘はその値そのもの）。
+
+    共有キャッシュに載るので、配列も窓ごとの対応（読み取り専用の Mapping）も
+    書き換えられないようにしてある。
+    """
+
+    player_ids: tuple[str, ...]
+    player: np.ndarray
+    game: np.ndarray
+    mean: Mapping[int, np.ndarray]
+    ewma: Mapping[int, np.ndarray]
+
+    def frame(self, metric: str, window: int, kind: str = "mean") -> dict[str, Any]:
+        """1つの指標・窓の推移を、そのまま `pd.DataFrame` に渡せる形で返す。"""
+        values = (self.mean if kind == "mean" else self.ewma)[window]
+        return {
+            "player_id": np.array(self.player_ids, dtype=object)[self.player],
+            "game": self.game,
+            "value": values[:, FORM_METRICS.index(metric)],
+        }
+
+
+def form(
+    columns: EntryColumns, player_count: int, windows: Sequence[int] = FORM_WINDOWS
+) -> Form:
+    """着順・ポイント・トップ率・ラス率の推移を、全員・全窓まとめて作る。
+
+    旧実装の `stats.rank_trend()` は1人・1指標・1窓ごとに、半荘のたびに窓を
+    切り出して足し直していた。ここでは記録をプレイヤー順に並べ替えて累積和を1回取り、
+    窓の和を「累積和の差」で引く。指数平滑は1つ前への漸化式なので、
+    倍々に先の行へ合成していく走査（log2(行数) 回の配列演算）で全員を一度に解く。
+    ラスの判定は `tally()` と同じく、卓の人数が無ければ player_count を使う。
+    """
+    order = np.argsort(columns.player, kind="stable")
+    player = columns.player[order]
+    rank = columns.rank[order]
+    n = len(player)
+    size = np.where(columns.table_size != 0, columns.table_size, player_count)[order]
+    values = np.column_stack(
+        [rank, columns.point[order], rank == 1, rank == size]
+    ).astype(np.float64)
+
+    games = np.bincount(player, minlength=len(columns.player_ids))
+    start = (np.cumsum(games) - games)[player]  # 各行の人の最初の行
+    row = np.arange(n)
+    first = row == start
+
+    # 値はどれも整数なので、累積和の差は Python で足したときと同じ値になる
+    cumulative = np.vstack([np.zeros((1, len(FORM_METRICS))), np.cumsum(values, axis=0)])
+    mean, ewma = {}, {}
+    for window in windows:
+        low = np.maximum(row + 1 - window, start)
+        mean[window] = (cumulative[row + 1] - cumulative[low]) / (row + 1 - low)[:, None]
+        ewma[window] = _smooth(values, first, 2 / (window + 1))
+
+    game = row - start + 1
+    for array in (player, game, *mean.values(), *ewma.values()):
+        array.setflags(write=False)
+    return Form(
+        player_ids=columns.player_ids,
+        player=player,
+        game=game,
+        mean=MappingProxyType(mean),
+        ewma=MappingProxyType(ewma),
+    )
+
+
+def _smooth(values: np.ndarray, first: np.ndarray, alpha: float) -> np.ndarray:
+    """y[i] = α·x[i] + (1-α)·y[i-1]。人の最初の行（first）では y = x からやり直す。
+
+    各行を「d 行前の y に掛ける係数」と「足す値」の組で持ち、d = 1, 2, 4, ... と
+    前の組を合成していく。最初の行の係数は 0 なので、前の人の値は混ざらない。
+    係数は合成のたびに小さくなるだけなので、桁あふれはしない。
+    """
+    result = np.where(first[:, None], values, alpha * values)
+    carry = np.where(first, 0.0, 1 - alpha)
+    step = 1
+    # 係数が丸め誤差より小さくなったら、それより前の半荘はもう効かない
+    while step < len(result) and carry.max(initial=0.0) > 1e-17:
+        result[step:] += carry[step:, None] * result[:-step]
+        carry[step:] *= carry[:-step]
+        step *= 2
+    return result
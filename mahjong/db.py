@@ -23,6 +23,29 @@ supabase-py はログインセッション(JWT)をクライアント内部に保
 グループ単位の RLS を入れると、これは「他人のデータを他人の権限で
 読み書きする」に直結するため、**セッション分離は RLS より先に必要**。
 
+## 通信路（HTTP 接続）だけはプロセスで共有する
+
+クライアントをセッションごとに作ると、httpx の接続プールもセッションごとにできる。
+新しい訪問者や `reset_client()` のたびに TCP と TLS の握手をやり直すことになり、
+スマホ回線では1回ごとに目に見えて待たされていた。
+
+JWT はクライアント（PostgREST / GoTrue）側のヘッダに載り、リクエストごとに渡される。
+接続プール自体はトークンを持たないので、HTTP/2 の keep-alive 接続を
+プロセスで1つだけ作り、各セッションのクライアントに差し込んで使い回す。
+ただし次の2点は共有するとセッションが混ざるので、共有の通信路では潰してある:
+
+    * 既定のヘッダ（Authorization を置かない。`_shared_http()` は空のまま作る）
+    * Cookie（どのドメインの Set-Cookie も保存しない）
+
+## クライアントは使う部品だけで作る
+
+`supabase.create_client()` は Storage・Edge Functions・Realtime の部品まで
+作る（Realtime は接続しなくてもクライアントを即座に組み立てる）。このアプリが使うのは
+PostgREST（テーブルと RPC）と認証だけなので、`DataClient` はその2つだけを持つ。
+PostgREST 側はさらに最初の読み書きまで作らない（ログイン画面だけ開いて帰る人もいる）。
+Storage と Functions は、使われたときに初めて作る。
+作り分けの効果は `python -m mahjong.bench clients` で測れる。
+
 設定の解決順:
     1. 環境変数 SUPABASE_URL / SUPABASE_KEY
     2. .streamlit/secrets.toml の [supabase] url / publishable_key
@@ -31,8 +54,18 @@ supabase-py はログインセッション(JWT)をクライアント内部に保
 from __future__ import annotations
 
 import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import TYPE_CHECKING, Any, Iterator
 
-from supabase import Client, ClientOptions, create_client
+import httpx
+
+if TYPE_CHECKING:
+    # postgrest / supabase_auth は pydantic ごと読み込むので重い（約0.2秒）。
+    # 初めての訪問者にログイン画面を出すだけなら要らないので、クライアントを作るときに読む。
+    from postgrest import SyncPostgrestClient, SyncRequestBuilder, SyncRPCFilterRequestBuilder
 
 ENV_URL = "SUPABASE_URL"
 ENV_KEY = "SUPABASE_KEY"
@@ -41,7 +74,21 @@ ENV_KEY = "SUPABASE_KEY"
 SESSION_CLIENT_KEY = "_supabase_client"
 
 # Streamlit の外（pytest / CLI）で使うときだけのフォールバック
-_fallback_client: Client | None = None
+_fallback_client: DataClient | None = None
+
+# プロセスで1つの HTTP 接続プール。全セッションのクライアントが使う。
+_http: httpx.Client | None = None
+_http_lock = threading.Lock()
+
+# 1プロセスで保つ keep-alive 接続の上限。HTTP/2 なら1本で多重化できるので小さくてよい。
+MAX_KEEPALIVE = 20
+# 時間制限の既定値（秒）。repo 層の呼び出しは `request_timeout()` でもっと短く絞る。
+# supabase-py の既定（120 秒）では、会場の Wi-Fi で止まった通信を待ち続けてしまう。
+HTTP_TIMEOUT = 30.0
+CONNECT_TIMEOUT = 5.0
+
+# `request_timeout()` の中で飛ぶ通信に掛ける時間制限。None なら既定値のまま。
+_request_timeout: ContextVar[float | None] = ContextVar("request_timeout", default=None)
 
 
 class ConfigError(RuntimeError):
@@ -90,6 +137,8 @@ def get_config() -> tuple[str, str]:
             ".streamlit/secrets.toml の [supabase] に url と publishable_key を\n"
             "設定してください。雛形は secrets.toml.example にあります。"
         )
+    if not url.startswith(("https://", "http://")):
+        raise ConfigError(f"Supabase の URL が不正です: {url}")
     if "<" in url or "<" in key:
         raise ConfigError(
             ".streamlit/secrets.toml がテンプレートのままです。\n"
@@ -104,23 +153,164 @@ def get_config() -> tuple[str, str]:
     return url, key
 
 
-def _new_client() -> Client:
-    url, key = get_config()
-    return create_client(
-        url,
-        key,
-        options=ClientOptions(
+class _SharedHttpClient(httpx.Client):
+    """全セッションで共有する接続プール。
+
+    supabase-py はクライアントを閉じるときに接続プールも閉じるので、
+    ここでは close() を無視する。1つのセッションの後始末で全員の接続が切れないように。
+    """
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        """本当に閉じる（テストやプロセス終了時用）。"""
+        super().close()
+
+
+def _transport() -> httpx.BaseTransport:
+    try:
+        return httpx.HTTPTransport(
+            http2=True, limits=httpx.Limits(max_keepalive_connections=MAX_KEEPALIVE)
+        )
+    except ImportError:
+        # h2 が無い環境では HTTP/1.1 の keep-alive だけでも握手は省ける
+        return httpx.HTTPTransport(limits=httpx.Limits(max_keepalive_connections=MAX_KEEPALIVE))
+
+
+@contextmanager
+def request_timeout(seconds: float) -> Iterator[None]:
+    """この中で飛ぶ通信だけ、時間制限を seconds 秒にする。
+
+    接続プールはプロセスで共有しているので、クライアントの既定値は変えられない。
+    そこで通信の直前（`_apply_timeout`）に1本ずつ書き換える。
+    """
+    token = _request_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _request_timeout.reset(token)
+
+
+def _apply_timeout(request: httpx.Request) -> None:
+    seconds = _request_timeout.get()
+    if seconds is not None:
+        # 接続は既定より長く待っても仕方がないので、短い方を使う
+        request.extensions["timeout"] = httpx.Timeout(
+            seconds, connect=min(seconds, CONNECT_TIMEOUT)
+        ).as_dict()
+
+
+def _shared_http() -> httpx.Client:
+    """プロセスで1つの接続プールを返す。最初の呼び出しで作る。"""
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = _SharedHttpClient(
+                transport=_transport(),
+                # Set-Cookie を一切保存しない。保存すると次の訪問者のリクエストに載る。
+                cookies=CookieJar(DefaultCookiePolicy(allowed_domains=[])),
+                timeout=httpx.Timeout(HTTP_TIMEOUT, connect=CONNECT_TIMEOUT),
+                event_hooks={"request": [_apply_timeout]},
+                follow_redirects=True,
+            )
+        return _http
+
+
+class DataClient:
+    """このアプリが使う部品（PostgREST・RPC・認証）だけを持つ Supabase クライアント。
+
+    呼び出し側から見た形は `supabase.Client` と同じ（`.table()` / `.rpc()` / `.auth`）。
+    ログイン状態の変化で Authorization を差し替える手順も supabase-py に合わせてある。
+    """
+
+    def __init__(self, url: str, key: str, http: httpx.Client) -> None:
+        from supabase_auth import SyncGoTrueClient, SyncMemoryStorage
+
+        self.supabase_url = url.rstrip("/")
+        self.supabase_key = key
+        self._http = http
+        self.headers = {"apiKey": key, "Authorization": f"Bearer {key}"}
+        self.auth = SyncGoTrueClient(
+            url=f"{self.supabase_url}/auth/v1",
+            headers=dict(self.headers),
             # 自動更新スレッドはブラウザセッションごとに増えてしまうので使わない。
             # 代わりに auth.current_user() が期限切れ前に明示的に更新する。
             auto_refresh_token=False,
-            # 保存先は既定のインメモリ（クライアントインスタンス固有）。
+            # 保存先はインメモリ（クライアントインスタンス固有）。
             # これによりセッション間でトークンが混ざらない。
             persist_session=True,
-        ),
-    )
+            storage=SyncMemoryStorage(),
+            http_client=http,
+        )
+        self._postgrest: SyncPostgrestClient | None = None
+        self._storage: Any = None
+        self._functions: Any = None
+        self.auth.on_auth_state_change(self._on_auth_change)
+
+    @property
+    def postgrest(self) -> SyncPostgrestClient:
+        if self._postgrest is None:
+            from postgrest import SyncPostgrestClient
+
+            self._postgrest = SyncPostgrestClient(
+                f"{self.supabase_url}/rest/v1", headers=dict(self.headers), http_client=self._http
+            )
+        return self._postgrest
+
+    def table(self, table_name: str) -> SyncRequestBuilder:
+        return self.postgrest.from_(table_name)
+
+    from_ = table
+
+    def rpc(
+        self, fn: str, params: dict[str, Any] | None = None, count: Any = None,
+        head: bool = False, get: bool = False,
+    ) -> SyncRPCFilterRequestBuilder:
+        return self.postgrest.rpc(fn, params or {}, count, head, get)
+
+    # --- 使っていない部品（使われたときに作る） ---
+
+    @property
+    def storage(self) -> Any:
+        if self._storage is None:
+            from storage3 import SyncStorageClient
+
+            self._storage = SyncStorageClient(
+                url=f"{self.supabase_url}/storage/v1/", headers=dict(self.headers),
+                http_client=self._http,
+            )
+        return self._storage
+
+    @property
+    def functions(self) -> Any:
+        if self._functions is None:
+            from supabase_functions import SyncFunctionsClient
+
+            self._functions = SyncFunctionsClient(
+                url=f"{self.supabase_url}/functions/v1", headers=dict(self.headers),
+                http_client=self._http,
+            )
+        return self._functions
 
+    def _on_auth_change(self, event: str, session: Any) -> None:
+        """supabase-py の `Client._listen_to_auth_events` と同じ手順。"""
+        token = self.supabase_key
+        if event in ("SIGNED_IN", "TOKEN_REFRESHED", "SIGNED_OUT"):
+            # 部品は古いヘッダの写しを持っているので作り直させる
+            self._postgrest = self._storage = self._functions = None
+            token = session.access_token if session else self.supabase_key
+        self.headers["Authorization"] = f"Bearer {token}"
+        self.auth._headers["Authorization"] = f"Bearer {token}"
 
-def get_client() -> Client:
+
+def _new_client() -> DataClient:
+    url, key = get_config()
+    # 接続プールだけはプロセスで共有する（JWT はクライアント側のヘッダに載る）
+    return DataClient(url, key, _shared_http())
+
+
+def get_client() -> DataClient:
     """このブラウザセッション専用の Supabase クライアントを返す。
 
     Streamlit の外（テストや CLI）ではプロセス内で1つを使い回す。
@@ -139,6 +329,14 @@ def get_client() -> Client:
     return client
 
 
+def has_client() -> bool:
+    """このブラウザセッションのクライアントが、もう作られているか。"""
+    state = _session_state()
+    if state is None:
+        return _fallback_client is not None
+    return state.get(SESSION_CLIENT_KEY) is not None
+
+
 def reset_client() -> None:
     """このセッションのクライアントを破棄する（設定変更後やテスト用）。"""
     global _fallback_client
@@ -146,3 +344,23 @@ def reset_client() -> None:
     state = _session_state()
     if state is not None:
         state.pop(SESSION_CLIENT_KEY, None)
+
+
+def sign_in_from_terminal(email: str | None = None) -> None:
+    """CLI（`mahjong.importer` / `mahjong.export`）のログイン。
+
+    画面の `auth.sign_in()` は Cookie と session_state に書くので、ここでは
+    プロセスで1つのクライアントに直接ログインする。以後の読み書きは本人の RLS で通る。
+    メールアドレスは引数か環境変数 MAHJONG_EMAIL、パスワードは MAHJONG_PASSWORD か端末で尋ねる。
+    失敗は AppError（の派生）で送出する。
+    """
+    import getpass
+
+    from .errors import describe
+
+    email = email or os.environ.get("MAHJONG_EMAIL") or input("メールアドレス: ")
+    password = os.environ.get("MAHJONG_PASSWORD") or getpass.getpass("パスワード: ")
+    try:
+        get_client().auth.sign_in_with_password({"email": email, "password": password})
+    except Exception as exc:  # noqa: BLE001 - 画面に出せる形にして送出する
+        raise describe(exc) from exc
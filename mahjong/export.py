@@ -0,0 +1,252 @@
+"""グループの記録の書き出し（CSV / NDJSON / Parquet）。
+
+    python -m mahjong.export GROUP_ID [--out DIR] [--format csv|ndjson|parquet]
+                             [--dataset rounds ...] [--email you@example.com]
+
+バックアップや手元での分析のために、グループの生の記録を表ごとに書き出す。
+
+    rounds       半荘の結果（1行が1人ぶん。削除した半荘は含まない）
+    players      参加者（退会・統合した人も含む。rounds が参照するため）
+    tournaments  大会とルール
+    days         開催日
+
+成績画面の「CSVでダウンロード」は集計後の順位表だけで、しかも再実行のたびに
+作り直していた。ここではサーバーから1ページ（`queries.PAGE_SIZE` 行）読むごとに
+その分だけを符号化して返すので、何年分の履歴でも手元に持つのは1ページだけになる。
+CLI はそれをファイルへ流し込み、設定画面はボタンを押したときに初めて作る。
+
+Parquet は pyarrow で書く（Streamlit が依存しているので入っている）。列の型は
+`Dataset.columns` で決め、ページごとに行グループを1つ書く。
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import sys
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+from .errors import AppError
+from .repo import queries
+
+# 形式 → (拡張子, MIME)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "ndjson": (".ndjson", "application/x-ndjson"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """書き出す表1つ。"""
+
+    label: str
+    # (列名, 型)。型は "str" / "int" / "bool"。日時は ISO 8601 の文字列のまま書く
+    columns: tuple[tuple[str, str], ...]
+    # group_id → 行（columns 以外のキーがあってもよい）
+    read: Callable[[str], Iterable[dict[str, Any]]]
+
+
+def _select(columns: tuple[tuple[str, str], ...]) -> str:
+    return ", ".join(name for name, _ in columns)
+
+
+_ROUND_COLUMNS = (
+    ("round_id", "str"), ("round_created_at", "str"), ("tournament_id", "str"),
+    ("day_id", "str"), ("held_on", "str"), ("game_id", "str"), ("game_name", "str"),
+    ("seat", "int"), ("player_id", "str"), ("raw_score", "int"), ("point", "int"),
+    ("rank", "int"), ("kaze", "str"), ("tobi", "bool"),
+)
+_PLAYER_COLUMNS = (
+    ("id", "str"), ("name", "str"), ("user_id", "str"), ("role", "str"),
+    ("is_provisional", "bool"), ("deleted_at", "str"), ("merged_into", "str"),
+)
+_TOURNAMENT_COLUMNS = (
+    ("id", "str"), ("name", "str"), ("ruleset", "str"), ("note", "str"), ("created_at", "str"),
+)
+_DAY_COLUMNS = (
+    ("id", "str"), ("tournament_id", "str"), ("held_on", "str"), ("label", "str"),
+    ("note", "str"), ("created_at", "str"),
+)
+
+DATASETS: dict[str, Dataset] = {
+    "rounds": Dataset(
+        "半荘の結果", _ROUND_COLUMNS,
+        lambda group_id: queries.stream_entry_rows("group_id", group_id, "export"),
+    ),
+    "players": Dataset(
+        "参加者", _PLAYER_COLUMNS,
+        lambda group_id: queries.stream_group_rows(
+            "players", _select(_PLAYER_COLUMNS), group_id
+        ),
+    ),
+    "tournaments": Dataset(
+        "大会", _TOURNAMENT_COLUMNS,
+        lambda group_id: queries.stream_group_rows(
+            "tournaments", _select(_TOURNAMENT_COLUMNS), group_id, active_only=True
+        ),
+    ),
+    "days": Dataset(
+        "開催日", _DAY_COLUMNS,
+        lambda group_id: queries.stream_group_rows(
+            "tournament_days", _select(_DAY_COLUMNS), group_id, active_only=True
+        ),
+    ),
+}
+
+
+def file_name(dataset: str, fmt: str) -> str:
+    return f"mahjong_{dataset}{FORMATS[fmt][0]}"
+
+
+def iter_export(group_id: str, dataset: str, fmt: str) -> Iterator[bytes]:
+    """表を1つ、指定の形式のバイト列として少しずつ返す（1ページごとに1回）。
+
+    最後まで読むとファイル1つぶんになる。ジェネレータなので、読み始めるまで通信しない。
+    """
+    if dataset not in DATASETS:
+        raise AppError(f"書き出せない表です: {dataset}")
+    if fmt not in FORMATS:
+        raise AppError(f"書き出せない形式です: {fmt}")
+    spec = DATASETS[dataset]
+    pages = _pages(_cells(row, spec.columns) for row in spec.read(group_id))
+    encode = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}[fmt]
+    return encode(spec.columns, pages)
+
+
+def export_bytes(group_id: str, dataset: str, fmt: str) -> bytes:
+    """表を1つ、ファイル1つぶんのバイト列で返す（画面のダウンロード用）。"""
+    return b"".join(iter_export(group_id, dataset, fmt))
+
+
+def write_file(group_id: str, dataset: str, fmt: str, path: Path) -> Path:
+    """表を1つ path に書く。書き終えるまでは隣の一時ファイルに書き、最後に置き換える。"""
+    temporary = path.with_name(path.name + ".part")
+    try:
+        with temporary.open("wb") as out:
+            for chunk in iter_export(group_id, dataset, fmt):
+                out.write(chunk)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+    temporary.replace(path)
+    return path
+
+
+# --- 符号化 -----------------------------------------------------------------
+
+
+def _cells(row: dict[str, Any], columns: tuple[tuple[str, str], ...]) -> dict[str, Any]:
+    """行を columns の列だけにする。jsonb（ルール）は JSON の文字列にする。"""
+    found = {}
+    for name, _ in columns:
+        value = row.get(name)
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        found[name] = value
+    return found
+
+
+def _pages(rows: Iterator[dict[str, Any]]) -> Iterator[list[dict[str, Any]]]:
+    while page := list(islice(rows, queries.PAGE_SIZE)):
+        yield page
+
+
+def _csv(columns, pages: Iterator[list[dict[str, Any]]]) -> Iterator[bytes]:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=[name for name, _ in columns], lineterminator="\n")
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield out.getvalue().encode("utf-8")
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")  # 行が1つも無いときの見出し
+
+
+def _ndjson(columns, pages: Iterator[list[dict[str, Any]]]) -> Iterator[bytes]:
+    for page in pages:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in page).encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """書かれたバイト列を、読み出すたびに手放す書き込み先。
+
+    ParquetWriter は位置（tell）から列の場所を決めるので、手放したぶんも位置は進める。
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._parts.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        chunk, self._parts = b"".join(self._parts), []
+        return chunk
+
+
+def _parquet(columns, pages: Iterator[list[dict[str, Any]]]) -> Iterator[bytes]:
+    # pyarrow は読み込みに時間がかかる。Parquet を選んだときだけ読む。
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"str": pa.string(), "int": pa.int64(), "bool": pa.bool_()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for page in pages:
+            writer.write_table(pa.Table.from_pylist(page, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+# --- CLI --------------------------------------------------------------------
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m mahjong.export")
+    parser.add_argument("group", help="書き出すグループの id")
+    parser.add_argument("--out", type=Path, default=Path("."), help="書き出す先のフォルダ")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--dataset", choices=list(DATASETS), action="append",
+                        help="書き出す表（繰り返し指定できる。既定はすべて）")
+    parser.add_argument("--email", help="ログインするメールアドレス（既定は環境変数 MAHJONG_EMAIL）")
+    args = parser.parse_args(argv)
+
+    from .db import sign_in_from_terminal
+
+    try:
+        sign_in_from_terminal(args.email)
+    except AppError as exc:
+        sys.exit(f"ログインできませんでした: {exc}")
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    for dataset in args.dataset or list(DATASETS):
+        try:
+            path = write_file(args.group, dataset, args.format, args.out / file_name(dataset, args.format))
+        except AppError as exc:
+            sys.exit(f"{DATASETS[dataset].label}を書き出せませんでした: {exc}")
+        print(f"{DATASETS[dataset].label}: {path}")
+
+
+if __name__ == "__main__":
+    main()
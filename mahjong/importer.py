@@ -0,0 +1,564 @@
+"""過去の記録の取り込み（CSV / JSON）。
+
+    python -m mahjong.importer FILE --tournament ID [--email you@example.com]
+                               [--allow-mismatch] [--no-create-players] [--restart]
+
+旧スプレッドシートや他のアプリの書き出しを、大会の記録として取り込む。
+`migrations/oneshot/02_data_migration.sql` は旧スキーマ専用で SQL Editor も要るが、
+こちらはアプリと同じ API を、取り込む人のログイン（RLS）で使う。
+
+## 入力
+
+1行（JSON は1オブジェクト）が1半荘。
+
+    held_on           開催日（2024-05-01 / 2024/5/1）。同じ日付の開催日があればそこへ、無ければ作る
+    table             卓の名前（省略時は「卓1」）。同じ日・同じ名前・同じ顔ぶれの卓があればそこへ足す
+    player1..player4  名前。グループに居なければ参加者として作る（--no-create-players で除外）
+    score1..score4    持ち点（3人麻雀は3まで）
+    dealer            東家（1〜4 の番号か名前）。省略すると同じ卓の前の半荘の次の人
+
+見出しは日本語（日付・卓・東家・名前1・点数1 …）でもよい。JSON は `players` / `scores`
+の配列でもよい。`.csv`・`.jsonl`（1行1オブジェクト）・`.json`（オブジェクトの配列）を読む。
+
+各行は `scoring.calc_round()` で検算してから送る（合計が合わない行は --allow-mismatch が
+無ければ除外）。除外した行は理由と一緒に表示し、残りの取り込みは続ける。
+
+## 速さと記憶
+
+ファイルは先頭から流し読みし、検算を通った半荘を合わせて `BATCH_ROUNDS` 件たまるごとに、
+卓ごとに `games.save_rounds()`（1卓1トランザクション）で送る。手元に持つのはその1束と、
+開催日・卓・参加者の対応表だけなので、数千半荘でも記憶は増えず、数十往復で終わる。
+
+## 途中からやり直す
+
+1束を送り終えるたびに、何行目まで済んだかを FILE.checkpoint.json に書く。止まったら
+同じコマンドをもう一度流すと続きから始める。送った直後に止まってチェックポイントが
+遅れても、半荘の client_key を行の中身から作っているので、同じ半荘がもう一度届いても
+2件にはならない（migrations/010）。最後まで終わるとチェックポイントは消す。
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+import uuid
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import IO, Any, Callable, Iterator
+
+from .errors import AppError, AuthExpired, NetworkError
+from .repo import games, groups, tournaments
+from .repo._base import SeatSpec
+from .rules import RuleSet
+from .scoring import ScoringError, SeatResult, calc_round, kazes_for_dealer
+
+# 1束の半荘数。save_rounds() の上限と同じにして、1卓の束が1回の RPC に収まるようにする。
+BATCH_ROUNDS = games.MAX_BATCH_ROUNDS
+
+DEFAULT_TABLE = "卓1"
+
+# client_key を行の中身から作るための名前空間（uuid5）。変えると再取り込みで二重になる。
+_KEY_NAMESPACE = uuid.UUID("5b0d7a34-1c7e-4f38-9a51-2f1f3f0c6e21")
+
+# 見出しの別名 → 正式名
+_ALIASES = {
+    "date": "held_on", "日付": "held_on", "開催日": "held_on",
+    "卓": "table", "卓名": "table",
+    "東家": "dealer", "親": "dealer",
+}
+_SEAT_COLUMN = re.compile(r"^(player|name|名前|score|点数|持ち点)\s*(\d)$")
+
+_READ_CHUNK = 64 * 1024
+
+
+class RecordError(ValueError):
+    """1行を半荘として読めない。メッセージはそのまま表示できる。"""
+
+
+@dataclass(frozen=True)
+class Record:
+    """入力の1半荘。"""
+
+    line: int
+    held_on: str
+    table: str
+    players: tuple[str, ...]
+    scores: tuple[int, ...]
+    # 東家の、players の中での位置。None なら前の半荘の次の人
+    dealer: int | None = None
+
+    def client_key(self, tournament_id: str) -> str:
+        """同じ行を何度送っても同じになる client_key。"""
+        text = "\t".join(
+            [tournament_id, str(self.line), self.held_on, self.table,
+             "|".join(self.players), "|".join(map(str, self.scores))]
+        )
+        return str(uuid.uuid5(_KEY_NAMESPACE, text))
+
+
+@dataclass
+class Progress:
+    """取り込みの進み具合。`on_progress` に渡し、最後に `run_import()` が返す。"""
+
+    # 読んだ行（前回までに済んでいて飛ばした行も含む）
+    rows: int = 0
+    saved: int = 0
+    rejected: int = 0
+    # 前回までに済んでいた行
+    skipped: int = 0
+    # 読んだバイト数とファイルの大きさ
+    position: int = 0
+    size: int = 0
+
+    @property
+    def percent(self) -> int:
+        return 100 if not self.size else min(100, self.position * 100 // self.size)
+
+
+# --- 読み込み ---------------------------------------------------------------
+
+
+def iter_rows(text: IO[str], kind: str) -> Iterator[tuple[int, Any]]:
+    """(行番号, 1行ぶんの値) を流し読みで返す。kind は "csv" / "jsonl" / "json"。"""
+    if kind == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif kind == "jsonl":
+        for line, raw in enumerate(text, start=1):
+            if raw.strip():
+                try:
+                    yield line, json.loads(raw)
+                except json.JSONDecodeError as exc:
+                    yield line, RecordError(f"JSON として読めません: {exc.msg}")
+    elif kind == "json":
+        yield from enumerate(_json_array(text), start=1)
+    else:
+        raise AppError(f"読めない形式です: {kind}")
+
+
+def _json_array(text: IO[str]) -> Iterator[Any]:
+    """オブジェクトの配列を、全体を読み込まずに1つずつ返す。"""
+    decoder = json.JSONDecoder()
+    buffer, started = "", False
+    while True:
+        chunk = text.read(_READ_CHUNK)
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                pos += 1
+            if pos < len(buffer) and not started:
+                if buffer[pos] != "[":
+                    raise AppError("JSON はオブジェクトの配列にしてください。")
+                started, pos = True, pos + 1
+                continue
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise AppError("JSON の配列が途中で切れています。") from None
+                break  # 続きを読んでからもう一度
+            yield value
+        buffer = buffer[pos:]
+        if not chunk:
+            return
+
+
+def parse_record(line: int, value: Any) -> Record:
+    """1行ぶんの値を Record にする。読めなければ RecordError。"""
+    if isinstance(value, RecordError):
+        raise value
+    if not isinstance(value, dict):
+        raise RecordError("1半荘は1つのオブジェクトにしてください。")
+    row = {_ALIASES.get(str(k).strip(), str(k).strip()): v for k, v in value.items()}
+
+    if "players" in row or "scores" in row:
+        names = list(row.get("players") or [])
+        scores = list(row.get("scores") or [])
+    else:
+        seats: dict[int, dict[str, Any]] = {}
+        for key, cell in row.items():
+            found = _SEAT_COLUMN.match(key)
+            if found:
+                kind = "name" if found.group(1) in ("player", "name", "名前") else "score"
+                seats.setdefault(int(found.group(2)), {})[kind] = cell
+        names = [seats[i].get("name") for i in sorted(seats)]
+        scores = [seats[i].get("score") for i in sorted(seats)]
+        # 3人麻雀の4列目のように、名前も点数も空の席は席ごと無いものとする
+        kept = [(n, s) for n, s in zip(names, scores) if _text(n) or _text(s)]
+        names, scores = [n for n, _ in kept], [s for _, s in kept]
+
+    names = [_text(n) for n in names]
+    if not names or len(names) != len(scores) or not all(names):
+        raise RecordError("名前と持ち点を同じ数だけ入れてください。")
+    if len(set(names)) != len(names):
+        raise RecordError("同じ名前が2回出てきます。")
+    try:
+        points = tuple(int(str(s).replace(",", "").strip()) for s in scores)
+    except ValueError:
+        raise RecordError("持ち点が数字ではありません。") from None
+
+    return Record(
+        line=line,
+        held_on=_held_on(row.get("held_on")),
+        table=_text(row.get("table")) or DEFAULT_TABLE,
+        players=tuple(names),
+        scores=points,
+        dealer=_dealer(row.get("dealer"), names),
+    )
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _held_on(value: Any) -> str:
+    found = re.fullmatch(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})", _text(value))
+    if not found:
+        raise RecordError(f"開催日が読めません: {_text(value) or '(空)'}")
+    try:
+        return date(*map(int, found.groups())).isoformat()
+    except ValueError:
+        raise RecordError(f"開催日が読めません: {_text(value)}") from None
+
+
+def _dealer(value: Any, names: list[str]) -> int | None:
+    text = _text(value)
+    if not text:
+        return None
+    if text in names:
+        return names.index(text)
+    if text.isdigit() and 1 <= int(text) <= len(names):
+        return int(text) - 1
+    raise RecordError(f"東家が読めません: {text}")
+
+
+def _kind(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return {".csv": "csv", ".json": "json"}.get(suffix, "csv")
+
+
+# --- 書き込み ---------------------------------------------------------------
+
+
+@dataclass
+class _Game:
+    """取り込み先の卓1つ。"""
+
+    id: str
+    # 名前 → 席インデックス、席インデックス → player_id
+    seat_of: dict[str, int]
+    seat_to_player: dict[int, str]
+    # 次の半荘の東家（席の並びでの位置）
+    next_dealer: int = 0
+    pending: list[tuple[Record, list[SeatResult]]] = field(default_factory=list)
+
+
+class _Importer:
+    def __init__(
+        self, tournament_id: str, group_id: str, rules: RuleSet,
+        create_players: bool, strict: bool, dealers: dict[str, int],
+    ):
+        self.tournament_id = tournament_id
+        self.group_id = group_id
+        self.rules = rules
+        self.create_players = create_players
+        self.strict = strict
+        # 前回までの取り込みで決まった、各卓の次の東家（チェックポイントから）
+        self.dealers = dealers
+        self.players = {p["name"]: p["id"] for p in groups.list_players(group_id)}
+        self.days: dict[str, str] | None = None
+        self.day_games: dict[str, list[dict[str, Any]]] = {}
+        self.games: dict[str, _Game] = {}
+        self.pending = 0
+
+    # 行を1つ検算して束に足す。ダメなら RecordError。
+    def add(self, record: Record) -> None:
+        n = self.rules.player_count
+        if len(record.players) != n:
+            raise RecordError(f"このルールは{n}人用ですが、{len(record.players)}人分あります。")
+        game = self._game(record)
+        seat_indexes = sorted(game.seat_to_player)
+        order = [seat_indexes.index(game.seat_of[name]) for name in record.players]
+        dealer = game.next_dealer if record.dealer is None else order[record.dealer]
+        kazes = kazes_for_dealer(dealer, n)
+        try:
+            results = calc_round(
+                list(record.scores), [kazes[i] for i in order], self.rules,
+                seats=[seat_indexes[i] for i in order], strict=self.strict,
+            )
+        except ScoringError as exc:
+            raise RecordError(str(exc)) from None
+        game.next_dealer = (dealer + 1) % n
+        self.dealers[_game_key(record)] = game.next_dealer
+        game.pending.append((record, results))
+        self.pending += 1
+
+    def flush(self, on_reject: Callable[[int, str], None]) -> tuple[int, int]:
+        """束を送る。(保存した数, 除外した数)。通信の失敗はそのまま送出する（続きから再開できる）。"""
+        saved = rejected = 0
+        for game in self.games.values():
+            batch, game.pending = game.pending, []
+            if not batch:
+                continue
+            try:
+                self._save(game, batch)
+                saved += len(batch)
+            except (NetworkError, AuthExpired):
+                raise
+            except AppError:
+                # 束のどれかがサーバーに断られた。1半荘ずつ送り直して、悪い行だけを外す。
+                for one in batch:
+                    try:
+                        self._save(game, [one])
+                        saved += 1
+                    except (NetworkError, AuthExpired):
+                        raise
+                    except AppError as exc:
+                        on_reject(one[0].line, str(exc))
+                        rejected += 1
+        self.pending = 0
+        return saved, rejected
+
+    def _save(self, game: _Game, batch: list[tuple[Record, list[SeatResult]]]) -> None:
+        games.save_rounds(
+            game.id,
+            [(None, results) for _, results in batch],
+            game.seat_to_player,
+            client_keys=[record.client_key(self.tournament_id) for record, _ in batch],
+        )
+
+    # --- 開催日・卓・参加者 ---
+
+    def _game(self, record: Record) -> _Game:
+        key = _game_key(record)
+        game = self.games.get(key)
+        if game is not None:
+            return game
+        day_id = self._day(record.held_on)
+        player_ids = [self._player(name) for name in record.players]
+        found = self._find_game(day_id, record.table, player_ids)
+        if found is None:
+            found = self._create_game(day_id, record.table, player_ids)
+        seats = {s["player_id"]: s["seat"] for s in found["seats"]}
+        game = self.games[key] = _Game(
+            id=found["id"],
+            seat_of={name: seats[pid] for name, pid in zip(record.players, player_ids)},
+            seat_to_player={s["seat"]: s["player_id"] for s in found["seats"]},
+            next_dealer=self.dealers.get(key, 0),
+        )
+        return game
+
+    def _day(self, held_on: str) -> str:
+        if self.days is None:
+            self.days = {}
+            for day in tournaments.list_days(self.tournament_id):
+                self.days.setdefault(str(day["held_on"]), day["id"])
+        if held_on not in self.days:
+            self.days[held_on] = tournaments.create_day(self.tournament_id, self.group_id, held_on)
+        return self.days[held_on]
+
+    def _player(self, name: str) -> str:
+        if name not in self.players:
+            if not self.create_players:
+                raise RecordError(f"グループに「{name}」がいません。")
+            self.players[name] = groups.create_player(self.group_id, name)
+        return self.players[name]
+
+    def _find_game(self, day_id: str, table: str, player_ids: list[str]) -> dict[str, Any] | None:
+        if day_id not in self.day_games:
+            self.day_games[day_id] = games.list_games(day_id)
+        wanted = set(player_ids)
+        for game in self.day_games[day_id]:
+            if _base_name(game["name"], table) and {s["player_id"] for s in game["seats"]} == wanted:
+                return game
+        return None
+
+    def _create_game(self, day_id: str, table: str, player_ids: list[str]) -> dict[str, Any]:
+        # 同じ名前で顔ぶれの違う卓がすでにあれば「卓1 (2)」のように分ける
+        taken = {g["name"] for g in self.day_games[day_id]}
+        name, k = table, 1
+        while name in taken:
+            k += 1
+            name = f"{table} ({k})"
+        game_id = games.create_game(
+            day_id, name, [SeatSpec(player_id=pid) for pid in player_ids], self.rules.player_count
+        )
+        created = games.get_game(game_id)
+        if created is None:
+            raise AppError("作った卓を読み直せませんでした。")
+        self.day_games[day_id].append(created)
+        return created
+
+
+def _game_key(record: Record) -> str:
+    return "\t".join([record.held_on, record.table, "|".join(sorted(record.players))])
+
+
+def _base_name(name: str, table: str) -> bool:
+    """name が table そのものか、`_create_game()` が付けた「table (k)」か。"""
+    return name == table or re.fullmatch(re.escape(table) + r" \(\d+\)", name) is not None
+
+
+# --- チェックポイント -------------------------------------------------------
+
+
+def checkpoint_path(path: Path) -> Path:
+    return path.with_name(path.name + ".checkpoint.json")
+
+
+def _load_checkpoint(path: Path, tournament_id: str, size: int) -> dict[str, Any] | None:
+    try:
+        saved = json.loads(checkpoint_path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    if saved.get("tournament_id") != tournament_id or saved.get("size") != size:
+        raise AppError(
+            f"{checkpoint_path(path).name} は別の取り込み（別の大会か、書き換える前のファイル）のものです。"
+            "最初からやり直すなら --restart を付けてください。"
+        )
+    return saved
+
+
+def _save_checkpoint(path: Path, tournament_id: str, progress: Progress, dealers: dict[str, int]) -> None:
+    target = checkpoint_path(path)
+    temporary = target.with_name(target.name + ".tmp")
+    temporary.write_text(
+        json.dumps(
+            {"tournament_id": tournament_id, "size": progress.size, "progress": asdict(progress),
+             "dealers": dealers},
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+    temporary.replace(target)  # 書いている途中で止まっても、前のチェックポイントが残る
+
+
+# --- 取り込み ---------------------------------------------------------------
+
+
+def run_import(
+    path: Path,
+    tournament_id: str,
+    *,
+    create_players: bool = True,
+    strict: bool = True,
+    restart: bool = False,
+    on_progress: Callable[[Progress], None] | None = None,
+    on_reject: Callable[[int, str], None] | None = None,
+) -> Progress:
+    """path を大会 tournament_id に取り込む。
+
+    Args:
+        strict: 持ち点の合計が合わない行を除外する。False なら供託があったものとして取り込む。
+        restart: チェックポイントを無視して最初から流す（済んだ半荘は client_key で二重にならない）。
+        on_progress: 1束を送り終えるたびに呼ぶ。
+        on_reject: 除外した行ごとに (行番号, 理由) で呼ぶ。
+    """
+    on_progress = on_progress or (lambda progress: None)
+    on_reject = on_reject or (lambda line, reason: None)
+
+    tournament = tournaments.get_tournament(tournament_id)
+    if not tournament:
+        raise AppError("大会が見つかりません。")
+    rules, _ = tournaments.get_ruleset(tournament_id)
+
+    size = path.stat().st_size
+    resumed = None if restart else _load_checkpoint(path, tournament_id, size)
+    done = resumed["progress"]["rows"] if resumed else 0
+    progress = Progress(size=size)
+    if resumed:
+        progress.saved = resumed["progress"]["saved"]
+        progress.rejected = resumed["progress"]["rejected"]
+    importer = _Importer(
+        tournament_id, tournament["group_id"], rules, create_players, strict,
+        dict(resumed["dealers"]) if resumed else {},
+    )
+
+    def send() -> None:
+        saved, rejected = importer.flush(on_reject)
+        progress.saved += saved
+        progress.rejected += rejected
+        _save_checkpoint(path, tournament_id, progress, importer.dealers)
+        on_progress(progress)
+
+    with path.open("rb") as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        for line, value in iter_rows(text, _kind(path)):
+            progress.rows += 1
+            progress.position = raw.tell()
+            if progress.rows <= done:
+                progress.skipped += 1
+                continue
+            try:
+                importer.add(parse_record(line, value))
+            except RecordError as exc:
+                on_reject(line, str(exc))
+                progress.rejected += 1
+            if importer.pending >= BATCH_ROUNDS:
+                send()
+    progress.position = size
+    send()
+    checkpoint_path(path).unlink(missing_ok=True)
+    return progress
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m mahjong.importer")
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--tournament", required=True, help="取り込み先の大会の id")
+    parser.add_argument("--email", help="ログインするメールアドレス（既定は環境変数 MAHJONG_EMAIL）")
+    parser.add_argument("--allow-mismatch", action="store_true",
+                        help="持ち点の合計が合わない行も、供託があったものとして取り込む")
+    parser.add_argument("--no-create-players", action="store_true",
+                        help="グループに居ない名前の行を除外する（参加者を作らない）")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを無視して最初から")
+    args = parser.parse_args(argv)
+
+    from .db import sign_in_from_terminal
+
+    try:
+        sign_in_from_terminal(args.email)
+    except AppError as exc:
+        sys.exit(f"ログインできませんでした: {exc}")
+
+    def show(progress: Progress) -> None:
+        print(
+            f"\r{progress.rows:,}行（{progress.percent}%）  保存 {progress.saved:,}"
+            f"  除外 {progress.rejected:,}",
+            end="", file=sys.stderr, flush=True,
+        )
+
+    def reject(line: int, reason: str) -> None:
+        print(f"\n  {line}行目を除外: {reason}", file=sys.stderr)
+
+    try:
+        progress = run_import(
+            args.file, args.tournament, create_players=not args.no_create_players,
+            strict=not args.allow_mismatch, restart=args.restart,
+            on_progress=show, on_reject=reject,
+        )
+    except AppError as exc:
+        sys.exit(f"\n中断しました: {exc}\n同じコマンドをもう一度流すと続きから再開します。")
+    print(file=sys.stderr)
+    print(
+        f"{progress.saved:,}半荘を取り込みました（除外 {progress.rejected:,}行"
+        + (f"、前回までに済んでいた {progress.skipped:,}行は飛ばしました" if progress.skipped else "")
+        + "）。"
+    )
+
+
+if __name__ == "__main__":
+    main()
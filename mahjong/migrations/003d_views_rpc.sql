@@ -29,13 +29,21 @@ SELECT
     p.user_id,
     rr.seat, rr.raw_score, rr.point, rr.rank, rr.kaze, rr.tobi,
     -- その半荘の人数。3人卓と4人卓が混ざる大会でもラス率を取り違えないために持たせる。
-    count(*) OVER (PARTITION BY rr.round_id)::int AS table_size
+    n.table_size
 FROM public.round_results rr
 JOIN public.game_rounds     r ON r.id = rr.round_id AND r.deleted_at IS NULL
 JOIN public.games           g ON g.id = r.game_id   AND g.deleted_at IS NULL
 JOIN public.tournament_days d ON d.id = g.day_id    AND d.deleted_at IS NULL
 JOIN public.tournaments     t ON t.id = g.tournament_id AND t.deleted_at IS NULL
-JOIN public.players         p ON p.id = rr.player_id;
+JOIN public.players         p ON p.id = rr.player_id
+-- 人数は行ごとに主キー (round_id, player_id) の索引で数える。以前は
+-- count(*) OVER (PARTITION BY rr.round_id) だったが、窓関数より外の条件
+-- （スコープの絞り込み・queries._after() のキーセット）はビューの中へ押し込めず、
+-- ページを1枚読むたびにスコープ全体の窓を計算し直していた。
+CROSS JOIN LATERAL (
+    SELECT count(*)::int AS table_size
+    FROM public.round_results s WHERE s.round_id = rr.round_id
+) n;
 -- 大会・開催日も deleted_at で絞る。絞り忘れると、削除した大会や開催日の記録が
 -- グループ通算成績と「全N半荘」に残り続ける（一覧からは消えているのに数字だけ合わない）。
 -- players だけは絞らない。削除したプレイヤーの記録は残す
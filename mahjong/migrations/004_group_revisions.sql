@@ -0,0 +1,104 @@
+-- グループごとのデータ版数（冪等）
+--
+-- 画面の再実行の大半はウィジェット操作によるもので、データは変わっていない。
+-- それでも v_round_entries / v_game_seats を毎回まるごと取り直していた。
+-- グループの記録が変わるたびに版数を1つ以上進めておけば、
+-- 「版数が前回と同じなら取り直さない」と小さな1往復で判断できる。
+--
+-- 版数は RPC の中ではなくトリガで進める。
+--   * add_round_with_results / update_round_results / apply_recalculated_rounds /
+--     create_game_with_players は、中で行う INSERT / UPDATE / DELETE ごとに同じ
+--     トランザクションの中で進む（関数が失敗すれば版数も巻き戻る）。
+--   * REST から直接行う論理削除（deleted_at の UPDATE）や改名も漏れない。
+--     RPC ごとに書き足す方式だと、関数を足したときに書き忘れる。
+--
+-- 版数は「変わったかどうか」の判定にだけ使う。1回の保存で2以上進むことがある
+-- （文ごとに進むため）ので、差を件数として読まないこと。
+
+-- ===== 版数テーブル =================================================
+CREATE TABLE IF NOT EXISTS public.group_revisions (
+    group_id   uuid PRIMARY KEY REFERENCES public.groups(id) ON DELETE CASCADE,
+    revision   bigint NOT NULL DEFAULT 0,
+    changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+ALTER TABLE public.group_revisions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS group_revisions_select ON public.group_revisions;
+CREATE POLICY group_revisions_select ON public.group_revisions FOR SELECT TO authenticated
+    USING (group_id IN (SELECT unnest(public.current_group_ids())));
+
+-- 読むだけ。書き換えられると「変わっていない」と嘘をつけてしまうので、
+-- 書き込みは下のトリガ関数（所有者権限）だけが行う。
+REVOKE ALL ON public.group_revisions FROM anon, authenticated;
+GRANT SELECT ON public.group_revisions TO authenticated;
+
+
+-- ===== 版数を進めるトリガ ===========================================
+-- 行ごとではなく文ごとに1回だけ走らせる。4人分の結果の INSERT でも1回で済む。
+-- 対象グループは遷移表（その文で変わった行の集合）から拾う。
+--
+-- SECURITY DEFINER にするのは、利用者に group_revisions への書き込み権限を
+-- 渡さないため。このトリガは RLS を通った書き込みのあとにしか走らないが、
+-- 念のため API 経由の未ログイン呼び出しは拒否する。SQL Editor（postgres）や
+-- oneshot の移行は JWT を持たないので、そのときは素通しする。
+CREATE OR REPLACE FUNCTION public.bump_group_revision()
+RETURNS trigger LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+BEGIN
+    IF auth.uid() IS NULL
+       AND NULLIF(current_setting('request.jwt.claims', true), '') IS NOT NULL THEN
+        RAISE EXCEPTION 'ログインが必要です。' USING ERRCODE = '42501';
+    END IF;
+
+    -- group_id 順に更新して、複数グループにまたがる文同士のデッドロックを避ける。
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO public.group_revisions AS r (group_id, revision, changed_at)
+        SELECT DISTINCT o.group_id, 1, now() FROM old_rows o ORDER BY 1
+        ON CONFLICT (group_id) DO UPDATE
+            SET revision = r.revision + 1, changed_at = excluded.changed_at;
+    ELSE
+        INSERT INTO public.group_revisions AS r (group_id, revision, changed_at)
+        SELECT DISTINCT n.group_id, 1, now() FROM new_rows n ORDER BY 1
+        ON CONFLICT (group_id) DO UPDATE
+            SET revision = r.revision + 1, changed_at = excluded.changed_at;
+    END IF;
+    RETURN NULL;
+END $$;
+
+REVOKE ALL ON FUNCTION public.bump_group_revision() FROM public, anon, authenticated;
+
+-- 成績・卓・参加者・大会の見え方に関わるテーブルすべて。
+-- groups / group_invites は版数の対象外（共有キャッシュにも載せていない）。
+-- 遷移表は1つのトリガに1種類しか付けにくいので、操作ごとに分けて作る。
+DO $$
+DECLARE t text;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['tournaments', 'tournament_days', 'players', 'games',
+                             'game_players', 'game_rounds', 'round_results']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t || '_rev_ins', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t || '_rev_upd', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t || '_rev_del', t);
+
+        EXECUTE format($t$CREATE TRIGGER %I AFTER INSERT ON public.%I
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION public.bump_group_revision()$t$,
+            t || '_rev_ins', t);
+        EXECUTE format($t$CREATE TRIGGER %I AFTER UPDATE ON public.%I
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION public.bump_group_revision()$t$,
+            t || '_rev_upd', t);
+        EXECUTE format($t$CREATE TRIGGER %I AFTER DELETE ON public.%I
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION public.bump_group_revision()$t$,
+            t || '_rev_del', t);
+    END LOOP;
+END $$;
+
+-- 既存グループの行を用意しておく。無くても初回の書き込みで作られるが、
+-- 行が無いと「版数 0」と「まだ読めない」の区別がつかない。
+INSERT INTO public.group_revisions (group_id)
+SELECT id FROM public.groups
+ON CONFLICT (group_id) DO NOTHING;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,166 @@
+-- 半荘の変更フィード（冪等）
+--
+-- グループ通算の画面は v_round_entries をグループまるごと読む。半荘が1つ増えただけで
+-- 全履歴を取り直すのは、履歴が伸びるほど重くなる。
+-- ここに「どの半荘が変わったか」を版数つきで残しておけば、手元の写しに
+-- 変わった半荘だけを差し替えられる（mahjong/repo/queries.py の差分同期）。
+--
+-- round_created_at を目印に「それより新しい行」を取るだけでは足りない。
+-- update_round / delete_round は古い半荘を書き換えるため、作成日時は動かない。
+--
+-- ## 版数を順序に使う理由
+-- 通し番号（bigserial）は採番順とコミット順がずれる。番号10が先にコミットされ、
+-- 9 があとからコミットされると、「10 まで読んだ」人は 9 を永久に取りこぼす。
+-- group_revisions（004）の行はトランザクションの終わりまでロックされるので、
+-- 同じグループの版数はコミット順に振られる。フィードはその版数で刻む。
+--
+-- ## トリガの順序
+-- 同じ表・同じ操作の AFTER トリガは**名前の辞書順**に走る。
+-- 版数を進める `<表>_rev_<操作>` が、ここで作る `<表>_revlog_<操作>` より先に走るので
+-- （'_' < 'l'）、フィードには進めたあとの版数が入る。名前を変えるときは順序に注意。
+
+-- ===== フィード =====================================================
+-- op:
+--   'round' … その半荘（round_id）の行を取り直せば追いつける
+--   'reset' … 半荘をまたぐ変更（卓・開催日・大会の改名や削除、参加者の改名）。
+--             写しを捨てて全部読み直す
+CREATE TABLE IF NOT EXISTS public.round_changes (
+    id         bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    group_id   uuid NOT NULL REFERENCES public.groups(id) ON DELETE CASCADE,
+    revision   bigint NOT NULL,
+    op         text NOT NULL CHECK (op IN ('round', 'reset')),
+    round_id   uuid,
+    changed_at timestamptz NOT NULL DEFAULT now(),
+    CHECK ((op = 'round') = (round_id IS NOT NULL))
+);
+CREATE INDEX IF NOT EXISTS round_changes_group_rev_idx
+    ON public.round_changes (group_id, revision);
+
+ALTER TABLE public.round_changes ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS round_changes_select ON public.round_changes;
+CREATE POLICY round_changes_select ON public.round_changes FOR SELECT TO authenticated
+    USING (group_id IN (SELECT unnest(public.current_group_ids())));
+
+REVOKE ALL ON public.round_changes FROM anon, authenticated;
+GRANT SELECT ON public.round_changes TO authenticated;
+
+-- ===== 掃除済みの版数 ===============================================
+-- フィードは古い行から消す（下のトリガ）。消したあとでは「その版数から追いつけるか」が
+-- フィードを見ても分からない。写しの版数がここより小さければ、取りこぼしがあり得るので
+-- 差分は当てずに全部読み直す。グループごとに、消した行の最大の版数を持つ。
+CREATE TABLE IF NOT EXISTS public.round_changes_pruned (
+    group_id uuid PRIMARY KEY REFERENCES public.groups(id) ON DELETE CASCADE,
+    revision bigint NOT NULL
+);
+
+ALTER TABLE public.round_changes_pruned ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS round_changes_pruned_select ON public.round_changes_pruned;
+CREATE POLICY round_changes_pruned_select ON public.round_changes_pruned FOR SELECT TO authenticated
+    USING (group_id IN (SELECT unnest(public.current_group_ids())));
+
+REVOKE ALL ON public.round_changes_pruned FROM anon, authenticated;
+GRANT SELECT ON public.round_changes_pruned TO authenticated;
+
+-- この表より前に掃除した分は、どこまで消したかの記録が無い。残っている最古の行の
+-- 直前（フィードが空なら今の版数）まで消したものとみなす。行があるグループは触らない。
+INSERT INTO public.round_changes_pruned (group_id, revision)
+SELECT r.group_id,
+       COALESCE((SELECT min(c.revision) - 1 FROM public.round_changes c
+                 WHERE c.group_id = r.group_id), r.revision)
+FROM public.group_revisions r
+ON CONFLICT (group_id) DO NOTHING;
+
+
+-- ===== 記録するトリガ ===============================================
+-- 書き込みは所有者権限で行う（利用者にはフィードへの書き込み権限を渡さない）。
+-- 未ログインの扱いは 004 の bump_group_revision と同じ。
+CREATE OR REPLACE FUNCTION public.log_round_changes()
+RETURNS trigger LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+BEGIN
+    IF auth.uid() IS NULL
+       AND NULLIF(current_setting('request.jwt.claims', true), '') IS NOT NULL THEN
+        RAISE EXCEPTION 'ログインが必要です。' USING ERRCODE = '42501';
+    END IF;
+
+    IF TG_TABLE_NAME = 'game_rounds' THEN
+        INSERT INTO public.round_changes (group_id, revision, op, round_id)
+        SELECT n.group_id, r.revision, 'round', n.id
+        FROM new_rows n JOIN public.group_revisions r ON r.group_id = n.group_id;
+
+        -- 7日より古いフィードを掃除する。それより古い写しが残っていることもある
+        -- （見る人の少ないグループは LRU から押し出されない）ので、消した版数を
+        -- round_changes_pruned に残し、その写しには差分を当てさせない。
+        IF TG_OP = 'INSERT' THEN
+            WITH gone AS (
+                DELETE FROM public.round_changes c
+                WHERE c.group_id IN (SELECT DISTINCT n.group_id FROM new_rows n)
+                  AND c.changed_at < now() - interval '7 days'
+                RETURNING c.group_id, c.revision
+            )
+            INSERT INTO public.round_changes_pruned AS p (group_id, revision)
+            SELECT g.group_id, max(g.revision) FROM gone g GROUP BY g.group_id
+            ON CONFLICT (group_id) DO UPDATE
+                SET revision = GREATEST(p.revision, EXCLUDED.revision);
+        END IF;
+    ELSIF TG_TABLE_NAME = 'round_results' THEN
+        IF TG_OP = 'DELETE' THEN
+            INSERT INTO public.round_changes (group_id, revision, op, round_id)
+            SELECT DISTINCT o.group_id, r.revision, 'round', o.round_id
+            FROM old_rows o JOIN public.group_revisions r ON r.group_id = o.group_id;
+        ELSE
+            INSERT INTO public.round_changes (group_id, revision, op, round_id)
+            SELECT DISTINCT n.group_id, r.revision, 'round', n.round_id
+            FROM new_rows n JOIN public.group_revisions r ON r.group_id = n.group_id;
+        END IF;
+    ELSE
+        -- games / tournament_days / tournaments / players の UPDATE
+        INSERT INTO public.round_changes (group_id, revision, op)
+        SELECT DISTINCT n.group_id, r.revision, 'reset'
+        FROM new_rows n JOIN public.group_revisions r ON r.group_id = n.group_id;
+    END IF;
+    RETURN NULL;
+END $$;
+
+REVOKE ALL ON FUNCTION public.log_round_changes() FROM public, anon, authenticated;
+
+DO $$
+DECLARE t text;
+BEGIN
+    -- 半荘そのもの: 追加・更新（論理削除を含む）
+    EXECUTE 'DROP TRIGGER IF EXISTS game_rounds_revlog_ins ON public.game_rounds';
+    EXECUTE 'DROP TRIGGER IF EXISTS game_rounds_revlog_upd ON public.game_rounds';
+    EXECUTE $t$CREATE TRIGGER game_rounds_revlog_ins AFTER INSERT ON public.game_rounds
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.log_round_changes()$t$;
+    EXECUTE $t$CREATE TRIGGER game_rounds_revlog_upd AFTER UPDATE ON public.game_rounds
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.log_round_changes()$t$;
+
+    -- 1人分の結果: update_round_results は消してから入れ直す
+    EXECUTE 'DROP TRIGGER IF EXISTS round_results_revlog_ins ON public.round_results';
+    EXECUTE 'DROP TRIGGER IF EXISTS round_results_revlog_upd ON public.round_results';
+    EXECUTE 'DROP TRIGGER IF EXISTS round_results_revlog_del ON public.round_results';
+    EXECUTE $t$CREATE TRIGGER round_results_revlog_ins AFTER INSERT ON public.round_results
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.log_round_changes()$t$;
+    EXECUTE $t$CREATE TRIGGER round_results_revlog_upd AFTER UPDATE ON public.round_results
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.log_round_changes()$t$;
+    EXECUTE $t$CREATE TRIGGER round_results_revlog_del AFTER DELETE ON public.round_results
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.log_round_changes()$t$;
+
+    -- 半荘をまたいで見え方が変わるもの（名前・論理削除）。物理削除はさせていない。
+    FOREACH t IN ARRAY ARRAY['games', 'tournament_days', 'tournaments', 'players']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t || '_revlog_upd', t);
+        EXECUTE format($t$CREATE TRIGGER %I AFTER UPDATE ON public.%I
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION public.log_round_changes()$t$,
+            t || '_revlog_upd', t);
+    END LOOP;
+END $$;
+
+NOTIFY pgrst, 'reload schema';
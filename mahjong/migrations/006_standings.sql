@@ -0,0 +1,59 @@
+-- 順位表のサーバー側集計（冪等）
+--
+-- ホーム・大会・成績の画面は、順位表1枚のために v_round_entries をスコープまるごと
+-- 取り寄せ、Python の stats.aggregate() で数えていた。応答は「半荘数 × 人数」行に
+-- なり、何年も続くグループほど重い。ここでは足し算で済む量だけを DB で数え、
+-- 1人1行で返す。率や平均、金額への換算、並べ替えは従来どおり Python 側
+-- （stats.from_tallies）で行い、画面ごとの計算が2か所に分かれないようにする。
+--
+-- 返す列は stats.PlayerTally と1対1に対応する。数え方を変えるときは両方を直し、
+-- tests/test_stats.py の一致テストを通すこと。
+--   * rank_counts … 1〜4位の回数（長さ4）
+--   * rank_sum    … 順位の合計（平均順位用）
+--   * last_count  … 「その半荘の人数と同じ順位」の回数。3人卓と4人卓が混ざっても
+--                   ラスを取り違えない（v_round_entries の table_size を使う）
+--
+-- SECURITY INVOKER のまま v_round_entries（security_invoker）を読むので、
+-- 見える範囲は RLS がいつも通り決める。自分のグループ以外の ID を渡しても0行になる。
+
+CREATE OR REPLACE FUNCTION public.scope_standings(p_scope text, p_id uuid)
+RETURNS TABLE (
+    player_id   uuid,
+    games       integer,
+    total_point integer,
+    rank_sum    integer,
+    rank_counts integer[],
+    last_count  integer,
+    tobi_count  integer,
+    best_point  integer,
+    worst_point integer
+) LANGUAGE plpgsql STABLE SECURITY INVOKER SET search_path = '' AS $$
+BEGIN
+    -- 列名を format() で埋め込むので、許す名前を先に絞る（mahjong/repo/queries.py の _SCOPES）。
+    IF p_scope NOT IN ('group_id', 'tournament_id', 'day_id', 'game_id') THEN
+        RAISE EXCEPTION '不正な集計スコープです: %', p_scope USING ERRCODE = '22023';
+    END IF;
+
+    RETURN QUERY EXECUTE format($q$
+        SELECT e.player_id,
+               count(*)::int,
+               sum(e.point)::int,
+               sum(e.rank)::int,
+               ARRAY[count(*) FILTER (WHERE e.rank = 1),
+                     count(*) FILTER (WHERE e.rank = 2),
+                     count(*) FILTER (WHERE e.rank = 3),
+                     count(*) FILTER (WHERE e.rank = 4)]::int[],
+               (count(*) FILTER (WHERE e.rank = e.table_size))::int,
+               (count(*) FILTER (WHERE e.tobi))::int,
+               max(e.point)::int,
+               min(e.point)::int
+        FROM public.v_round_entries e
+        WHERE e.%I = $1
+        GROUP BY e.player_id
+    $q$, p_scope) USING p_id;
+END $$;
+
+REVOKE ALL ON FUNCTION public.scope_standings(text, uuid) FROM public, anon;
+GRANT EXECUTE ON FUNCTION public.scope_standings(text, uuid) TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
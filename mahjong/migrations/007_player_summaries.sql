@@ -0,0 +1,449 @@
+-- プレイヤーごとの集計表（冪等）
+--
+-- 006 の scope_standings で応答は1人1行になったが、DB の中では毎回
+-- スコープの全記録を数えていた。何年も続くグループの通算成績は、
+-- 画面を開くたびに全半荘を読むことになる。
+-- ここでは (スコープ, player_id) ごとの集計を表に持ち、書き込みのたびに
+-- 影響したプレイヤーの分だけ作り直す。順位表は人数分の行を読むだけになる。
+--
+-- ## 持つスコープ
+-- group_id / tournament_id / day_id の3つ。game_id（1卓）は記録が数十行しかないので
+-- 従来どおり v_round_entries から数える。
+--
+-- ## 保ち方
+-- 結果の INSERT / DELETE（半荘の追加・差し替え・再計算）は、その文で増減した半荘の分を
+-- 件数と合計に足し引きする。最初の版は毎回「記録が変わったプレイヤー」の全記録から
+-- 作り直していた。apply_recalculated_rounds（半荘ごとに DELETE と INSERT）や
+-- save_rounds_returning_state（半荘ごとに add_round_with_results）では、1回の呼び出しで
+-- 同じ人の全履歴を半荘数×2回数え直すことになり、長く続くグループでは文の時間制限にかかる。
+--
+-- 全記録から作り直す（refresh_player_summaries）のは次のときだけ。
+--   * 最大・最小は引き算で戻せない。消した点が記録中の最高点・最低点と同じだった人
+--   * 半荘の一部の席だけが増減した（卓の人数が変わり、同じ半荘の他の人のラスが動く）
+--   * 半荘の行がもう無い（半荘ごと物理削除されて、どのスコープだったか引けない）
+--   * 結果の UPDATE と、半荘・卓・開催日・大会の論理削除と復元（まれで、1文に1回）
+-- round_results (player_id) の索引があるので、1人分の全記録を読むのは軽い。
+--
+-- ## RPC ではなくトリガで保つ理由
+-- 004 と同じ。add_round_with_results / update_round_results / apply_recalculated_rounds
+-- に加えて、半荘・卓・開催日・大会の論理削除は REST から直接 deleted_at を UPDATE する。
+-- RPC ごとに書き足す方式だと、その経路と、あとから足す関数で漏れる。
+--
+-- ## 同時書き込み
+-- 同じ操作の AFTER トリガは名前の辞書順に走る。004 の `<表>_rev_<操作>` が
+-- ここで作る `<表>_sum_<操作>` より先に走り、group_revisions の行ロックを
+-- コミットまで握る。同じグループへの書き込みはここで1本に並ぶので、
+-- 作り直しの SELECT（READ COMMITTED なので文ごとに新しいスナップショット）は
+-- 先にコミットされた書き込みを必ず見る。名前を変えるときは順序に注意。
+
+-- ===== 集計表 =======================================================
+-- 列は stats.PlayerTally / 006 の scope_standings の戻り値と1対1に対応する。
+CREATE TABLE IF NOT EXISTS public.player_summaries (
+    scope       text NOT NULL CHECK (scope IN ('group_id', 'tournament_id', 'day_id')),
+    scope_id    uuid NOT NULL,
+    player_id   uuid NOT NULL,
+    group_id    uuid NOT NULL REFERENCES public.groups(id) ON DELETE CASCADE,
+    games       integer NOT NULL,
+    total_point integer NOT NULL,
+    rank_sum    integer NOT NULL,
+    rank_counts integer[] NOT NULL,
+    last_count  integer NOT NULL,
+    tobi_count  integer NOT NULL,
+    best_point  integer NOT NULL,
+    worst_point integer NOT NULL,
+    PRIMARY KEY (scope, scope_id, player_id)
+);
+-- 作り直しは (group_id, player_id) で消す
+CREATE INDEX IF NOT EXISTS player_summaries_player_idx
+    ON public.player_summaries (group_id, player_id);
+
+ALTER TABLE public.player_summaries ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS player_summaries_select ON public.player_summaries;
+CREATE POLICY player_summaries_select ON public.player_summaries FOR SELECT TO authenticated
+    USING (group_id IN (SELECT unnest(public.current_group_ids())));
+
+-- 読むだけ。書き込みは下のトリガ関数（所有者権限）だけが行う。
+REVOKE ALL ON public.player_summaries FROM anon, authenticated;
+GRANT SELECT ON public.player_summaries TO authenticated;
+
+
+-- ===== 数え方 =======================================================
+-- v_round_entries と同じ絞り込み（半荘・卓・開催日・大会の論理削除を除く。
+-- players は絞らない）で、1グループ・指定プレイヤー分を3スコープまとめて数える。
+-- p_player_ids が NULL ならグループの全員分（移行時の作り直しと検算用）。
+-- ビューを使わないのは、ビューの table_size が返す行ごとに索引を引いて数えるため
+-- （ページ単位の読み取りには向くが、グループ全員を数え直すここでは行数ぶん引く）。
+-- ここでは先に「指定の人が出た半荘」を絞り、その半荘の全席に窓関数を掛けて
+-- 人数を数えてから、指定の人の行だけを残す
+-- （最初の版は行ごとに相関副問い合わせで数えていた）。
+CREATE OR REPLACE FUNCTION public.summarize_players(p_group_id uuid, p_player_ids uuid[])
+RETURNS TABLE (
+    scope       text,
+    scope_id    uuid,
+    player_id   uuid,
+    group_id    uuid,
+    games       integer,
+    total_point integer,
+    rank_sum    integer,
+    rank_counts integer[],
+    last_count  integer,
+    tobi_count  integer,
+    best_point  integer,
+    worst_point integer
+) LANGUAGE sql STABLE SET search_path = '' AS $$
+    WITH mine AS (
+        SELECT DISTINCT rr.round_id
+        FROM public.round_results rr
+        WHERE rr.group_id = p_group_id
+          AND (p_player_ids IS NULL OR rr.player_id = ANY (p_player_ids))
+    ), sized AS (
+        SELECT rr.round_id, rr.player_id, rr.point, rr.rank, rr.tobi,
+               count(*) OVER (PARTITION BY rr.round_id)::int AS table_size
+        FROM public.round_results rr
+        JOIN mine m ON m.round_id = rr.round_id
+    ), e AS (
+        SELECT g.group_id, g.tournament_id, g.day_id, x.player_id,
+               x.point, x.rank, x.tobi, x.table_size
+        FROM sized x
+        JOIN public.game_rounds     r ON r.id = x.round_id  AND r.deleted_at IS NULL
+        JOIN public.games           g ON g.id = r.game_id   AND g.deleted_at IS NULL
+        JOIN public.tournament_days d ON d.id = g.day_id    AND d.deleted_at IS NULL
+        JOIN public.tournaments     t ON t.id = g.tournament_id AND t.deleted_at IS NULL
+        WHERE p_player_ids IS NULL OR x.player_id = ANY (p_player_ids)
+    )
+    SELECT s.scope, s.scope_id, e.player_id, e.group_id,
+           count(*)::int,
+           sum(e.point)::int,
+           sum(e.rank)::int,
+           ARRAY[count(*) FILTER (WHERE e.rank = 1),
+                 count(*) FILTER (WHERE e.rank = 2),
+                 count(*) FILTER (WHERE e.rank = 3),
+                 count(*) FILTER (WHERE e.rank = 4)]::int[],
+           (count(*) FILTER (WHERE e.rank = e.table_size))::int,
+           (count(*) FILTER (WHERE e.tobi))::int,
+           max(e.point)::int,
+           min(e.point)::int
+    FROM e
+    CROSS JOIN LATERAL (VALUES ('group_id', e.group_id),
+                               ('tournament_id', e.tournament_id),
+                               ('day_id', e.day_id)) AS s(scope, scope_id)
+    GROUP BY s.scope, s.scope_id, e.player_id, e.group_id
+$$;
+
+REVOKE ALL ON FUNCTION public.summarize_players(uuid, uuid[]) FROM public, anon, authenticated;
+
+-- 1グループ・指定プレイヤー分を消して入れ直す。記録が無くなった行（削除した大会だけに
+-- 出ていた人など）はここで消える。トリガ関数からだけ呼ぶ。
+CREATE OR REPLACE FUNCTION public.refresh_player_summaries(p_group_id uuid, p_player_ids uuid[])
+RETURNS void LANGUAGE plpgsql SET search_path = '' AS $$
+BEGIN
+    DELETE FROM public.player_summaries s
+    WHERE s.group_id = p_group_id AND s.player_id = ANY (p_player_ids);
+
+    INSERT INTO public.player_summaries
+        (scope, scope_id, player_id, group_id, games, total_point, rank_sum,
+         rank_counts, last_count, tobi_count, best_point, worst_point)
+    SELECT * FROM public.summarize_players(p_group_id, p_player_ids);
+END $$;
+
+REVOKE ALL ON FUNCTION public.refresh_player_summaries(uuid, uuid[])
+    FROM public, anon, authenticated;
+
+-- 結果の行の増減を、集計表の行の形（件数・合計・最大・最小）にまとめる。
+-- p_changed は1文で増えた（または消えた）行の jsonb 配列。半荘の全席がそろっている
+-- 前提で、卓の人数はその中で数える（人数を数えてから p_skip の人を除く）。
+-- 論理削除された半荘・卓・開催日・大会の行はもともと数えていないので何も返さない。
+CREATE OR REPLACE FUNCTION public.summary_delta(p_changed jsonb, p_skip uuid[])
+RETURNS SETOF public.player_summaries LANGUAGE sql STABLE SET search_path = '' AS $$
+    WITH e AS (
+        SELECT x.group_id, g.tournament_id, g.day_id, x.player_id,
+               x.point, x.rank, x.tobi,
+               count(*) OVER (PARTITION BY x.round_id)::int AS table_size
+        FROM jsonb_populate_recordset(NULL::public.round_results, p_changed) x
+        JOIN public.game_rounds     r ON r.id = x.round_id  AND r.deleted_at IS NULL
+        JOIN public.games           g ON g.id = r.game_id   AND g.deleted_at IS NULL
+        JOIN public.tournament_days d ON d.id = g.day_id    AND d.deleted_at IS NULL
+        JOIN public.tournaments     t ON t.id = g.tournament_id AND t.deleted_at IS NULL
+    )
+    SELECT s.scope, s.scope_id, e.player_id, e.group_id,
+           count(*)::int,
+           sum(e.point)::int,
+           sum(e.rank)::int,
+           ARRAY[count(*) FILTER (WHERE e.rank = 1),
+                 count(*) FILTER (WHERE e.rank = 2),
+                 count(*) FILTER (WHERE e.rank = 3),
+                 count(*) FILTER (WHERE e.rank = 4)]::int[],
+           (count(*) FILTER (WHERE e.rank = e.table_size))::int,
+           (count(*) FILTER (WHERE e.tobi))::int,
+           max(e.point)::int,
+           min(e.point)::int
+    FROM e
+    CROSS JOIN LATERAL (VALUES ('group_id', e.group_id),
+                               ('tournament_id', e.tournament_id),
+                               ('day_id', e.day_id)) AS s(scope, scope_id)
+    WHERE e.player_id <> ALL (p_skip)
+    GROUP BY s.scope, s.scope_id, e.player_id, e.group_id
+$$;
+
+REVOKE ALL ON FUNCTION public.summary_delta(jsonb, uuid[]) FROM public, anon, authenticated;
+
+-- 結果の INSERT / DELETE を集計表に足し引きする。p_added が true なら足す。
+-- 足し引きで済まない人（冒頭の「保ち方」）は全記録から作り直す。
+-- 行は遷移表を jsonb の配列にして受け取る（関数には遷移表を渡せない）。
+CREATE OR REPLACE FUNCTION public.apply_summary_delta(p_changed jsonb, p_added boolean)
+RETURNS void LANGUAGE plpgsql SET search_path = '' AS $$
+DECLARE
+    k record;
+    v_partial uuid[];
+    v_redo uuid[];
+BEGIN
+    -- 全席がそろっていない半荘。足したあとなら「いまある席数 = 足した席数」、
+    -- 消したあとなら「もう1席も無い」のが全席ぶんの増減。半荘の行が無いものも含める。
+    SELECT COALESCE(array_agg(c.round_id), '{}') INTO v_partial
+    FROM (SELECT x.round_id, count(*) AS n
+          FROM jsonb_populate_recordset(NULL::public.round_results, p_changed) x
+          GROUP BY x.round_id) c
+    WHERE (SELECT count(*) FROM public.round_results rr WHERE rr.round_id = c.round_id)
+              <> CASE WHEN p_added THEN c.n ELSE 0 END
+       OR NOT EXISTS (SELECT 1 FROM public.game_rounds r WHERE r.id = c.round_id);
+
+    -- その半荘の人は全員（残っている席も）作り直す
+    SELECT COALESCE(array_agg(DISTINCT x.player_id), '{}') INTO v_redo
+    FROM (SELECT y.player_id
+          FROM jsonb_populate_recordset(NULL::public.round_results, p_changed) y
+          WHERE y.round_id = ANY (v_partial)
+          UNION ALL
+          SELECT rr.player_id FROM public.round_results rr
+          WHERE rr.round_id = ANY (v_partial)) x;
+
+    IF NOT p_added THEN
+        -- 消した点が最高点・最低点と同じなら、次点は数え直さないと分からない
+        SELECT v_redo || COALESCE(array_agg(DISTINCT d.player_id), '{}') INTO v_redo
+        FROM public.summary_delta(p_changed, v_redo) d
+        JOIN public.player_summaries s
+          ON s.scope = d.scope AND s.scope_id = d.scope_id AND s.player_id = d.player_id
+        WHERE d.best_point >= s.best_point OR d.worst_point <= s.worst_point;
+    END IF;
+
+    -- 作り直しはその人の行を消して全記録で入れ直すので、下の足し引きには含めない
+    FOR k IN SELECT x.group_id, array_agg(DISTINCT x.player_id) AS ids
+             FROM (SELECT y.group_id, y.player_id
+                   FROM jsonb_populate_recordset(NULL::public.round_results, p_changed) y
+                   UNION ALL
+                   SELECT rr.group_id, rr.player_id FROM public.round_results rr
+                   WHERE rr.round_id = ANY (v_partial)) x
+             WHERE x.player_id = ANY (v_redo)
+             GROUP BY x.group_id ORDER BY 1
+    LOOP
+        PERFORM public.refresh_player_summaries(k.group_id, k.ids);
+    END LOOP;
+
+    IF p_added THEN
+        INSERT INTO public.player_summaries AS s
+            (scope, scope_id, player_id, group_id, games, total_point, rank_sum,
+             rank_counts, last_count, tobi_count, best_point, worst_point)
+        SELECT * FROM public.summary_delta(p_changed, v_redo)
+        ON CONFLICT (scope, scope_id, player_id) DO UPDATE SET
+            games       = s.games + EXCLUDED.games,
+            total_point = s.total_point + EXCLUDED.total_point,
+            rank_sum    = s.rank_sum + EXCLUDED.rank_sum,
+            rank_counts = ARRAY[s.rank_counts[1] + EXCLUDED.rank_counts[1],
+                                s.rank_counts[2] + EXCLUDED.rank_counts[2],
+                                s.rank_counts[3] + EXCLUDED.rank_counts[3],
+                                s.rank_counts[4] + EXCLUDED.rank_counts[4]],
+            last_count  = s.last_count + EXCLUDED.last_count,
+            tobi_count  = s.tobi_count + EXCLUDED.tobi_count,
+            best_point  = GREATEST(s.best_point, EXCLUDED.best_point),
+            worst_point = LEAST(s.worst_point, EXCLUDED.worst_point);
+    ELSE
+        -- ここに来る人は最高点・最低点を消していないので、最大・最小はそのまま。
+        -- 全件を消した人は最高点も消しているので、件数が 0 の行はここでは生まれない。
+        UPDATE public.player_summaries s SET
+            games       = s.games - d.games,
+            total_point = s.total_point - d.total_point,
+            rank_sum    = s.rank_sum - d.rank_sum,
+            rank_counts = ARRAY[s.rank_counts[1] - d.rank_counts[1],
+                                s.rank_counts[2] - d.rank_counts[2],
+                                s.rank_counts[3] - d.rank_counts[3],
+                                s.rank_counts[4] - d.rank_counts[4]],
+            last_count  = s.last_count - d.last_count,
+            tobi_count  = s.tobi_count - d.tobi_count
+        FROM public.summary_delta(p_changed, v_redo) d
+        WHERE s.scope = d.scope AND s.scope_id = d.scope_id AND s.player_id = d.player_id;
+    END IF;
+END $$;
+
+REVOKE ALL ON FUNCTION public.apply_summary_delta(jsonb, boolean)
+    FROM public, anon, authenticated;
+
+
+-- ===== 保つトリガ ===================================================
+-- 文ごとに1回、遷移表から影響した行を拾う。結果の INSERT / DELETE は足し引き
+-- （apply_summary_delta）、それ以外は影響した (group_id, player_id) を作り直す。
+-- 未ログインの扱いは 004 の bump_group_revision と同じ。
+CREATE OR REPLACE FUNCTION public.sync_player_summaries()
+RETURNS trigger LANGUAGE plpgsql SECURITY DEFINER SET search_path = '' AS $$
+DECLARE k record;
+BEGIN
+    IF auth.uid() IS NULL
+       AND NULLIF(current_setting('request.jwt.claims', true), '') IS NOT NULL THEN
+        RAISE EXCEPTION 'ログインが必要です。' USING ERRCODE = '42501';
+    END IF;
+
+    IF TG_TABLE_NAME = 'round_results' THEN
+        -- 結果そのもの。update_round_results は消してから入れ直す。増減した分だけ足し引きする。
+        IF TG_OP = 'INSERT' THEN
+            PERFORM public.apply_summary_delta((SELECT jsonb_agg(n) FROM new_rows n), true);
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM public.apply_summary_delta((SELECT jsonb_agg(o) FROM old_rows o), false);
+        ELSE
+            -- apply_recalculated_rounds は点と順位を書き換える。席替えで player_id が
+            -- 動いても取りこぼさないよう、新旧の両方を拾う。
+            FOR k IN SELECT x.group_id, array_agg(DISTINCT x.player_id) AS ids
+                     FROM (SELECT n.group_id, n.player_id FROM new_rows n
+                           UNION SELECT o.group_id, o.player_id FROM old_rows o) x
+                     GROUP BY x.group_id ORDER BY 1
+            LOOP
+                PERFORM public.refresh_player_summaries(k.group_id, k.ids);
+            END LOOP;
+        END IF;
+    ELSIF TG_TABLE_NAME = 'game_rounds' THEN
+        -- 半荘の論理削除・復元。改名のような deleted_at の動かない UPDATE は数え直さない。
+        FOR k IN SELECT n.group_id, array_agg(DISTINCT rr.player_id) AS ids
+                 FROM new_rows n
+                 JOIN old_rows o ON o.id = n.id
+                 JOIN public.round_results rr ON rr.round_id = n.id
+                 WHERE n.deleted_at IS DISTINCT FROM o.deleted_at
+                 GROUP BY n.group_id ORDER BY 1
+        LOOP
+            PERFORM public.refresh_player_summaries(k.group_id, k.ids);
+        END LOOP;
+    ELSIF TG_TABLE_NAME = 'games' THEN
+        FOR k IN SELECT n.group_id, array_agg(DISTINCT gp.player_id) AS ids
+                 FROM new_rows n
+                 JOIN old_rows o ON o.id = n.id
+                 JOIN public.game_players gp ON gp.game_id = n.id
+                 WHERE n.deleted_at IS DISTINCT FROM o.deleted_at
+                 GROUP BY n.group_id ORDER BY 1
+        LOOP
+            PERFORM public.refresh_player_summaries(k.group_id, k.ids);
+        END LOOP;
+    ELSIF TG_TABLE_NAME = 'tournament_days' THEN
+        FOR k IN SELECT n.group_id, array_agg(DISTINCT gp.player_id) AS ids
+                 FROM new_rows n
+                 JOIN old_rows o ON o.id = n.id
+                 JOIN public.games g ON g.day_id = n.id
+                 JOIN public.game_players gp ON gp.game_id = g.id
+                 WHERE n.deleted_at IS DISTINCT FROM o.deleted_at
+                 GROUP BY n.group_id ORDER BY 1
+        LOOP
+            PERFORM public.refresh_player_summaries(k.group_id, k.ids);
+        END LOOP;
+    ELSE
+        -- tournaments
+        FOR k IN SELECT n.group_id, array_agg(DISTINCT gp.player_id) AS ids
+                 FROM new_rows n
+                 JOIN old_rows o ON o.id = n.id
+                 JOIN public.games g ON g.tournament_id = n.id
+                 JOIN public.game_players gp ON gp.game_id = g.id
+                 WHERE n.deleted_at IS DISTINCT FROM o.deleted_at
+                 GROUP BY n.group_id ORDER BY 1
+        LOOP
+            PERFORM public.refresh_player_summaries(k.group_id, k.ids);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END $$;
+
+REVOKE ALL ON FUNCTION public.sync_player_summaries() FROM public, anon, authenticated;
+
+DO $$
+DECLARE t text;
+BEGIN
+    EXECUTE 'DROP TRIGGER IF EXISTS round_results_sum_ins ON public.round_results';
+    EXECUTE 'DROP TRIGGER IF EXISTS round_results_sum_upd ON public.round_results';
+    EXECUTE 'DROP TRIGGER IF EXISTS round_results_sum_del ON public.round_results';
+    EXECUTE $t$CREATE TRIGGER round_results_sum_ins AFTER INSERT ON public.round_results
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.sync_player_summaries()$t$;
+    EXECUTE $t$CREATE TRIGGER round_results_sum_upd AFTER UPDATE ON public.round_results
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.sync_player_summaries()$t$;
+    EXECUTE $t$CREATE TRIGGER round_results_sum_del AFTER DELETE ON public.round_results
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION public.sync_player_summaries()$t$;
+
+    -- 論理削除（deleted_at の UPDATE）。半荘の追加は結果の INSERT で拾える。
+    FOREACH t IN ARRAY ARRAY['game_rounds', 'games', 'tournament_days', 'tournaments']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t || '_sum_upd', t);
+        EXECUTE format($t$CREATE TRIGGER %I AFTER UPDATE ON public.%I
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION public.sync_player_summaries()$t$,
+            t || '_sum_upd', t);
+    END LOOP;
+END $$;
+
+
+-- ===== 既存データからの作り直し =====================================
+-- 何度流しても同じ結果になるよう、全部消してから数える。
+DELETE FROM public.player_summaries;
+INSERT INTO public.player_summaries
+    (scope, scope_id, player_id, group_id, games, total_point, rank_sum,
+     rank_counts, last_count, tobi_count, best_point, worst_point)
+SELECT s.*
+FROM public.groups gr
+CROSS JOIN LATERAL public.summarize_players(gr.id, NULL) s;
+
+
+-- ===== 順位表の RPC を集計表から読むように =========================
+-- 戻り値の形は 006 と同じ。呼び出し側（queries.fetch_standings）は変わらない。
+CREATE OR REPLACE FUNCTION public.scope_standings(p_scope text, p_id uuid)
+RETURNS TABLE (
+    player_id   uuid,
+    games       integer,
+    total_point integer,
+    rank_sum    integer,
+    rank_counts integer[],
+    last_count  integer,
+    tobi_count  integer,
+    best_point  integer,
+    worst_point integer
+) LANGUAGE plpgsql STABLE SECURITY INVOKER SET search_path = '' AS $$
+BEGIN
+    IF p_scope NOT IN ('group_id', 'tournament_id', 'day_id', 'game_id') THEN
+        RAISE EXCEPTION '不正な集計スコープです: %', p_scope USING ERRCODE = '22023';
+    END IF;
+
+    IF p_scope <> 'game_id' THEN
+        RETURN QUERY
+        SELECT s.player_id, s.games, s.total_point, s.rank_sum, s.rank_counts,
+               s.last_count, s.tobi_count, s.best_point, s.worst_point
+        FROM public.player_summaries s
+        WHERE s.scope = p_scope AND s.scope_id = p_id;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT e.player_id,
+           count(*)::int,
+           sum(e.point)::int,
+           sum(e.rank)::int,
+           ARRAY[count(*) FILTER (WHERE e.rank = 1),
+                 count(*) FILTER (WHERE e.rank = 2),
+                 count(*) FILTER (WHERE e.rank = 3),
+                 count(*) FILTER (WHERE e.rank = 4)]::int[],
+           (count(*) FILTER (WHERE e.rank = e.table_size))::int,
+           (count(*) FILTER (WHERE e.tobi))::int,
+           max(e.point)::int,
+           min(e.point)::int
+    FROM public.v_round_entries e
+    WHERE e.game_id = p_id
+    GROUP BY e.player_id;
+END $$;
+
+REVOKE ALL ON FUNCTION public.scope_standings(text, uuid) FROM public, anon;
+GRANT EXECUTE ON FUNCTION public.scope_standings(text, uuid) TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
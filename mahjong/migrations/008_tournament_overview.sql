@@ -0,0 +1,46 @@
+-- 大会一覧の要約ビュー（冪等）
+--
+-- 大会一覧の画面は、大会ごとに list_days() と count_rounds() を呼んでいた。
+-- count_rounds() は半荘数を数えるためだけに大会の v_round_entries をまるごと取り寄せる。
+-- 大会が40あれば80往復を超え、応答は数MBになる。
+-- ここで大会ごとの要約を1行にまとめ、一覧は1往復で済ませる。
+--
+-- 半荘数と参加者数は 007 の集計表（大会スコープ）から引く。
+-- どの半荘にも1位がちょうど1人いる（round_results の UNIQUE (round_id, rank)）ので、
+-- 1位の回数の合計が半荘数になる。集計表は人数分の行しかないので、
+-- 大会の記録がどれだけ長くても数え直さない。
+--
+--   day_count      … 開催日の数（記録の無い日も数える。画面の「開催日」と同じ）
+--   round_count    … 半荘数（論理削除した半荘・卓・開催日を除く）
+--   player_count   … 1半荘以上打った参加者の数
+--   last_played_on … 記録のある開催日のうち最も新しい日。記録が無ければ NULL
+
+DROP VIEW IF EXISTS public.v_tournament_overview;
+CREATE VIEW public.v_tournament_overview WITH (security_invoker = true) AS
+SELECT
+    t.id, t.group_id, t.name, t.ruleset, t.note, t.created_by, t.created_at,
+    COALESCE(ds.day_count, 0)    AS day_count,
+    COALESCE(ps.round_count, 0)  AS round_count,
+    COALESCE(ps.player_count, 0) AS player_count,
+    ds.last_played_on
+FROM public.tournaments t
+LEFT JOIN LATERAL (
+    SELECT count(*)::int AS day_count,
+           max(d.held_on) FILTER (WHERE EXISTS (
+               SELECT 1 FROM public.player_summaries s
+               WHERE s.scope = 'day_id' AND s.scope_id = d.id)) AS last_played_on
+    FROM public.tournament_days d
+    WHERE d.tournament_id = t.id AND d.deleted_at IS NULL
+) ds ON true
+LEFT JOIN LATERAL (
+    SELECT sum(s.rank_counts[1])::int AS round_count,
+           count(*)::int              AS player_count
+    FROM public.player_summaries s
+    WHERE s.scope = 'tournament_id' AND s.scope_id = t.id
+) ps ON true
+WHERE t.deleted_at IS NULL;
+
+REVOKE ALL ON public.v_tournament_overview FROM anon;
+GRANT SELECT ON public.v_tournament_overview TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,37 @@
+-- 半荘数だけを返す RPC（冪等）
+--
+-- 「全 N 半荘」の表示のために、queries.count_rounds() はスコープの v_round_entries を
+-- まるごと取り寄せて round_id の集合を作っていた。グループ通算なら数MBの応答が
+-- 整数1つのために流れる。ここで数えて整数だけを返す。
+--
+-- PostgREST の count=exact（HEAD）でも game_rounds の件数は取れるが、
+-- 卓・開催日・大会の論理削除で絞るには埋め込みの !inner を3段重ねる必要があり、
+-- 絞り忘れると v_round_entries と数が合わなくなる。数え方を1か所に置くため RPC にする。
+--
+-- group_id / tournament_id / day_id は 007 の集計表から数える。どの半荘にも1位が
+-- ちょうど1人いる（UNIQUE (round_id, rank)）ので、1位の回数の合計が半荘数になる。
+-- game_id（1卓）は記録が少ないので v_round_entries を直接数える。
+
+CREATE OR REPLACE FUNCTION public.scope_round_count(p_scope text, p_id uuid)
+RETURNS integer LANGUAGE plpgsql STABLE SECURITY INVOKER SET search_path = '' AS $$
+DECLARE v_count integer;
+BEGIN
+    IF p_scope NOT IN ('group_id', 'tournament_id', 'day_id', 'game_id') THEN
+        RAISE EXCEPTION '不正な集計スコープです: %', p_scope USING ERRCODE = '22023';
+    END IF;
+
+    IF p_scope = 'game_id' THEN
+        SELECT count(DISTINCT e.round_id)::int INTO v_count
+        FROM public.v_round_entries e WHERE e.game_id = p_id;
+    ELSE
+        SELECT COALESCE(sum(s.rank_counts[1]), 0)::int INTO v_count
+        FROM public.player_summaries s
+        WHERE s.scope = p_scope AND s.scope_id = p_id;
+    END IF;
+    RETURN v_count;
+END $$;
+
+REVOKE ALL ON FUNCTION public.scope_round_count(text, uuid) FROM public, anon;
+GRANT EXECUTE ON FUNCTION public.scope_round_count(text, uuid) TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
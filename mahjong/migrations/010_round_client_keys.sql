@@ -0,0 +1,69 @@
+-- 半荘の保存を冪等にする（画面が振る client_key）
+--
+-- 卓で電波が切れると、add_round_with_results は「届いて保存されたが応答だけ落ちた」
+-- ことがある。画面（views/game.py）は保存待ちの列に積んでおき、つながったら
+-- 順に送り直すので、同じ半荘が2回届いても1件にしかならないようにする。
+--
+-- 画面が保存待ちに積むときに UUID を1つ振り、送り直しでも同じ値を送る。
+-- 同じ卓・同じキーの半荘がすでにあれば、新しく作らずにその id を返す。
+-- キーを送らない呼び出し（古い画面）はこれまでどおり毎回1件作る。
+
+ALTER TABLE public.game_rounds ADD COLUMN IF NOT EXISTS client_key uuid;
+
+-- 同じ送り直しが同時に2本届いたときの最後の砦。先に入った方だけが残る。
+CREATE UNIQUE INDEX IF NOT EXISTS game_rounds_client_key_uniq
+    ON public.game_rounds (game_id, client_key) WHERE client_key IS NOT NULL;
+
+-- 引数を1つ足す。2引数版を残すと、PostgREST は p_client_key を省いた呼び出しを
+-- どちらに振るか決められない（PGRST203）ので消してから作り直す。
+DROP FUNCTION IF EXISTS public.add_round_with_results(uuid, jsonb);
+
+CREATE OR REPLACE FUNCTION public.add_round_with_results(
+    p_game_id uuid, p_results jsonb, p_client_key uuid DEFAULT NULL
+) RETURNS uuid LANGUAGE plpgsql SECURITY INVOKER SET search_path = '' AS $$
+DECLARE v_round_id uuid; v_group_id uuid; v_ruleset jsonb;
+BEGIN
+    IF p_client_key IS NOT NULL THEN
+        -- 送り直し。あとから論理削除されていても作り直さない（消したのは利用者の意思）。
+        SELECT gr.id INTO v_round_id FROM public.game_rounds gr
+        WHERE gr.game_id = p_game_id AND gr.client_key = p_client_key;
+        IF FOUND THEN
+            RETURN v_round_id;
+        END IF;
+    END IF;
+
+    SELECT g.group_id, COALESCE(t.ruleset, '{}'::jsonb) INTO v_group_id, v_ruleset
+    FROM public.games g JOIN public.tournaments t ON t.id = g.tournament_id
+    WHERE g.id = p_game_id AND g.deleted_at IS NULL;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION '対戦が見つかりません。';
+    END IF;
+
+    PERFORM public.assert_results_match_seats(p_game_id, p_results);
+
+    -- 適用したルールをここで固定する（003d と同じ）。
+    BEGIN
+        INSERT INTO public.game_rounds (game_id, group_id, ruleset, client_key)
+        VALUES (p_game_id, v_group_id, v_ruleset, p_client_key) RETURNING id INTO v_round_id;
+    EXCEPTION WHEN unique_violation THEN
+        -- 同じキーの送り直しが同時に届き、先に入った方が確定した。そちらを返す。
+        SELECT gr.id INTO v_round_id FROM public.game_rounds gr
+        WHERE gr.game_id = p_game_id AND gr.client_key = p_client_key;
+        RETURN v_round_id;
+    END;
+
+    INSERT INTO public.round_results
+        (round_id, group_id, player_id, seat, raw_score, point, rank, kaze, tobi)
+    SELECT v_round_id, v_group_id,
+           (e->>'player_id')::uuid, (e->>'seat')::smallint,
+           (e->>'raw_score')::int, (e->>'point')::int, (e->>'rank')::smallint,
+           e->>'kaze', COALESCE((e->>'tobi')::boolean, false)
+    FROM jsonb_array_elements(p_results) AS e;
+
+    RETURN v_round_id;
+END $$;
+
+REVOKE ALL ON FUNCTION public.add_round_with_results(uuid, jsonb, uuid) FROM public, anon;
+GRANT EXECUTE ON FUNCTION public.add_round_with_results(uuid, jsonb, uuid) TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
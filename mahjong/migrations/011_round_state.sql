@@ -0,0 +1,93 @@
+-- 半荘の追加・修正・削除の応答で、その卓の最新の状態を返す RPC（冪等）
+--
+-- スコア入力の画面は保存のたびにページを頭から再実行し、
+--   get_game()（v_game_seats）・get_ruleset()（tournaments）・list_rounds()（v_round_entries）
+-- を読み直していた。書き込みと合わせて4往復。卓でいちばん多い操作なので、
+-- 書き込んだ同じトランザクションの中で卓の状態を組み立てて返し、1往復にする。
+--
+-- 既存の add_round_with_results / update_round_results は戻り値の型を変えない
+-- （変えると古い画面が壊れる）。ここでは中身をそのまま呼ぶ *_returning_state を足す。
+-- 010 を先に適用すること（add_round_with_results の3引数版を呼ぶ）。
+--
+-- 返すもの（game_state）:
+--   seats      v_game_seats の行（席順）         … get_game() と同じ形
+--   entries    v_round_entries の行（作成順・席順）… list_rounds() と同じ形
+--   tournament 大会の行（tournaments._COLUMNS の列）… get_ruleset() と同じ形
+-- どれも SECURITY INVOKER のまま security_invoker のビューを読むので、
+-- 画面が自分で読んだときと同じ RLS が掛かる。
+
+CREATE OR REPLACE FUNCTION public.game_state(p_game_id uuid)
+RETURNS jsonb LANGUAGE sql STABLE SECURITY INVOKER SET search_path = '' AS $$
+    SELECT jsonb_build_object(
+        'seats', COALESCE((
+            SELECT jsonb_agg(to_jsonb(s) ORDER BY s.seat)
+            FROM public.v_game_seats s WHERE s.game_id = p_game_id
+        ), '[]'::jsonb),
+        'entries', COALESCE((
+            SELECT jsonb_agg(to_jsonb(e) ORDER BY e.round_created_at, e.round_id, e.seat)
+            FROM public.v_round_entries e WHERE e.game_id = p_game_id
+        ), '[]'::jsonb),
+        'tournament', (
+            SELECT jsonb_build_object(
+                'id', t.id, 'group_id', t.group_id, 'name', t.name, 'ruleset', t.ruleset,
+                'note', t.note, 'created_by', t.created_by, 'created_at', t.created_at
+            )
+            FROM public.games g JOIN public.tournaments t ON t.id = g.tournament_id
+            WHERE g.id = p_game_id AND t.deleted_at IS NULL
+        )
+    );
+$$;
+
+
+CREATE OR REPLACE FUNCTION public.add_round_returning_state(
+    p_game_id uuid, p_results jsonb, p_client_key uuid DEFAULT NULL
+) RETURNS jsonb LANGUAGE plpgsql SECURITY INVOKER SET search_path = '' AS $$
+DECLARE v_round_id uuid;
+BEGIN
+    v_round_id := public.add_round_with_results(p_game_id, p_results, p_client_key);
+    RETURN public.game_state(p_game_id) || jsonb_build_object('round_id', v_round_id);
+END $$;
+
+
+CREATE OR REPLACE FUNCTION public.update_round_returning_state(
+    p_round_id uuid, p_results jsonb
+) RETURNS jsonb LANGUAGE plpgsql SECURITY INVOKER SET search_path = '' AS $$
+DECLARE v_game_id uuid;
+BEGIN
+    PERFORM public.update_round_results(p_round_id, p_results);
+    SELECT gr.game_id INTO v_game_id FROM public.game_rounds gr WHERE gr.id = p_round_id;
+    RETURN public.game_state(v_game_id);
+END $$;
+
+
+-- 論理削除。時刻は画面が決めて渡す（repo._base.soft_delete と同じ）。
+-- 送り直しで同じ時刻がもう一度届いても、同じ値を書くだけで何も変わらない。
+CREATE OR REPLACE FUNCTION public.delete_round_returning_state(
+    p_round_id uuid, p_deleted_at timestamptz
+) RETURNS jsonb LANGUAGE plpgsql SECURITY INVOKER SET search_path = '' AS $$
+DECLARE v_game_id uuid;
+BEGIN
+    UPDATE public.game_rounds SET deleted_at = p_deleted_at
+    WHERE id = p_round_id AND (deleted_at IS NULL OR deleted_at = p_deleted_at)
+    RETURNING game_id INTO v_game_id;
+    -- UPDATE も該当ポリシーが無いと「エラーを出さずに0行」になる。
+    IF NOT FOUND THEN
+        RAISE EXCEPTION '半荘が見つかりません。';
+    END IF;
+    RETURN public.game_state(v_game_id);
+END $$;
+
+REVOKE ALL ON FUNCTION
+    public.game_state(uuid),
+    public.add_round_returning_state(uuid, jsonb, uuid),
+    public.update_round_returning_state(uuid, jsonb),
+    public.delete_round_returning_state(uuid, timestamptz)
+    FROM public, anon;
+GRANT EXECUTE ON FUNCTION
+    public.game_state(uuid),
+    public.add_round_returning_state(uuid, jsonb, uuid),
+    public.update_round_returning_state(uuid, jsonb),
+    public.delete_round_returning_state(uuid, timestamptz)
+    TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
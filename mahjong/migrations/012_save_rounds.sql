@@ -0,0 +1,68 @@
+-- 1卓の半荘をまとめて追加・差し替えする RPC（冪等）
+--
+-- 紙の記録表から一晩ぶんを写すとき、半荘ごとに add_round_with_results を呼んで
+-- ページを再実行していた（20半荘で約80往復）。画面（views/game.py の「まとめて」）は
+-- 表で全部を計算してから、ここへ1回で送る。1トランザクションなので、
+-- 途中の1行が弾かれれば全部が巻き戻り、半端に写した状態は残らない。
+--
+-- p_rounds は配列。1要素が1半荘で、
+--   {"round_id": null, "client_key": "<uuid>", "results": [...]}  … 追加（010 と同じキーの扱い）
+--   {"round_id": "<uuid>", "results": [...]}                       … その半荘を差し替え
+-- 席との照合（assert_results_match_seats）は、中で呼ぶ add_round_with_results /
+-- update_round_results がそれぞれ行う。010・011 を先に適用すること。
+--
+-- 戻り値は 011 の game_state に、送った順の半荘 id（round_ids）を足したもの。
+
+CREATE OR REPLACE FUNCTION public.save_rounds_returning_state(
+    p_game_id uuid, p_rounds jsonb
+) RETURNS jsonb LANGUAGE plpgsql SECURITY INVOKER SET search_path = '' AS $$
+DECLARE
+    e jsonb; v_round_id uuid; v_key uuid;
+    v_ids jsonb := '[]'::jsonb; v_new jsonb := '[]'::jsonb;
+BEGIN
+    IF jsonb_typeof(p_rounds) IS DISTINCT FROM 'array' OR jsonb_array_length(p_rounds) = 0 THEN
+        RAISE EXCEPTION '保存する半荘がありません。' USING ERRCODE = '22023';
+    END IF;
+    IF jsonb_array_length(p_rounds) > 100 THEN
+        RAISE EXCEPTION '一度に保存できるのは100半荘までです。' USING ERRCODE = '22023';
+    END IF;
+
+    FOR e IN SELECT * FROM jsonb_array_elements(p_rounds) LOOP
+        IF e->>'round_id' IS NOT NULL THEN
+            v_round_id := (e->>'round_id')::uuid;
+            -- 別の卓の半荘を、この卓の席で書き換えさせない
+            PERFORM 1 FROM public.game_rounds gr
+            WHERE gr.id = v_round_id AND gr.game_id = p_game_id AND gr.deleted_at IS NULL;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'この卓に属さない半荘が含まれています: %', v_round_id;
+            END IF;
+            PERFORM public.update_round_results(v_round_id, e->'results');
+        ELSE
+            v_key := (e->>'client_key')::uuid;
+            v_round_id := NULL;
+            IF v_key IS NOT NULL THEN
+                SELECT gr.id INTO v_round_id FROM public.game_rounds gr
+                WHERE gr.game_id = p_game_id AND gr.client_key = v_key;
+            END IF;
+            IF v_round_id IS NULL THEN
+                v_round_id := public.add_round_with_results(p_game_id, e->'results', v_key);
+                v_new := v_new || to_jsonb(v_round_id);
+            END IF;
+        END IF;
+        v_ids := v_ids || to_jsonb(v_round_id);
+    END LOOP;
+
+    -- 同じトランザクションで作った半荘は created_at（= now()）がすべて同じになり、
+    -- 画面の並び（created_at, id）が送った順にならない。送った順に 1ms ずつずらす。
+    UPDATE public.game_rounds gr
+    SET created_at = now() + x.ord * interval '1 millisecond'
+    FROM jsonb_array_elements_text(v_new) WITH ORDINALITY AS x(id, ord)
+    WHERE gr.id = x.id::uuid;
+
+    RETURN public.game_state(p_game_id) || jsonb_build_object('round_ids', v_ids);
+END $$;
+
+REVOKE ALL ON FUNCTION public.save_rounds_returning_state(uuid, jsonb) FROM public, anon;
+GRANT EXECUTE ON FUNCTION public.save_rounds_returning_state(uuid, jsonb) TO authenticated;
+
+NOTIFY pgrst, 'reload schema';
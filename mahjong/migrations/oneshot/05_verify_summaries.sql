@@ -0,0 +1,64 @@
+-- 集計表（player_summaries）の検算（読み取り専用）。007 を適用したあと、いつでも実行してよい。
+--
+-- トリガで保っている集計表を、v_round_entries から一から数え直したものと突き合わせる。
+-- 007 の summarize_players() ではなくビューから数えるので、
+-- 「数え方そのものがビューとずれている」ことも見つかる。
+-- SQL Editor（postgres）は RLS を素通りするので、全グループがまとめて検算される。
+
+-- ===== 1. ★検算★ 食い違う行（0行であること） =====================
+-- side = 'stored'  … 集計表にだけある／値が違う（トリガの取りこぼし・消し忘れ）
+-- side = 'rebuilt' … 数え直しにだけある／値が違う（集計表に反映されていない書き込み）
+WITH rebuilt AS (
+    SELECT s.scope, s.scope_id, e.player_id, e.group_id,
+           count(*)::int                                   AS games,
+           sum(e.point)::int                               AS total_point,
+           sum(e.rank)::int                                AS rank_sum,
+           ARRAY[count(*) FILTER (WHERE e.rank = 1),
+                 count(*) FILTER (WHERE e.rank = 2),
+                 count(*) FILTER (WHERE e.rank = 3),
+                 count(*) FILTER (WHERE e.rank = 4)]::int[] AS rank_counts,
+           (count(*) FILTER (WHERE e.rank = e.table_size))::int AS last_count,
+           (count(*) FILTER (WHERE e.tobi))::int           AS tobi_count,
+           max(e.point)::int                               AS best_point,
+           min(e.point)::int                               AS worst_point
+    FROM public.v_round_entries e
+    CROSS JOIN LATERAL (VALUES ('group_id', e.group_id),
+                               ('tournament_id', e.tournament_id),
+                               ('day_id', e.day_id)) AS s(scope, scope_id)
+    GROUP BY s.scope, s.scope_id, e.player_id, e.group_id
+),
+stored AS (
+    SELECT scope, scope_id, player_id, group_id, games, total_point, rank_sum,
+           rank_counts, last_count, tobi_count, best_point, worst_point
+    FROM public.player_summaries
+)
+SELECT 'stored' AS side, * FROM (SELECT * FROM stored EXCEPT SELECT * FROM rebuilt) x
+UNION ALL
+SELECT 'rebuilt' AS side, * FROM (SELECT * FROM rebuilt EXCEPT SELECT * FROM stored) y
+ORDER BY group_id, scope, scope_id, player_id, side;
+
+
+-- ===== 2. 件数の目安 ================================================
+-- グループ通算の行数は「記録のある参加者数」と一致するはず。
+SELECT g.name AS "グループ",
+       count(*) FILTER (WHERE s.scope = 'group_id')      AS "通算の行",
+       count(*) FILTER (WHERE s.scope = 'tournament_id') AS "大会別の行",
+       count(*) FILTER (WHERE s.scope = 'day_id')        AS "開催日別の行",
+       (SELECT count(DISTINCT e.player_id) FROM public.v_round_entries e
+        WHERE e.group_id = g.id)                         AS "記録のある参加者"
+FROM public.groups g
+LEFT JOIN public.player_summaries s ON s.group_id = g.id
+GROUP BY g.id, g.name
+ORDER BY g.name;
+
+
+-- ===== 3. 食い違いが出たときの直し方（書き込む。必要なときだけ） ====
+-- 1 で行が出たグループだけ作り直す。<グループのuuid> を置き換えて実行する。
+/*
+BEGIN;
+    SELECT public.refresh_player_summaries(
+        '<グループのuuid>'::uuid,
+        ARRAY(SELECT id FROM public.players WHERE group_id = '<グループのuuid>'::uuid));
+    -- 1 をもう一度流して0行になってから
+COMMIT;
+*/
@@ -6,17 +6,29 @@
     tournaments 大会・開催日
     games       対戦（卓）・半荘
     queries     成績集計の読み出し・大会の再計算
+    outbox      送れなかった半荘の保存待ちの列
 
 呼び出し側は `from mahjong.repo import games` のように名前空間で使う。
 どの関数も失敗時は `mahjong.errors.AppError`（またはその派生）を送出し、
 そのまま画面に出せる日本語メッセージを持つ。
+
+同じ読み取りは1回の再実行の中で使い回す（`_base.memo`）。
+app.py が実行の先頭で `begin_run()` を呼ぶこと。
+グループのデータはメンバーの間でも使い回す（`_cache`）。効き具合は `cache_stats()` で見る。
+互いに依存しない読み取りは `gather()` で並行に投げる（`_parallel`）。
+ボタンを押したときに別のスレッドで読む関数は `deferred()` で包む。
+通信には時間制限を掛け、読み取りと論理削除は通信の失敗を再試行する（`_retry`）。
+効き具合は `call_stats()` で見る。
 """
 
 from __future__ import annotations
 
 from ..errors import AppError, AuthExpired, NetworkError, PermissionDenied
-from . import games, groups, queries, tournaments
-from ._base import SeatSpec
+from . import games, groups, outbox, queries, tournaments
+from ._base import SeatSpec, begin_run
+from ._cache import stats as cache_stats
+from ._parallel import deferred, gather
+from ._retry import stats as call_stats
 
 __all__ = [
     "AppError",
@@ -24,8 +36,14 @@ __all__ = [
     "NetworkError",
     "PermissionDenied",
     "SeatSpec",
+    "begin_run",
+    "cache_stats",
+    "call_stats",
+    "deferred",
     "games",
+    "gather",
     "groups",
+    "outbox",
     "queries",
     "tournaments",
 ]
@@ -6,28 +6,59 @@ Python 側で組み立てる。複数テーブルにまたがる書き込みは
 
 RLS が有効なので、所属していないグループのデータは
 「エラー」ではなく「0件」として返ってくる。件数0を権限エラーと取り違えないこと。
+
+## 1回の再実行の中で同じ読み取りを2度飛ばさない
+
+Streamlit は操作のたびにページを頭から再実行するので、同じ読み取りが
+1回の実行の中で何度も出る（`get_ruleset()` が `get_tournament()` を呼び直す、
+`fetch_entries()` と `fetch_rounds_in_order()` が同じ `v_round_entries` を引く、など）。
+スマホ回線では1往復 100〜300ms かかるため、`memo()` で同じ読み取りを使い回す。
+
+    * 保存先はそのブラウザセッションの session_state。RLS の判定が
+      セッション（JWT）ごとなので、他人とは共有しない。
+    * 有効なのは1回の実行の間だけ。app.py が実行の先頭で `begin_run()` を呼ぶ。
+    * 書き込み（`write()` を通る呼び出し）をしたら、成否にかかわらず全部捨てる。
+    * ただし書き込みの応答に最新の状態が載っていれば（`remember()`）、
+      それは次の1回の実行まで持ち越す。保存直後の再実行で読み直さないため。
+
+グループのデータ（成績・卓・参加者・大会）は、さらにその手前で `_cache` の
+共有キャッシュを通す（`memo(..., owner=...)`）。セッションをまたいで使い回すので、
+メンバー確認などの約束は `_cache` の説明を参照。再実行ごとにグループの版数
+（`groups.get_revision()`）を1回だけ読み、変わっていなければ大きな読み取りを省く。
 """
 
 from __future__ import annotations
 
+import threading
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Sequence
+from typing import Any, Callable, Hashable, Iterable, Iterator, Sequence, TypeVar
 
-from ..db import get_client
+from ..db import _session_state, get_client
 from ..errors import AppError, call
+from . import _cache, _retry
+
+T = TypeVar("T")
 
 __all__ = [
     "AppError",
     "SeatSpec",
+    "begin_run",
     "call",
     "client",
+    "forget",
     "group_rounds",
     "group_seats",
+    "iter_rounds",
+    "memo",
     "now_iso",
+    "read",
+    "remember",
     "results_payload",
     "rows",
     "single",
+    "soft_delete",
+    "write",
 ]
 
 
@@ -49,6 +80,189 @@ def single(response: Any) -> dict[str, Any] | None:
     return data[0] if data else None
 
 
+# --- 再実行内の読み取りメモ -------------------------------------------------
+
+# st.session_state に置くキー。中身は (読み取りの形) -> 結果。
+_MEMO_KEY = "_repo_memo"
+# 次の実行へ持ち越す分（`remember()`）。形は _MEMO_KEY と同じ。
+_CARRY_KEY = "_repo_memo_carry"
+
+
+def _memo_store() -> dict[Hashable, Any] | None:
+    """このセッションのメモ。Streamlit の外（pytest / CLI）では None＝使わない。
+
+    CLI はプロセスが長く生きるので、実行の区切りが無いまま使い回すと
+    古い結果を返し続けてしまう。
+    """
+    state = _session_state()
+    if state is None:
+        return None
+    return state.setdefault(_MEMO_KEY, {})
+
+
+def _is_member(group_id: str) -> bool:
+    """このセッションが group_id のメンバーか。v_my_groups の読み取りはメモを共有する。"""
+    from .groups import list_my_groups
+
+    return any(g["group_id"] == group_id for g in list_my_groups())
+
+
+def _revision(group_id: str) -> int | None:
+    """グループのいまの版数。この実行の中では1回だけ読む。"""
+    from .groups import get_revision
+
+    return get_revision(group_id)
+
+
+def memo(
+    key: Hashable,
+    load: Callable[[], T],
+    owner: str | None = None,
+    patch: Callable[[Any, str, int], T | None] | None = None,
+) -> T:
+    """同じ読み取りを、この実行の中では1回だけ通信する。
+
+    Args:
+        key: 読み取りの形。テーブル（ビュー）名と絞り込み条件を並べたタプルにする。
+            列や並び順が違う読み取りには別のキーを付けること。
+        load: 実際に取得する関数。例外はそのまま呼び出し側へ伝わり、記録されない。
+        owner: グループのデータを読むときの絞り込み ID（group_id / tournament_id /
+            day_id / game_id）。渡すと、同じグループのメンバー間で共有キャッシュを使う。
+            メンバーなら誰が読んでも同じ結果になる読み取りにだけ渡すこと。
+        patch: 共有キャッシュの古い写しを差分で追いつかせる関数（`_cache.shared` を参照）。
+
+    返した値は同じ実行の中で使い回されるので、呼び出し側で書き換えないこと。
+    """
+    store = _memo_store()
+    if store is None:
+        return load()
+    if owner is not None:
+        direct = load
+
+        def load() -> T:
+            return _cache.shared(owner, key, direct, _is_member, _revision, patch)
+    with _memo_lock:
+        found = store.get(key, _MISSING)
+        if found is _MISSING:
+            pending = store[key] = _Pending()
+    if isinstance(found, _Pending):
+        # 同じ実行の別スレッド（`gather()`）が読み込み中。終わるのを待って受け取る。
+        found.done.wait()
+        return found.value if found.ok else load()
+    if found is not _MISSING:
+        return found
+
+    try:
+        value = load()
+    except BaseException:
+        with _memo_lock:
+            if store.get(key) is pending:
+                del store[key]
+        pending.done.set()
+        raise
+    pending.value, pending.ok = value, True
+    store[key] = value
+    pending.done.set()
+    return value
+
+
+class _Pending:
+    """メモの読み込み中の印。`gather()` で並行に呼ばれたとき、同じ読み取りを2度飛ばさない。"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.ok = False
+
+
+_MISSING = object()
+_memo_lock = threading.Lock()
+
+
+def forget() -> None:
+    """このセッションのメモ（持ち越す分も含めて）を捨てる。"""
+    state = _session_state()
+    if state is not None:
+        state.pop(_MEMO_KEY, None)
+        state.pop(_CARRY_KEY, None)
+
+
+def remember(found: dict[Hashable, Any]) -> None:
+    """書き込みの応答に載っていた最新の読み取り結果を、メモに入れて次の実行まで持ち越す。
+
+    `write()` の後に呼ぶこと（`write()` はメモを捨てる）。キーと値の形は、
+    その読み取りが `memo()` に渡すものと同じにする。
+    """
+    state = _session_state()
+    if state is None:
+        return
+    state.setdefault(_MEMO_KEY, {}).update(found)
+    state.setdefault(_CARRY_KEY, {}).update(found)
+
+
+def begin_run() -> None:
+    """実行の先頭で呼ぶ。前回の実行のメモを持ち越さない。
+
+    他の人の書き込みは次の再実行で見えてほしいので、メモは実行をまたがない。
+    例外は直前の書き込みが `remember()` した分で、書いた直後の状態なので
+    読み直しても同じものが返る。これも次の1回の実行だけで捨てる。
+    """
+    state = _session_state()
+    carried = state.pop(_CARRY_KEY, None) if state is not None else None
+    forget()
+    if carried:
+        state[_MEMO_KEY] = dict(carried)
+
+
+def read(fn: Callable[[], T], hedge: bool = True) -> T:
+    """読み取りを `call()` で包む。時間制限・再試行・遅いときの追い掛けつき（`_retry` 参照）。
+
+    Args:
+        hedge: 遅いときに同じ読み取りをもう1本投げてよいか。ページ送りのように
+            1本ずつ順に読むものも、読み取りなら二重に届いて困ることはない。
+    """
+    return call(_retry.run, fn, timeout=_retry.READ_TIMEOUT, retry=True, hedge=hedge)
+
+
+def write(
+    fn: Callable[..., T], *args: Any, touches: str | None = None, idempotent: bool = False,
+    **kwargs: Any,
+) -> T:
+    """書き込みを `call()` で包み、読み取りメモと共有キャッシュを捨てる。
+
+    失敗したときも捨てる。RPC は失敗すれば巻き戻るが、
+    テーブルへの直接の UPDATE は「通ったが応答が届かなかった」がありうる。
+
+    Args:
+        touches: 書き込む対象の ID（group_id や game_id など）。共有キャッシュは
+            その ID が属するグループの分だけ捨てる。省略すると全グループを捨てる。
+        idempotent: 2回届いても結果が同じ書き込み（同じ時刻での論理削除など）なら True。
+            通信の失敗を再試行する。追加の RPC のように2回届くと2件になるものは False のまま。
+    """
+    try:
+        return call(
+            _retry.run, lambda: fn(*args, **kwargs), timeout=_retry.WRITE_TIMEOUT,
+            retry=idempotent,
+        )
+    finally:
+        forget()
+        _cache.invalidate(touches)
+
+
+def soft_delete(table: str, row_id: str) -> None:
+    """論理削除（deleted_at を埋める）。通信に失敗したら再試行する。
+
+    時刻は最初に1回だけ決める。1回目が実は届いていても、2回目は同じ値を書くだけで
+    何も変わらない（集計表のトリガも deleted_at が変わったときしか動かない）。
+    """
+    deleted_at = now_iso()
+
+    def run():
+        return client().table(table).update({"deleted_at": deleted_at}).eq("id", row_id).execute()
+
+    write(run, touches=row_id, idempotent=True)
+
+
 @dataclass(frozen=True)
 class SeatSpec:
     """対戦作成時の1席分の指定。既存プレイヤーか新規作成かのどちらか。"""
@@ -98,20 +312,33 @@ def group_rounds(source: Sequence[dict[str, Any]]) -> list[dict[str, Any]]:
 
     途中の回を削除しても番号に穴が空かない。
     """
-    rounds: dict[str, dict[str, Any]] = {}
+    ordered = sorted(source, key=lambda r: (r["round_created_at"], r["round_id"], r["seat"]))
+    return list(iter_rounds(ordered))
+
+
+def iter_rounds(source: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+    """(round_created_at, round_id, seat) 順に並んだ行を、半荘ができあがるたびに返す。
+
+    `queries.stream_entry_rows()` の行をそのまま流せる。全行を手元に溜めないので、
+    履歴が長くても使う記憶は1半荘分で済む。形と連番は `group_rounds()` と同じ。
+    """
+    current: dict[str, Any] | None = None
+    no = 0
     for row in source:
-        rnd = rounds.setdefault(
-            row["round_id"],
-            {
+        if current is None or current["id"] != row["round_id"]:
+            if current is not None:
+                yield current
+            no += 1
+            current = {
                 "id": row["round_id"],
                 "game_id": row["game_id"],
                 "game_name": row.get("game_name"),
                 "created_at": row["round_created_at"],
                 "ruleset": row.get("round_ruleset"),
                 "results": [],
-            },
-        )
-        rnd["results"].append(
+                "no": no,
+            }
+        current["results"].append(
             {
                 "player_id": row["player_id"],
                 "player_name": row.get("player_name"),
@@ -123,12 +350,8 @@ def group_rounds(source: Sequence[dict[str, Any]]) -> list[dict[str, Any]]:
                 "tobi": row["tobi"],
             }
         )
-
-    ordered = sorted(rounds.values(), key=lambda r: (r["created_at"], r["id"]))
-    for no, rnd in enumerate(ordered, start=1):
-        rnd["no"] = no
-        rnd["results"].sort(key=lambda x: x["seat"])
-    return ordered
+    if current is not None:
+        yield current
 
 
 def results_payload(
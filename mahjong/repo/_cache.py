@@ -0,0 +1,298 @@
+"""グループ単位の共有読み取りキャッシュ（プロセス内・ブラウザセッションをまたぐ）。
+
+`_base.memo()` は1回の再実行の中だけ、1つのブラウザセッションの中だけで効く。
+大会の夜は同じグループの 8〜16 台のスマホが同じ開催日の画面を開きっぱなしにし、
+誰かが入力するたびに全員が同じ `v_round_entries` / `v_game_seats` を取り直す。
+ここではその「グループのデータ」だけを、セッションをまたいで使い回す。
+
+## RLS を迂回しないための約束
+
+`db.get_client()` がセッションを共有しないのは、JWT が混ざると他人の権限で
+読み書きしてしまうからだった。共有キャッシュも同じ事故を起こしうるので:
+
+    * 共有してよいのは「グループのメンバーなら誰が読んでも同じ結果になる」読み取りだけ。
+      （v_round_entries / v_game_seats / players / tournaments / tournament_days。
+      RLS はどれも `group_id IN current_group_ids()` だけで決まる）
+      v_my_groups（人ごとに違う）と group_invites（管理者だけ）は共有しない。
+    * キーは必ず (group_id, 読み取りの形)。group_id はキャッシュが自分で知っているもの
+      （過去の応答の行に載っていた group_id）だけを使い、呼び出し側の申告は信じない。
+    * 渡す前に、呼び出し元のセッションが `v_my_groups` でそのグループの
+      メンバーだと確認する。確認できなければキャッシュを使わず、そのセッションの
+      JWT で直接読む（RLS がいつも通り判定する）。
+
+大会・開催日・対戦・半荘・参加者の ID は UUID で、所属グループは後から変わらない。
+そこで応答の行から「ID → group_id」を覚えておき、group_id 以外で絞る読み取りや
+書き込みの影響範囲もそこから引く。知らない ID のときは安全側（直接読む／全部捨てる）に倒す。
+
+## 鮮度
+
+    * このプロセスからの書き込み（`_base.write()`）は、影響するグループを即座に捨てる。
+    * 別プロセスや SQL エディタからの変更は、グループの版数（`group_revisions`、
+      migrations/004）で拾う。再実行ごとに版数だけを読み、保存時と違えば読み直す。
+      版数が同じなら TTL を過ぎても使い続ける。
+    * 版数が読めない（004 が未適用など）ときは TTL（既定30秒）で拾う。
+    * 読み込み中に書き込みが来たら、その読み込み結果は保存しない（書き込みの通し番号で判定）。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, Iterable, TypeVar
+
+T = TypeVar("T")
+
+__all__ = [
+    "CacheStats",
+    "clear",
+    "invalidate",
+    "learn",
+    "shared",
+    "stats",
+]
+
+# 1エントリの寿命（秒）。別プロセスからの変更がこれだけ遅れて見える。
+TTL_SECONDS = 30.0
+# エントリ数の上限。超えたら最後に使われたのが古いものから捨てる。
+MAX_ENTRIES = 512
+# ID → group_id の対応の上限。1件は数十バイトなので大きめでよい。
+MAX_OWNERS = 50_000
+
+# 行に載っていれば「この ID はこのグループのもの」と分かる列。
+_ID_COLUMNS = ("group_id", "tournament_id", "day_id", "game_id", "round_id", "player_id", "id")
+
+
+@dataclass
+class CacheStats:
+    """ヒット率の確認用。`stats()` がその時点の写しを返す。"""
+
+    hits: int = 0
+    misses: int = 0
+    # 他のセッションが読み込み中だったので、その結果を待って受け取った回数
+    coalesced: int = 0
+    # メンバー確認が取れず、キャッシュを使わずに直接読んだ回数
+    bypassed: int = 0
+    # ミスのうち、古い写しを差分で追いつかせて済んだ回数
+    patched: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    entries: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        served = self.hits + self.coalesced
+        total = served + self.misses
+        return served / total if total else 0.0
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    # 保存したときのグループの版数。版数が読めなかったときは None
+    revision: int | None = None
+
+
+@dataclass
+class _Flight:
+    """読み込み中の1件。同じキーを待つセッションはこれを待つ。"""
+
+    done: threading.Event = field(default_factory=threading.Event)
+    value: Any = None
+    ok: bool = False
+
+
+_lock = threading.Lock()
+_entries: OrderedDict[tuple[str, Hashable], _Entry] = OrderedDict()
+_flights: dict[tuple[str, Hashable], _Flight] = {}
+_owners: OrderedDict[str, str] = OrderedDict()
+_stats = CacheStats()
+# 書き込みの通し番号。読み込みの前後で変わっていたら、その結果は保存しない。
+_writes = 0
+
+
+def _now() -> float:
+    return time.monotonic()
+
+
+def _copy(value: T) -> T:
+    """呼び出し側が行を書き換えても、他のセッションの分が壊れないよう浅く複製する。"""
+    if isinstance(value, list):
+        return [dict(v) if isinstance(v, dict) else v for v in value]  # type: ignore[return-value]
+    if isinstance(value, dict):
+        return dict(value)  # type: ignore[return-value]
+    return value
+
+
+def owner_of(some_id: str | None) -> str | None:
+    """ID が属するグループ。過去の応答で見たことが無ければ None。"""
+    if not some_id:
+        return None
+    with _lock:
+        group_id = _owners.get(some_id)
+        if group_id is not None:
+            _owners.move_to_end(some_id)
+        return group_id
+
+
+def learn(found: Any) -> None:
+    """応答の行から「ID → group_id」を覚える。
+
+    RLS を通った応答なので、行の group_id は実在の所属を表している。
+    """
+    items: Iterable[Any] = found if isinstance(found, list) else [found]
+    with _lock:
+        for row in items:
+            if not isinstance(row, dict):
+                continue
+            group_id = row.get("group_id")
+            if not group_id:
+                continue
+            for column in _ID_COLUMNS:
+                value = row.get(column)
+                if value:
+                    _owners[value] = group_id
+                    _owners.move_to_end(value)
+        while len(_owners) > MAX_OWNERS:
+            _owners.popitem(last=False)
+
+
+def shared(
+    owner: str | None,
+    key: Hashable,
+    load: Callable[[], T],
+    is_member: Callable[[str], bool],
+    revision: Callable[[str], int | None] | None = None,
+    patch: Callable[[Any, str, int], T | None] | None = None,
+) -> T:
+    """グループの読み取りを、メンバーの間で使い回す。
+
+    Args:
+        owner: 絞り込みに使う ID（group_id / tournament_id / day_id / game_id）。
+        key: 読み取りの形。`memo()` と同じタプルを渡す。
+        load: 呼び出し元セッションのクライアントで実際に読む関数。
+        is_member: group_id を受け取り、呼び出し元がそのメンバーかを返す。
+        revision: group_id を受け取り、そのグループのいまの版数を返す。
+            版数が保存時と同じなら TTL を過ぎていても使い、違えば TTL 内でも読み直す。
+            None を返したとき（版数が読めないとき）は TTL だけで判断する。
+        patch: 古い版の写しを差分で追いつかせる関数。(写し, group_id, 写しの版数) を
+            受け取り、新しい値を返す。追いつけないときは None を返せば、load() で全部読む。
+            写しは他のセッションと共有しているので、書き換えずに新しい値を作ること。
+    """
+    group_id = owner_of(owner)
+    if group_id is None and owner and is_member(owner):
+        group_id = owner  # v_my_groups に載っている＝それ自体が所属グループの ID
+    if group_id is None:
+        # 所属の分からない ID。直接読み、行から所属を覚えるだけにする。
+        with _lock:
+            _stats.misses += 1
+        value = load()
+        learn(value)
+        return value
+    if not is_member(group_id):
+        with _lock:
+            _stats.bypassed += 1
+        return load()
+
+    # 版数はデータより先に読む。後に読むと、古いデータに新しい版数を付けてしまう。
+    current = revision(group_id) if revision is not None else None
+    slot = (group_id, key)
+    with _lock:
+        entry = _entries.get(slot)
+        if entry is not None and _usable(entry, current):
+            _entries.move_to_end(slot)
+            _stats.hits += 1
+            return _copy(entry.value)
+        flight = _flights.get(slot)
+        leader = flight is None
+        if leader:
+            flight = _flights[slot] = _Flight()
+            started = _writes
+            _stats.misses += 1
+            # 版数の付いた古い写しがあれば、全部読み直さずに差分で追いつける
+            versioned = entry is not None and entry.revision is not None and current is not None
+            behind = entry if patch is not None and versioned else None
+
+    if not leader:
+        flight.done.wait()
+        if flight.ok:
+            with _lock:
+                _stats.coalesced += 1
+            return _copy(flight.value)
+        # 先に読みに行ったセッションが失敗した。その失敗（期限切れの JWT など）は
+        # このセッションのものではないので、自分で読み直す。
+        return load()
+
+    try:
+        value = patch(behind.value, group_id, behind.revision) if behind else None
+        if value is None:
+            value = load()
+        else:
+            with _lock:
+                _stats.patched += 1
+        flight.value, flight.ok = value, True
+    finally:
+        with _lock:
+            _flights.pop(slot, None)
+        flight.done.set()
+    learn(value)
+    _store(slot, value, started, current)
+    return _copy(value)
+
+
+def _usable(entry: _Entry, current: int | None) -> bool:
+    if current is not None and entry.revision is not None:
+        return entry.revision == current
+    return entry.revision is None and entry.expires_at > _now()
+
+
+def _store(slot: tuple[str, Hashable], value: Any, started: int, revision: int | None) -> None:
+    """読み込みの間に書き込みが1件も無かったときだけ保存する。
+
+    書き込みをまたいだ読み込みは、書き込み前の値かもしれない。
+    どのグループへの書き込みかは問わず、安全側に倒す（読み込みは数百ミリ秒で終わる）。
+    """
+    with _lock:
+        if _writes != started:
+            return
+        _entries[slot] = _Entry(value, _now() + TTL_SECONDS, revision)
+        _entries.move_to_end(slot)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats.evictions += 1
+
+
+def invalidate(touched: str | None = None) -> None:
+    """書き込みのあとに呼ぶ。touched の属するグループの写しを期限切れにする。
+
+    所属が分からない ID（または None）なら、取りこぼしを避けて全グループを期限切れにする。
+    写し自体は残す。版数が付いていれば、次の読み取りで版数を比べて
+    使い続けるか差分で追いつかせるかを決められる（書き込みが巻き戻っていれば版数は動かない）。
+    """
+    global _writes
+    group_id = owner_of(touched)
+    with _lock:
+        _writes += 1
+        _stats.invalidations += 1
+        for slot, entry in _entries.items():
+            if group_id is None or slot[0] == group_id:
+                entry.expires_at = 0.0
+
+
+def stats() -> CacheStats:
+    """ヒット・ミスなどの累計の写し。"""
+    with _lock:
+        snapshot = CacheStats(**{**_stats.__dict__, "entries": len(_entries)})
+    return snapshot
+
+
+def clear() -> None:
+    """全部捨て、カウンタも戻す（テスト用）。"""
+    global _writes, _stats
+    with _lock:
+        _entries.clear()
+        _owners.clear()
+        _writes += 1
+        _stats = CacheStats()
@@ -0,0 +1,144 @@
+"""互いに依存しない読み取りを並行して投げる。
+
+画面は「大会一覧」「卓一覧」「成績」「参加者名」のような独立した読み取りを
+上から順に1つずつ待っていた。スマホ回線では1往復 100〜300ms かかるので、
+4つ並べば表示までに1秒を超える。`gather()` で同時に投げれば、待ち時間は
+いちばん遅い1本ぶんで済む。
+
+    found = repo.gather(
+        games=lambda: games_repo.list_games(day_id),
+        players=lambda: groups_repo.list_players(group_id),
+    )
+
+## 約束
+
+    * 投げるのは読み取りだけ。書き込みは順序に意味があるので並べない。
+    * 各スレッドには呼び出し元の ScriptRunContext を引き継ぐ。session_state
+      （ブラウザセッション専用のクライアントと読み取りメモ）は呼び出し元と同じものを使う。
+      JWT が他人と混ざることはない。
+    * 例外は `errors.call()` で AppError に揃えてから返す。画面側の `except AppError` は
+      順番に呼んでいたときのまま使える。
+    * 同じ読み取りを2本が同時に必要としても、通信は1回で済む（`_base.memo` が待ち合わせる）。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from ..errors import AppError, call
+
+T = TypeVar("T")
+
+__all__ = ["MAX_WORKERS", "deferred", "gather"]
+
+# 1画面で同時に投げる上限。ブラウザの同一ホストへの同時接続数（6）に合わせる。
+MAX_WORKERS = 6
+
+
+def gather(*, return_exceptions: bool = False, **calls: Callable[[], Any]) -> dict[str, Any]:
+    """引数なしの関数をまとめて並行に呼び、名前 → 戻り値の辞書で返す。
+
+    Args:
+        return_exceptions: False なら、失敗があったとき全部の完了を待ってから
+            **宣言順で最初の**失敗を送出する。True なら送出せず、その名前の値として
+            AppError を入れて返す（一部が読めなくても画面の残りを出したいとき）。
+        calls: 名前 → 引数なしの関数。`lambda: games_repo.list_games(day_id)` のように渡す。
+    """
+    if not calls:
+        return {}
+    if len(calls) == 1:
+        # 1本だけならスレッドを立てる意味が無い
+        ((name, fn),) = calls.items()
+        return {name: _settle(fn, return_exceptions)}
+
+    ctx = _script_run_ctx()
+
+    def run(fn: Callable[[], Any]) -> Any:
+        return _run_as(ctx, lambda: call(fn))
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(calls))) as pool:
+        futures = {name: pool.submit(run, fn) for name, fn in calls.items()}
+
+    found: dict[str, Any] = {}
+    for name, future in futures.items():
+        exc = future.exception()
+        if exc is None:
+            found[name] = future.result()
+        elif return_exceptions and isinstance(exc, AppError):
+            found[name] = exc
+        else:
+            raise exc
+    return found
+
+
+def deferred(fn: Callable[[], T]) -> Callable[[], T]:
+    """あとで別のスレッドから呼ばれる関数に、今のブラウザセッションを引き継がせる。
+
+    `st.download_button(data=...)` に関数を渡すと、押されたときに Streamlit が
+    別のスレッドで呼ぶ。そのままでは session_state が見えず、ログインしていない
+    共用のクライアントで読んでしまう。
+
+    呼ぶスレッドは Streamlit の既定の executor のもの（`asyncio.to_thread`）で、
+    他のセッションの仕事にも使い回される。セッションは呼んでいる間だけ付ける。
+    """
+    ctx = _script_run_ctx()
+
+    def run() -> T:
+        return _run_as(ctx, lambda: call(fn))
+
+    return run
+
+
+def _settle(fn: Callable[[], Any], return_exceptions: bool) -> Any:
+    try:
+        return call(fn)
+    except AppError as exc:
+        if return_exceptions:
+            return exc
+        raise
+
+
+def _script_run_ctx() -> Any:
+    """呼び出し元スレッドの ScriptRunContext。Streamlit の外では None。"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ModuleNotFoundError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def _run_as(ctx: Any, fn: Callable[[], T]) -> T:
+    """今のスレッドに ctx（呼び出し元のブラウザセッション）を付けて fn を呼び、終わったら元に戻す。
+
+    スレッドが使い回されるとき（追い掛けのプール、Streamlit の executor）に付けっぱなしに
+    すると、次にそのスレッドで動く仕事が前のセッションの session_state（JWT 入りの
+    クライアント）で読んでしまい、終わったセッションもいつまでも解放されない。
+    ctx が None なら、呼んでいる間はどのセッションも付いていない状態にする。
+    Streamlit が付けるスレッドごとの状態（ContextVar）も、写しの中で動かして持ち越さない。
+    """
+    return contextvars.copy_context().run(_attached, ctx, fn)
+
+
+def _attached(ctx: Any, fn: Callable[[], T]) -> T:
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        from streamlit.runtime.scriptrunner_utils.script_run_context import (
+            SCRIPT_RUN_CONTEXT_ATTR_NAME,
+        )
+    except ModuleNotFoundError:
+        return fn()
+
+    thread = threading.current_thread()
+    previous = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    if ctx is None:
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    else:
+        add_script_run_ctx(thread, ctx)
+    try:
+        return fn()
+    finally:
+        setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous)
+
@@ -0,0 +1,249 @@
+"""通信の揺れに強くする: 1回ごとの時間制限・読み取りの再試行・遅い読み取りの追い掛け。
+
+旧実装は `errors.call()` で失敗を `NetworkError` に変えるだけで、再試行も
+時間制限も無かった（httpx の既定は 120 秒）。会場の Wi-Fi で1本の通信が
+止まると、OS が諦めるまでスクリプトごと固まり、スコア入力の画面が動かなくなる。
+
+    * 時間制限: 読み取りは `READ_TIMEOUT`、書き込みは `WRITE_TIMEOUT` 秒で打ち切る。
+      （`db.request_timeout()` で、その呼び出しの間に飛ぶ通信だけに掛かる）
+    * 再試行: 通信の失敗（接続できない・時間切れ）に限り、間隔をランダムに揺らして
+      最大 `MAX_ATTEMPTS` 回まで試す。権限や入力の誤りは何度やっても同じなので試さない。
+      再試行してよいのは、2回届いても結果が変わらないもの（読み取りと論理削除）だけ。
+    * 追い掛け（hedge）: 読み取りを送ってから最近の `HEDGE_PERCENTILE` の所要時間を
+      過ぎても返ってこなければ、同じ読み取りをもう1本、追い掛け用のプール
+      （`HEDGE_WORKERS` 本）で投げ、先に成功した方を使う。遅れた方は待たずに捨てる。
+      追い掛けを考えるときだけ、1本目はその呼び出し専用のスレッドで投げる（プールの
+      空きを待たない）。プールが埋まっているときは追い掛けない（待たされた追い掛けは
+      役に立たない）。
+    * 予算: 再試行と追い掛けは、プロセス全体で「通常の呼び出しの `BUDGET_RATIO` 割」
+      までに抑える。サーバーが本当に落ちているとき、全員の再試行で追い打ちしないように。
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+
+from ..db import request_timeout
+from ..errors import is_network_error
+from ._parallel import _run_as, _script_run_ctx
+
+T = TypeVar("T")
+
+__all__ = ["RetryStats", "run", "stats"]
+
+# 1回の通信の時間制限（秒）。RPC の書き込みはサーバー側の処理が長いので少し長め。
+READ_TIMEOUT = 8.0
+WRITE_TIMEOUT = 15.0
+
+# 最初の1回を含めた試行回数の上限と、待ち時間（秒）の揺らし方
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 1.5
+
+# 再試行・追い掛けに使える量。通常の呼び出し1回ごとに BUDGET_RATIO 回ぶん貯まり、
+# BUDGET_CAP 回ぶんまで貯めておける（起動直後や静かな時間帯にも少しは試せる）。
+BUDGET_RATIO = 0.1
+BUDGET_CAP = 10.0
+
+# 追い掛けの判断。所要時間をこれだけ覚えてから始め、HEDGE_FLOOR 秒より早くは投げない。
+HEDGE_PERCENTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_FLOOR = 0.25
+_LATENCY_WINDOW = 200
+HEDGE_WORKERS = 8
+
+
+@dataclass
+class RetryStats:
+    """効き目の確認用。`stats()` がその時点の写しを返す。"""
+
+    calls: int = 0
+    retries: int = 0
+    hedges: int = 0
+    # 追い掛けた方が先に返った回数
+    hedge_wins: int = 0
+    # 予算切れで再試行・追い掛けを見送った回数
+    throttled: int = 0
+    # 追い掛けのプールが埋まっていて見送った回数
+    saturated: int = 0
+
+
+_lock = threading.Lock()
+_stats = RetryStats()
+_tokens = BUDGET_CAP
+_latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+_pool: ThreadPoolExecutor | None = None
+# プールで走っている追い掛けの数
+_hedging = 0
+
+
+def _sleep(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def run(
+    fn: Callable[[], T], *, timeout: float, retry: bool = True, hedge: bool = False
+) -> T:
+    """fn を時間制限つきで呼ぶ。例外は翻訳せずにそのまま送出する（`errors.call()` が翻訳する）。
+
+    Args:
+        timeout: 1回の通信の時間制限（秒）。
+        retry: 通信の失敗を再試行してよいか。2回届いても困らない呼び出しにだけ True。
+        hedge: 遅いときに同じ呼び出しをもう1本投げてよいか。読み取りにだけ True。
+    """
+    global _tokens
+    with _lock:
+        _stats.calls += 1
+        _tokens = min(BUDGET_CAP, _tokens + BUDGET_RATIO)
+
+    attempt = 1
+    while True:
+        try:
+            return _once(fn, timeout, hedge)
+        except Exception as exc:  # noqa: BLE001 - 再試行するかどうかだけ決め、翻訳はしない
+            if not (retry and is_network_error(exc) and attempt < MAX_ATTEMPTS and _spend()):
+                raise
+        with _lock:
+            _stats.retries += 1
+        # full jitter: 0 〜 上限の間で揺らす。全員が同じ間隔で叩き直さないように。
+        _sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1))))
+        attempt += 1
+
+
+def _spend() -> bool:
+    """予算を1回ぶん使う。足りなければ False。"""
+    global _tokens
+    with _lock:
+        if _tokens < 1:
+            _stats.throttled += 1
+            return False
+        _tokens -= 1
+        return True
+
+
+def _once(fn: Callable[[], T], timeout: float, hedge: bool) -> T:
+    """1回ぶん。追い掛けるなら、1本目と追い掛けのうち先に成功した方を返す。
+
+    旧実装は1本目を呼び出し元のスレッドで投げていた。httpx の通信は途中で止められないので、
+    1本目が止まると追い掛けが先に返っていても `READ_TIMEOUT` 秒待たされ、一番遅い読み取りは
+    少しも速くならなかった。1本目を専用のスレッドに出せば、呼び出し元は両方を待てる。
+    プールには入れない（同時に読む人が増えると、1本目がプールの空きを待つことになる）。
+    """
+    delay = _hedge_delay() if hedge else None
+    if delay is None:
+        with request_timeout(timeout):
+            return _timed(fn)
+
+    ctx = _script_run_ctx()
+    first = _spawn(ctx, fn, timeout)
+    if wait([first], timeout=delay).done:
+        return first.result()
+    backup = _launch(ctx, fn, timeout)
+    if backup is None:
+        return first.result()
+
+    pending: set[Future[T]] = {first, backup}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        won = next((f for f in done if f.exception() is None), None)
+        if won is not None:
+            if won is backup:
+                with _lock:
+                    _stats.hedge_wins += 1
+            return won.result()
+        # 権限や入力の誤りは、もう1本を待っても同じ
+        refused = next((f for f in done if not is_network_error(f.exception())), None)
+        if refused is not None:
+            return refused.result()
+    # どちらも通信の失敗。1本目の失敗として扱う（再試行するかは run() が決める）
+    return first.result()
+
+
+def _spawn(ctx: Any, fn: Callable[[], T], timeout: float) -> Future[T]:
+    """1本目を、この呼び出し専用のスレッドで投げる。止まっても時間制限で終わる。"""
+    future: Future[T] = Future()
+
+    def attempt() -> None:
+        try:
+            with request_timeout(timeout):
+                future.set_result(_timed(fn))
+        except BaseException as exc:  # noqa: BLE001 - 呼び出し元の result() で送出する
+            future.set_exception(exc)
+
+    threading.Thread(target=_run_as, args=(ctx, attempt), name="read", daemon=True).start()
+    return future
+
+
+def _launch(ctx: Any, fn: Callable[[], T], timeout: float) -> Future[T] | None:
+    """プールに空きと予算があれば追い掛けを投げる。見送ったら None。"""
+    global _hedging
+    with _lock:
+        if _hedging >= HEDGE_WORKERS:
+            _stats.saturated += 1
+            return None
+        _hedging += 1
+    if not _spend():
+        with _lock:
+            _hedging -= 1
+        return None
+    with _lock:
+        _stats.hedges += 1
+
+    def attempt() -> T:
+        global _hedging
+        try:
+            with request_timeout(timeout):
+                return _timed(fn)
+        finally:
+            with _lock:
+                _hedging -= 1
+
+    # session_state のクライアント（JWT）は呼び出し元と同じものを、投げている間だけ使う
+    return _executor().submit(_run_as, ctx, attempt)
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _pool
+
+
+def _timed(fn: Callable[[], T]) -> T:
+    started = time.monotonic()
+    value = fn()
+    with _lock:
+        _latencies.append(time.monotonic() - started)
+    return value
+
+
+def _hedge_delay() -> float | None:
+    """この時間を過ぎたら追い掛ける（秒）。まだ所要時間を十分に覚えていなければ None。"""
+    with _lock:
+        if len(_latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(_latencies)
+    index = min(len(ordered) - 1, int(len(ordered) * HEDGE_PERCENTILE))
+    return max(HEDGE_FLOOR, ordered[index])
+
+
+def stats() -> RetryStats:
+    """再試行・追い掛けの累計の写し。"""
+    with _lock:
+        return RetryStats(**_stats.__dict__)
+
+
+def reset() -> None:
+    """累計・予算・所要時間の記録を初期状態に戻す（テスト用）。"""
+    global _stats, _tokens
+    with _lock:
+        _stats = RetryStats()
+        _tokens = BUDGET_CAP
+        _latencies.clear()
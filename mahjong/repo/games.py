@@ -3,27 +3,42 @@
 対戦は開催日にぶら下がる。半荘の登録・差し替えは RPC 関数を通す
 （1回の関数呼び出しが1トランザクションになるため、
 途中で失敗しても半端な記録が残らない）。
+
+半荘の追加・修正・削除は、応答にその卓の最新の状態（席・半荘・大会のルール）が
+載る RPC（migrations/011）を使い、`remember()` でメモに入れる。保存直後の再実行で
+`get_game()`・`list_rounds()`・`get_ruleset()` が通信せずに済む。
+011 が未適用なら従来の RPC・論理削除に戻る。
 """
 
 from __future__ import annotations
 
+import uuid
 from typing import Any, Sequence
 
+from ..errors import SchemaOutOfDate
 from ._base import (
     AppError,
     SeatSpec,
-    call,
     client,
     group_rounds,
     group_seats,
+    memo,
     now_iso,
+    read,
+    remember,
     results_payload,
     rows,
+    soft_delete,
+    write,
 )
+from .queries import entry_rows
 
 MIN_SEATS = 3
 MAX_SEATS = 4
 
+# `save_rounds()` で一度に送れる半荘の数（migrations/012 と同じ）
+MAX_BATCH_ROUNDS = 100
+
 
 # --- 対戦 -------------------------------------------------------------------
 
@@ -41,7 +56,9 @@ def list_games(day_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return group_seats(rows(call(run)))
+    return group_seats(
+        memo(("v_game_seats", "day_id", day_id), lambda: rows(read(run)), owner=day_id)
+    )
 
 
 def list_games_in_tournament(tournament_id: str) -> list[dict[str, Any]]:
@@ -55,7 +72,13 @@ def list_games_in_tournament(tournament_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return group_seats(rows(call(run)))
+    return group_seats(
+        memo(
+            ("v_game_seats", "tournament_id", tournament_id),
+            lambda: rows(read(run)),
+            owner=tournament_id,
+        )
+    )
 
 
 def get_game(game_id: str) -> dict[str, Any] | None:
@@ -68,7 +91,9 @@ def get_game(game_id: str) -> dict[str, Any] | None:
     def run():
         return client().table("v_game_seats").select("*").eq("game_id", game_id).execute()
 
-    found = group_seats(rows(call(run)))
+    found = group_seats(
+        memo(("v_game_seats", "game_id", game_id), lambda: rows(read(run)), owner=game_id)
+    )
     return found[0] if found else None
 
 
@@ -107,7 +132,7 @@ def create_game(day_id: str, name: str, seats: Sequence[SeatSpec], player_count:
             {"p_day_id": day_id, "p_name": (name or "").strip(), "p_seats": payload},
         ).execute()
 
-    return call(run).data
+    return write(run, touches=day_id).data
 
 
 def rename_game(game_id: str, name: str) -> None:
@@ -118,20 +143,11 @@ def rename_game(game_id: str, name: str) -> None:
     def run():
         return client().table("games").update({"name": name}).eq("id", game_id).execute()
 
-    call(run)
+    write(run, touches=game_id)
 
 
 def delete_game(game_id: str) -> None:
-    def run():
-        return (
-            client()
-            .table("games")
-            .update({"deleted_at": now_iso()})
-            .eq("id", game_id)
-            .execute()
-        )
-
-    call(run)
+    soft_delete("games", game_id)
 
 
 # --- 半荘 -------------------------------------------------------------------
@@ -139,30 +155,45 @@ def delete_game(game_id: str) -> None:
 
 def list_rounds(game_id: str) -> list[dict[str, Any]]:
     """対戦の半荘を古い順に返す。表示用の連番 `no` は1から振り直す。"""
+    return group_rounds(entry_rows("game_id", game_id))
 
-    def run():
-        return (
-            client()
-            .table("v_round_entries")
-            .select("*")
-            .eq("game_id", game_id)
-            .order("round_created_at")
-            .execute()
-        )
-
-    return group_rounds(rows(call(run)))
 
+def add_round(
+    game_id: str,
+    results: Sequence[Any],
+    seat_to_player: dict[int, str],
+    client_key: str | None = None,
+) -> str:
+    """半荘1回分を保存する。持ち点・ポイント・順位をまとめて記録する。
 
-def add_round(game_id: str, results: Sequence[Any], seat_to_player: dict[int, str]) -> str:
-    """半荘1回分を保存する。持ち点・ポイント・順位をまとめて記録する。"""
+    Args:
+        client_key: 画面が振った UUID（`outbox` 参照）。同じキーで2回届いても
+            1件しか作らず、最初の半荘の id を返す。渡したときだけ通信の失敗を再試行する。
+    """
     payload = results_payload(results, seat_to_player)
-
+    params = {"p_game_id": game_id, "p_results": payload}
+    keyed = params if client_key is None else {**params, "p_client_key": client_key}
+    try:
+        state = _with_state(
+            "add_round_returning_state", keyed, touches=game_id, idempotent=client_key is not None
+        )
+        return state["round_id"]
+    except SchemaOutOfDate:
+        pass  # 011 未適用
+    if client_key is None:
+        return _add_round(params, idempotent=False)
+    try:
+        return _add_round(keyed, idempotent=True)
+    except SchemaOutOfDate:
+        # 010 未適用。キーを受け取れない関数なので、これまでどおり1回だけ送る。
+        return _add_round(params, idempotent=False)
+
+
+def _add_round(params: dict[str, Any], idempotent: bool) -> str:
     def run():
-        return client().rpc(
-            "add_round_with_results", {"p_game_id": game_id, "p_results": payload}
-        ).execute()
+        return client().rpc("add_round_with_results", params).execute()
 
-    return call(run).data
+    return write(run, touches=params["p_game_id"], idempotent=idempotent).data
 
 
 def update_round(round_id: str, results: Sequence[Any], seat_to_player: dict[int, str]) -> None:
@@ -171,25 +202,102 @@ def update_round(round_id: str, results: Sequence[Any], seat_to_player: dict[int
     差し替えは物理的な上書きで、元の持ち点は残らない。呼び出し側で必ず確認を取ること。
     """
     payload = results_payload(results, seat_to_player)
+    params = {"p_round_id": round_id, "p_results": payload}
+    try:
+        _with_state("update_round_returning_state", params, touches=round_id)
+        return
+    except SchemaOutOfDate:
+        pass  # 011 未適用
 
     def run():
-        return client().rpc(
-            "update_round_results", {"p_round_id": round_id, "p_results": payload}
-        ).execute()
+        return client().rpc("update_round_results", params).execute()
 
-    call(run)
+    write(run, touches=round_id)
 
 
 def delete_round(round_id: str) -> None:
     """論理削除。表示上の「回」は取得時に振り直すため番号に穴は空かない。"""
+    # 時刻は最初に1回だけ決める（`soft_delete()` と同じ理由で、送り直しても変わらない）
+    params = {"p_round_id": round_id, "p_deleted_at": now_iso()}
+    try:
+        _with_state("delete_round_returning_state", params, touches=round_id, idempotent=True)
+    except SchemaOutOfDate:
+        soft_delete("game_rounds", round_id)  # 011 未適用
+
+
+def save_rounds(
+    game_id: str,
+    rounds: Sequence[tuple[str | None, Sequence[Any]]],
+    seat_to_player: dict[int, str],
+    client_keys: Sequence[str | None] | None = None,
+) -> list[str]:
+    """半荘をまとめて追加・差し替えする（記録表の写し）。送った順の半荘 id を返す。
 
-    def run():
-        return (
-            client()
-            .table("game_rounds")
-            .update({"deleted_at": now_iso()})
-            .eq("id", round_id)
-            .execute()
+    Args:
+        rounds: (半荘 id, 結果) の並び。id が None なら追加、あればその半荘を差し替える。
+            追加は並びの順に「回」が振られる。
+        client_keys: 追加する行の client_key（rounds と同じ並び、差し替えの行は None）。
+            省略するとここで振る。取り込み（`mahjong.importer`）のように、別のプロセスから
+            送り直しても同じ半荘になってほしいときに、元データから作った値を渡す。
+
+    全部が1回の RPC（migrations/012）で1トランザクションになり、1行でも弾かれれば
+    何も保存されない。追加の行にはここで client_key を振るので、通信の失敗は再試行する。
+    012 が未適用なら1半荘ずつ送る（その場合は途中まで保存されることがある）。
+    """
+    if not rounds:
+        return []
+    if len(rounds) > MAX_BATCH_ROUNDS:
+        raise AppError(f"一度に保存できるのは{MAX_BATCH_ROUNDS}半荘までです。")
+    keys = list(client_keys) if client_keys is not None else [None] * len(rounds)
+    if len(keys) != len(rounds):
+        raise ValueError("client_keys は rounds と同じ数だけ渡すこと。")
+    payload = [
+        {
+            "round_id": round_id,
+            "client_key": None if round_id else (key or str(uuid.uuid4())),
+            "results": results_payload(results, seat_to_player),
+        }
+        for (round_id, results), key in zip(rounds, keys)
+    ]
+    try:
+        state = _with_state(
+            "save_rounds_returning_state",
+            {"p_game_id": game_id, "p_rounds": payload},
+            touches=game_id,
+            idempotent=True,
         )
+        return state["round_ids"]
+    except SchemaOutOfDate:
+        pass  # 012 未適用
 
-    call(run)
+    saved = []
+    for entry, (round_id, results) in zip(payload, rounds):
+        if round_id is None:
+            saved.append(add_round(game_id, results, seat_to_player, client_key=entry["client_key"]))
+        else:
+            update_round(round_id, results, seat_to_player)
+            saved.append(round_id)
+    return saved
+
+
+def _with_state(
+    function: str, params: dict[str, Any], touches: str, idempotent: bool = False
+) -> dict[str, Any]:
+    """卓の最新の状態を返す RPC を呼び、その状態を次の実行の読み取りとして覚える。"""
+
+    def run():
+        return client().rpc(function, params).execute()
+
+    state = write(run, touches=touches, idempotent=idempotent).data
+    seats = state["seats"]
+    if seats:
+        game_id = seats[0]["game_id"]
+        found = {
+            # 各読み取りが memo() に渡すキーと同じもの
+            ("v_game_seats", "game_id", game_id): seats,
+            ("v_round_entries", "game_id", game_id): state["entries"],
+        }
+        if state.get("tournament") is not None:
+            found[("tournaments", "id", seats[0]["tournament_id"])] = state["tournament"]
+        remember(found)
+    return state
@@ -13,7 +13,8 @@ from __future__ import annotations
 
 from typing import Any
 
-from ._base import AppError, call, client, now_iso, rows, single
+from ..errors import SchemaOutOfDate
+from ._base import AppError, client, memo, now_iso, read, rows, single, soft_delete, write
 
 MEMBER_ROLES = ("owner", "admin", "member")
 ROLE_LABELS = {"owner": "オーナー", "admin": "管理者", "member": "メンバー"}
@@ -28,7 +29,34 @@ def list_my_groups() -> list[dict[str, Any]]:
     def run():
         return client().table("v_my_groups").select("*").order("created_at").execute()
 
-    return rows(call(run))
+    return memo(("v_my_groups",), lambda: rows(read(run)))
+
+
+def get_revision(group_id: str) -> int | None:
+    """グループのデータ版数。成績・卓・参加者・大会が変わるたびに進む（migrations/004）。
+
+    「前回から変わったか」の判定専用の、1行だけの小さな読み取り。
+    版数テーブルが無い（004 未適用）か、まだ行が無いときは None。
+    """
+
+    def run():
+        return (
+            client()
+            .table("group_revisions")
+            .select("revision")
+            .eq("group_id", group_id)
+            .limit(1)
+            .execute()
+        )
+
+    def load() -> int | None:
+        try:
+            found = single(read(run))
+        except SchemaOutOfDate:
+            return None
+        return int(found["revision"]) if found else None
+
+    return memo(("group_revisions", group_id), load)
 
 
 def get_group(group_id: str) -> dict[str, Any] | None:
@@ -43,7 +71,7 @@ def get_group(group_id: str) -> dict[str, Any] | None:
             .execute()
         )
 
-    return single(call(run))
+    return memo(("groups", "id", group_id), lambda: single(read(run)))
 
 
 def create_group(name: str, display_name: str | None = None) -> str:
@@ -63,7 +91,7 @@ def create_group(name: str, display_name: str | None = None) -> str:
             {"p_name": name, "p_display_name": (display_name or "").strip() or None},
         ).execute()
 
-    return call(run).data
+    return write(run).data
 
 
 def update_group(group_id: str, name: str | None = None, description: str | None = None) -> None:
@@ -81,7 +109,7 @@ def update_group(group_id: str, name: str | None = None, description: str | None
     def run():
         return client().table("groups").update(payload).eq("id", group_id).execute()
 
-    call(run)
+    write(run, touches=group_id)
 
 
 # --- 参加者 -----------------------------------------------------------------
@@ -101,7 +129,7 @@ def list_players(group_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return rows(call(run))
+    return memo(("players", "active", group_id), lambda: rows(read(run)), owner=group_id)
 
 
 def list_all_players(group_id: str) -> list[dict[str, Any]]:
@@ -121,7 +149,7 @@ def list_all_players(group_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return rows(call(run))
+    return memo(("players", "all", group_id), lambda: rows(read(run)), owner=group_id)
 
 
 def player_names(group_id: str) -> dict[str, str]:
@@ -151,7 +179,7 @@ def create_player(group_id: str, name: str) -> str:
             .execute()
         )
 
-    created = single(call(run))
+    created = single(write(run, touches=group_id))
     if not created:
         raise AppError("参加者を追加できませんでした。")
     return created["id"]
@@ -165,22 +193,12 @@ def rename_player(player_id: str, name: str) -> None:
     def run():
         return client().table("players").update({"name": name}).eq("id", player_id).execute()
 
-    call(run)
+    write(run, touches=player_id)
 
 
 def delete_player(player_id: str) -> None:
     """論理削除。過去の成績は player_id で紐づいたまま残り、集計にも含まれ続ける。"""
-
-    def run():
-        return (
-            client()
-            .table("players")
-            .update({"deleted_at": now_iso()})
-            .eq("id", player_id)
-            .execute()
-        )
-
-    call(run)
+    soft_delete("players", player_id)
 
 
 # --- メンバー管理（RPC 経由） -----------------------------------------------
@@ -195,7 +213,7 @@ def link_me_to_player(player_id: str) -> str:
     def run():
         return client().rpc("link_me_to_player", {"p_target_player_id": player_id}).execute()
 
-    return call(run).data
+    return write(run, touches=player_id).data
 
 
 def set_member_role(player_id: str, role: str) -> None:
@@ -207,7 +225,7 @@ def set_member_role(player_id: str, role: str) -> None:
             "set_member_role", {"p_player_id": player_id, "p_role": role}
         ).execute()
 
-    call(run)
+    write(run, touches=player_id)
 
 
 def remove_member(player_id: str) -> None:
@@ -216,7 +234,7 @@ def remove_member(player_id: str) -> None:
     def run():
         return client().rpc("remove_member", {"p_player_id": player_id}).execute()
 
-    call(run)
+    write(run, touches=player_id)
 
 
 # --- 招待 -------------------------------------------------------------------
@@ -233,7 +251,7 @@ def list_invites(group_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return rows(call(run))
+    return memo(("group_invites", group_id), lambda: rows(read(run)))
 
 
 def create_invite(
@@ -249,7 +267,7 @@ def create_invite(
     def run():
         return client().rpc("create_invite", params).execute()
 
-    return call(run).data
+    return write(run, touches=group_id).data
 
 
 def revoke_invite(invite_id: str) -> None:
@@ -262,7 +280,7 @@ def revoke_invite(invite_id: str) -> None:
             .execute()
         )
 
-    call(run)
+    write(run)
 
 
 def preview_invite(code: str) -> dict[str, Any]:
@@ -274,7 +292,7 @@ def preview_invite(code: str) -> dict[str, Any]:
     def run():
         return client().rpc("preview_invite", {"p_code": code}).execute()
 
-    return call(run).data or {}
+    return read(run).data or {}
 
 
 def join_group_by_code(
@@ -298,4 +316,4 @@ def join_group_by_code(
             },
         ).execute()
 
-    return call(run).data
+    return write(run).data
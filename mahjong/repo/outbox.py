@@ -0,0 +1,134 @@
+"""保存待ちの半荘（電波が切れている間の入力を失わないための列）。
+
+旧実装は `add_round()` が通信に失敗すると、打ち込んだ点数が入力欄の中にしか
+残らなかった。卓では次の半荘が始まるので、電波が戻るまで入力欄を触れずに待つか、
+もう一度打ち直すしかなかった。
+
+スコア入力の画面は、計算済みの結果をまずここに積み、すぐに送ってみる。
+届かなければ「保存待ち」として画面に出したまま次の半荘の入力に進める。
+列は古い順に送り、通信に失敗したところで止める（順番を入れ替えない）。
+
+## 二重登録しない
+
+積むときに UUID（`client_key`）を1つ振り、何度送り直しても同じ値を送る。
+`add_round_with_results`（migrations/010）は同じ卓・同じキーの半荘がすでにあれば
+新しく作らない。「届いたが応答だけ落ちた」半荘を送り直しても1件のままになる。
+
+列の置き場所はそのブラウザセッションの session_state。再実行やページの移動では
+消えないが、ブラウザを閉じると消える（端末に書き出す手段が Streamlit に無いため）。
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Sequence
+
+from ..db import _session_state
+from ..errors import AppError, AuthExpired, NetworkError
+from . import games
+from ._base import now_iso
+
+__all__ = ["Flushed", "PendingRound", "discard", "enqueue", "flush", "pending"]
+
+# st.session_state に置くキー
+_QUEUE_KEY = "_outbox"
+_FAILED_AT_KEY = "_outbox_failed_at"
+
+# 通信に失敗したあと、次に自動で送り直すまでの間隔（秒）。
+# 入力欄を触るたびに送ると、電波が無い間は毎回時間切れまで待たされる。
+RETRY_AFTER = 10.0
+
+# Streamlit の外（CLI）で使うときだけの置き場所
+_fallback: dict[str, Any] = {}
+
+
+@dataclass(frozen=True)
+class PendingRound:
+    """保存待ちの半荘1回分。"""
+
+    key: str
+    game_id: str
+    results: tuple[Any, ...]
+    seat_to_player: dict[int, str]
+    queued_at: str
+
+
+@dataclass
+class Flushed:
+    """`flush()` の結果。"""
+
+    # 送れた半荘の数
+    sent: int = 0
+    # サーバーに断られて列から外した半荘と、その理由（権限・卓の削除など）
+    rejected: list[tuple[PendingRound, str]] = field(default_factory=list)
+    # 通信に失敗して止まったときの例外。残りは列に残っている
+    error: AppError | None = None
+
+
+def _state() -> Any:
+    state = _session_state()
+    return _fallback if state is None else state
+
+
+def _queue() -> list[PendingRound]:
+    return _state().setdefault(_QUEUE_KEY, [])
+
+
+def enqueue(game_id: str, results: Sequence[Any], seat_to_player: dict[int, str]) -> PendingRound:
+    """半荘を列の最後に積む。まだ送らない。"""
+    entry = PendingRound(
+        key=str(uuid.uuid4()),
+        game_id=game_id,
+        results=tuple(results),
+        seat_to_player=dict(seat_to_player),
+        queued_at=now_iso(),
+    )
+    _queue().append(entry)
+    return entry
+
+
+def pending(game_id: str | None = None) -> list[PendingRound]:
+    """保存待ちの半荘を積んだ順に返す。game_id を渡すとその卓の分だけ。"""
+    return [e for e in _queue() if game_id is None or e.game_id == game_id]
+
+
+def discard(key: str) -> None:
+    """保存待ちから外す（送らずに捨てる）。"""
+    queue = _queue()
+    queue[:] = [e for e in queue if e.key != key]
+
+
+def flush(force: bool = False) -> Flushed:
+    """列を古い順に送る。通信に失敗したらそこで止め、残りは列に残す。
+
+    Args:
+        force: 直前の失敗から `RETRY_AFTER` 秒たっていなくても送る（「今すぐ送る」ボタン）。
+    """
+    done = Flushed()
+    state = _state()
+    queue = _queue()
+    if not queue:
+        return done
+    failed_at = state.get(_FAILED_AT_KEY)
+    if not force and failed_at is not None and time.monotonic() - failed_at < RETRY_AFTER:
+        return done
+
+    while queue:
+        entry = queue[0]
+        try:
+            games.add_round(entry.game_id, entry.results, entry.seat_to_player, client_key=entry.key)
+        except (NetworkError, AuthExpired) as exc:
+            # 電波が戻る・ログインし直せば送れる。残して止める。
+            state[_FAILED_AT_KEY] = time.monotonic()
+            done.error = exc
+            return done
+        except AppError as exc:
+            # 何度送っても同じ答えになる失敗。列に残すと後ろの半荘まで止まってしまう。
+            done.rejected.append((entry, str(exc)))
+        else:
+            done.sent += 1
+        queue.pop(0)
+    state.pop(_FAILED_AT_KEY, None)
+    return done
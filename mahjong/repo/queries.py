@@ -6,30 +6,271 @@
 
 from __future__ import annotations
 
-from typing import Any, Sequence
+from itertools import groupby
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, Iterator, Sequence
 
+from ..errors import SchemaOutOfDate
 from ..rules import RuleSet
-from ..stats import RoundEntry
-from ._base import AppError, call, client, group_rounds, results_payload, rows
+from ..stats import PlayerProfile, PlayerTally, RoundEntry, profiles, tally
+from ._base import AppError, client, iter_rounds, memo, read, results_payload, rows, single, write
+
+if TYPE_CHECKING:
+    from ..columnar import EntryColumns, Form
 
 _SCOPES = ("group_id", "tournament_id", "day_id", "game_id")
 
+# 差分同期で、変わった半荘を取り直すときの1回あたりの件数。
+# round_id は36文字あるので、これ以上まとめると URL が長くなりすぎる。
+_REFETCH_CHUNK = 100
+
+# v_round_entries を読むときの1ページの行数。サーバーの max-rows（Supabase の既定は1000）
+# 以下にすること。大きくすると、サーバーに切り詰められた短いページを「最後のページ」と
+# 取り違えて、続きを読まずに終わってしまう。
+PAGE_SIZE = 1000
+
+
+# v_round_entries から読む列の組。呼び出し側が使う列だけを取り寄せる。
+# select("*") だと大会名・卓名・プレイヤー名・ルールの jsonb が「半荘数 × 人数」回
+# 繰り返され、グループ通算では応答の大半がそれになる。
+# どの組にも group_id（共有キャッシュが所属を覚える）と round_id / round_created_at /
+# seat（差分同期で並べ直す）を含めること。
+_PROFILES = {
+    # stats.RoundEntry を作るだけ（順位表・グラフ・件数）
+    "stats": "group_id, round_id, round_created_at, seat, player_id, rank, point, tobi,"
+    " table_size, kaze",
+    # 持ち点からの再計算（_base.iter_rounds に渡す）
+    "recalc": "group_id, game_id, round_id, round_created_at, seat, player_id, raw_score,"
+    " point, rank, kaze, tobi",
+    # 書き出し（mahjong.export）。名前やルールは別の表として書き出すので id だけ
+    "export": "group_id, tournament_id, day_id, held_on, game_id, game_name, round_id,"
+    " round_created_at, seat, player_id, raw_score, point, rank, kaze, tobi",
+    # 画面にそのまま出す（名前・ルールまで）
+    "display": "*",
+}
+
+
+def entry_rows(scope: str, value: str, profile: str = "display") -> list[dict[str, Any]]:
+    """v_round_entries の生の行（半荘の作成順、半荘の中は席順）。
+
+    グループのデータなので共有キャッシュに載る。版数が進んでいたら、
+    変更フィード（migrations/005）で変わった半荘だけを取り直して写しに当てる。
+    中身は `stream_entry_rows()` を最後まで読んだもの。写しそのものなので全行を持つ。
+    一度流すだけの用途（書き出し・再計算）は `stream_entry_rows()` を直接使い、
+    ここを通さないこと（ページ1枚ぶんしか手元に溜めずに済む）。
+
+    Args:
+        profile: 読む列の組（`_PROFILES` のキー）。組ごとに別の読み取りとして扱う。
+    """
+    columns = _columns(scope, profile)
+
+    def patch(held: list[dict[str, Any]], group_id: str, since: int):
+        return _catch_up(scope, value, columns, held, group_id, since)
+
+    # "display" は従来のキーのまま（列を絞らない読み取りと同じもの）
+    key = ("v_round_entries", scope, value) + (() if profile == "display" else (profile,))
+    return memo(
+        key, lambda: list(stream_entry_rows(scope, value, profile)), owner=value, patch=patch
+    )
 
-def _fetch(scope: str, value: str) -> list[dict[str, Any]]:
+
+def stream_entry_rows(
+    scope: str, value: str, profile: str = "display", page_size: int | None = None
+) -> Iterator[dict[str, Any]]:
+    """v_round_entries を (round_created_at, round_id, seat) 順にページ単位で読み、1行ずつ返す。
+
+    旧実装は1回の execute() で全部を読んでいた。履歴がサーバーの max-rows を超えると
+    **黙って切り詰められ**、古い半荘が成績から消える。ここでは前のページの最後の行より
+    後ろを次のページとして読む（キーセット方式）。OFFSET と違い、読んでいる間に
+    半荘が足されても行が重複・欠落せず、何ページ目でも同じ速さで読める。
+
+    メモも共有キャッシュも通さない。一度だけ流し読みする用途（再計算など）に使い、
+    画面の読み取りは `entry_rows()` を使うこと。
+    """
+    columns = _columns(scope, profile)
+    page_size = page_size or PAGE_SIZE
+    last: dict[str, Any] | None = None
+    while True:
+
+        def run(after=last):
+            query = (
+                client()
+                .table("v_round_entries")
+                .select(columns)
+                .eq(scope, value)
+            )
+            if after is not None:
+                query = query.or_(_after(after))
+            return (
+                query.order("round_created_at")
+                .order("round_id")
+                .order("seat")
+                .limit(page_size)
+                .execute()
+            )
+
+        page = rows(read(run))
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+
+def stream_group_rows(
+    table: str, columns: str, group_id: str, active_only: bool = False, page_size: int | None = None
+) -> Iterator[dict[str, Any]]:
+    """グループの表（players / tournaments / tournament_days）を id 順にページ単位で読む。
+
+    `stream_entry_rows()` と同じく、前のページの最後の id より後ろを次のページにする。
+    書き出し（`mahjong.export`）用で、メモも共有キャッシュも通さない。
+
+    Args:
+        active_only: 論理削除した行を除く。
+    """
+    page_size = page_size or PAGE_SIZE
+    last: str | None = None
+    while True:
+
+        def run(after=last):
+            query = client().table(table).select(columns).eq("group_id", group_id)
+            if active_only:
+                query = query.is_("deleted_at", "null")
+            if after is not None:
+                query = query.gt("id", after)
+            return query.order("id").limit(page_size).execute()
+
+        page = rows(read(run))
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]["id"]
+
+
+def _columns(scope: str, profile: str) -> str:
     if scope not in _SCOPES:
         raise AppError(f"不正な集計スコープです: {scope}")
+    if profile not in _PROFILES:
+        raise AppError(f"不正な列の組です: {profile}")
+    return _PROFILES[profile]
+
+
+def _after(row: dict[str, Any]) -> str:
+    """(round_created_at, round_id, seat) が row より後ろの行、という PostgREST の or 条件。
+
+    値は二重引用符で囲む（タイムスタンプの ':' や '+' を区切り文字と取り違えさせない）。
+    この条件がビューの結合より先に効くよう、v_round_entries の table_size は窓関数を
+    使わずに数えている（migrations/003d）。
+    """
+    created, round_id, seat = row["round_created_at"], row["round_id"], row["seat"]
+    return (
+        f'round_created_at.gt."{created}",'
+        f'and(round_created_at.eq."{created}",round_id.gt.{round_id}),'
+        f'and(round_created_at.eq."{created}",round_id.eq.{round_id},seat.gt.{seat})'
+    )
+
+
+def fetch_round_changes(
+    group_id: str, since: int, page_size: int | None = None
+) -> list[dict[str, Any]]:
+    """版数 since より後に変わった半荘（変更フィード）。古い順。
+
+    1回の execute() では、変更が max-rows を超えたぶんが黙って切り詰められ、
+    取り直すべき半荘を落としたまま「追いついた」ことになる。`stream_entry_rows()` と
+    同じくキーセット方式で最後まで読む。同じ版数の行は1文でまとめて入るので、
+    版数だけでなく (revision, id) で区切る。
+    """
+    page_size = page_size or PAGE_SIZE
+    found: list[dict[str, Any]] = []
+    last: dict[str, Any] | None = None
+    while True:
+
+        def run(after=last):
+            query = (
+                client()
+                .table("round_changes")
+                .select("id, revision, op, round_id")
+                .eq("group_id", group_id)
+                .gt("revision", since)
+            )
+            if after is not None:
+                revision, change_id = after["revision"], after["id"]
+                query = query.or_(
+                    f"revision.gt.{revision},and(revision.eq.{revision},id.gt.{change_id})"
+                )
+            return query.order("revision").order("id").limit(page_size).execute()
+
+        page = rows(read(run))
+        found.extend(page)
+        if len(page) < page_size:
+            return found
+        last = page[-1]
+
+
+def fetch_pruned_revision(group_id: str) -> int:
+    """フィードから掃除済みの版数（migrations/005 の round_changes_pruned）。
+
+    この版数までの変更はフィードに残っていないことがある。掃除していなければ 0。
+    """
 
     def run():
         return (
             client()
-            .table("v_round_entries")
-            .select("*")
-            .eq(scope, value)
-            .order("round_created_at")
+            .table("round_changes_pruned")
+            .select("revision")
+            .eq("group_id", group_id)
+            .limit(1)
             .execute()
         )
 
-    return rows(call(run))
+    found = single(read(run))
+    return int(found["revision"]) if found else 0
+
+
+def _catch_up(
+    scope: str, value: str, columns: str, held: list[dict[str, Any]], group_id: str, since: int
+) -> list[dict[str, Any]] | None:
+    """手元の写しに、since より後の変更を当てた新しい行リストを返す。
+
+    作成日時を目印に「新しい行」を足すだけでは、update_round / delete_round による
+    古い半荘の書き換えを取りこぼす。フィードに載った半荘は追加・修正・削除を
+    区別せず取り直し、返ってこなかったもの（削除済み・範囲外）は写しから落とす。
+
+    Returns:
+        追いつけないとき（フィードが無い・since までの変更が掃除で消えている・
+        卓や大会の改名などの 'reset' がある）は None。
+    """
+    try:
+        if since < fetch_pruned_revision(group_id):
+            return None
+        changes = fetch_round_changes(group_id, since)
+    except SchemaOutOfDate:
+        return None
+    if any(c["op"] == "reset" for c in changes):
+        return None
+    changed = list(dict.fromkeys(c["round_id"] for c in changes))
+    if not changed:
+        return list(held)
+
+    fresh: list[dict[str, Any]] = []
+    for start in range(0, len(changed), _REFETCH_CHUNK):
+        chunk = changed[start : start + _REFETCH_CHUNK]
+
+        def run(chunk=chunk):
+            return (
+                client()
+                .table("v_round_entries")
+                .select(columns)
+                .eq(scope, value)
+                .in_("round_id", chunk)
+                .execute()
+            )
+
+        fresh.extend(rows(read(run)))
+
+    gone = set(changed)
+    merged = [row for row in held if row["round_id"] not in gone] + fresh
+    merged.sort(key=lambda r: (r["round_created_at"], r["round_id"], r["seat"]))
+    return merged
 
 
 def _entry(row: dict[str, Any]) -> RoundEntry:
@@ -50,24 +291,136 @@ def fetch_entries(scope: str, value: str) -> list[RoundEntry]:
     順位は保存済みの `rank` をそのまま使うので、同点の解釈が
     書き込み時と読み出し時でずれることはない。
     """
-    return [_entry(row) for row in _fetch(scope, value)]
+    return [_entry(row) for row in entry_rows(scope, value, "stats")]
+
+
+def fetch_entry_columns(scope: str, value: str) -> EntryColumns:
+    """`fetch_entries()` と同じ記録を、列持ち（`columnar.EntryColumns`）で返す。
+
+    行ごとに RoundEntry を作らないので、グループ通算の順位表（`stats.aggregate()`）が
+    記録の数に比例して重くならない。numpy を読み込むので、グラフを出す画面で使う。
+    """
+    from ..columnar import EntryColumns
+
+    return EntryColumns.from_rows(entry_rows(scope, value, "stats"))
+
+
+def fetch_standings(scope: str, value: str) -> dict[str, PlayerTally]:
+    """順位表に必要な、プレイヤーごとの集計の素（`stats.from_tallies()` に渡す）。
+
+    全記録を取り寄せて数える代わりに、DB で1人1行に数えたもの（migrations/006 の
+    `scope_standings`）を受け取る。応答は「半荘数 × 人数」行から人数分に減る。
+    グループ・大会・開催日は、トリガで保っている集計表（migrations/007）を読むだけになる。
+    半荘数は `stats.round_count()` で求まる。
+
+    006 が未適用なら、従来どおり全記録を読んで手元で数える。
+    """
+    if scope not in _SCOPES:
+        raise AppError(f"不正な集計スコープです: {scope}")
+
+    def run():
+        return client().rpc("scope_standings", {"p_scope": scope, "p_id": value}).execute()
+
+    try:
+        found = memo(("scope_standings", scope, value), lambda: rows(read(run)), owner=value)
+    except SchemaOutOfDate:
+        # v_round_entries の table_size は0にならないので、人数の代わりは使われない
+        return tally(fetch_entries(scope, value), 0)
+    return {row["player_id"]: _tally(row) for row in found}
+
+
+def _tally(row: dict[str, Any]) -> PlayerTally:
+    return PlayerTally(
+        player_id=row["player_id"],
+        games=int(row["games"]),
+        total_point=int(row["total_point"]),
+        rank_sum=int(row["rank_sum"]),
+        rank_counts=tuple(int(c) for c in row["rank_counts"] or ()),
+        last_count=int(row["last_count"]),
+        tobi_count=int(row["tobi_count"]),
+        best_point=int(row["best_point"]),
+        worst_point=int(row["worst_point"]),
+    )
 
 
 def fetch_rounds_in_order(scope: str, value: str) -> list[list[RoundEntry]]:
-    """半荘を時系列順にまとめて返す（累積推移グラフ用）。"""
+    """半荘を時系列順にまとめて返す（累積推移グラフ用）。
+
+    `fetch_entries()` と同じ列の組を読むので、続けて呼んでも通信は1回で済む。
+    `entry_rows()` の行は (作成日時, round_id, 席) 順に並んでいるので、隣り合う行を
+    まとめるだけでよい（並び順は `_base.group_rounds()` と同じになる）。
+    """
     return [
-        [_entry(r) for r in rnd["results"]]
-        for rnd in group_rounds(_fetch(scope, value))
+        [_entry(r) for r in results]
+        for _, results in groupby(entry_rows(scope, value, "stats"), key=itemgetter("round_id"))
     ]
 
 
+def fetch_profiles(scope: str, value: str) -> dict[str, PlayerProfile]:
+    """範囲内の全員の掘り下げ（`stats.profiles()`）。player_id → PlayerProfile。
+
+    個人成績の画面は、プレイヤーを切り替えるたびに全半荘を6周していた。
+    ここで全員分を1周で作り、読み取りと同じく共有キャッシュに載せる
+    （v_round_entries から決まる値なので、メンバーなら誰が見ても同じ）。
+    切り替えは辞書を引くだけになり、グループの版数が進んだときだけ作り直す。
+    """
+    _columns(scope, "stats")
+    return memo(
+        ("profiles", scope, value),
+        lambda: profiles(fetch_rounds_in_order(scope, value)),
+        owner=value,
+    )
+
+
+def fetch_form(scope: str, value: str, player_count: int) -> Form:
+    """範囲内の全員の調子の推移（`columnar.form()`、窓は `columnar.FORM_WINDOWS`）。
+
+    窓や指標を画面で切り替えても作り直さないよう、全部を一度に作って共有キャッシュに
+    載せる。ラスの判定に卓の人数の既定値を使うので、キーに player_count を含める。
+    """
+    from ..columnar import form
+
+    _columns(scope, "stats")
+    return memo(
+        ("form", scope, value, player_count),
+        lambda: form(fetch_entry_columns(scope, value), player_count),
+        owner=value,
+    )
+
+
 def count_rounds(scope: str, value: str) -> int:
     """半荘数。
 
     旧実装は「延べ人数 ÷ 現在のルール人数」で求めていたため、
     3人卓と4人卓が混ざる大会や、削除済みプレイヤーがいる大会で狂っていた。
+    その次の実装は全記録を取り寄せて round_id を数えており、グループ通算だと
+    整数1つのために数MBを読んでいた。いまは DB で数えた整数だけを受け取る
+    （migrations/009 の `scope_round_count`）。009 が未適用なら全記録から数える。
+
+    同じ範囲の記録をどのみち読むなら `fetch_entries_with_count()` を使うこと（1往復で済む）。
     """
-    return len({row["round_id"] for row in _fetch(scope, value)})
+    if scope not in _SCOPES:
+        raise AppError(f"不正な集計スコープです: {scope}")
+
+    def run():
+        return client().rpc("scope_round_count", {"p_scope": scope, "p_id": value}).execute()
+
+    try:
+        return memo(
+            ("scope_round_count", scope, value), lambda: int(read(run).data or 0), owner=value
+        )
+    except SchemaOutOfDate:
+        return _distinct_rounds(entry_rows(scope, value, "stats"))
+
+
+def fetch_entries_with_count(scope: str, value: str) -> tuple[list[RoundEntry], int]:
+    """`fetch_entries()` と半荘数を、同じ1回の読み取りから返す。"""
+    found = entry_rows(scope, value, "stats")
+    return [_entry(row) for row in found], _distinct_rounds(found)
+
+
+def _distinct_rounds(found: list[dict[str, Any]]) -> int:
+    return len({row["round_id"] for row in found})
 
 
 def fetch_stored_rounds_for_recalc(tournament_id: str) -> list[dict[str, Any]]:
@@ -76,8 +429,10 @@ def fetch_stored_rounds_for_recalc(tournament_id: str) -> list[dict[str, Any]]:
     持ち点(raw_score)を保存しているからこそ、ウマや返し点を変えても
     過去データを作り直せる。
     """
+    # 大会まるごとを一度だけ流し読みする。半荘ができあがるたびに必要な列だけ残すので、
+    # 生の行を全部抱えない。
     stored = []
-    for rnd in group_rounds(_fetch("tournament_id", tournament_id)):
+    for rnd in iter_rounds(stream_entry_rows("tournament_id", tournament_id, "recalc")):
         stored.append(
             {
                 "round_id": rnd["id"],
@@ -125,4 +480,4 @@ def apply_recalculated_rounds(
             },
         ).execute()
 
-    return int(call(run).data or 0)
+    return int(write(run, touches=tournament_id).data or 0)
@@ -9,8 +9,10 @@ from __future__ import annotations
 from datetime import date
 from typing import Any
 
+from ..errors import SchemaOutOfDate
 from ..rules import RuleSet, load_ruleset
-from ._base import AppError, call, client, now_iso, rows, single
+from . import games, queries
+from ._base import AppError, client, memo, read, rows, single, soft_delete, write
 
 _COLUMNS = "id, group_id, name, ruleset, note, created_by, created_at"
 
@@ -30,7 +32,50 @@ def list_tournaments(group_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return rows(call(run))
+    return memo(("tournaments", "group_id", group_id), lambda: rows(read(run)), owner=group_id)
+
+
+def list_tournament_overview(group_id: str) -> list[dict[str, Any]]:
+    """大会一覧の画面用。`list_tournaments()` の列に要約を足したものを1往復で返す。
+
+    旧実装は大会ごとに list_days() と count_rounds() を呼んでおり、大会が40あれば
+    80往復を超え、半荘数を数えるためだけに全記録を取り寄せていた。
+
+    足す列: day_count / round_count / player_count / last_played_on
+    （記録のある開催日のうち最新の日付。記録が無ければ None）。
+    008 が未適用なら、従来どおり大会ごとに読んで同じ形を作る。
+    """
+
+    def run():
+        return (
+            client()
+            .table("v_tournament_overview")
+            .select(f"{_COLUMNS}, day_count, round_count, player_count, last_played_on")
+            .eq("group_id", group_id)
+            .order("created_at", desc=True)
+            .execute()
+        )
+
+    try:
+        return memo(
+            ("v_tournament_overview", "group_id", group_id),
+            lambda: rows(read(run)),
+            owner=group_id,
+        )
+    except SchemaOutOfDate:
+        return [_overview(t) for t in list_tournaments(group_id)]
+
+
+def _overview(tournament: dict[str, Any]) -> dict[str, Any]:
+    """v_tournament_overview の1行を、大会ごとの読み取りから作る（008 未適用時）。"""
+    entries = queries.entry_rows("tournament_id", tournament["id"])
+    return {
+        **tournament,
+        "day_count": len(list_days(tournament["id"])),
+        "round_count": len({e["round_id"] for e in entries}),
+        "player_count": len({e["player_id"] for e in entries}),
+        "last_played_on": max((e["held_on"] for e in entries), default=None),
+    }
 
 
 def get_tournament(tournament_id: str) -> dict[str, Any] | None:
@@ -45,7 +90,9 @@ def get_tournament(tournament_id: str) -> dict[str, Any] | None:
             .execute()
         )
 
-    return single(call(run))
+    return memo(
+        ("tournaments", "id", tournament_id), lambda: single(read(run)), owner=tournament_id
+    )
 
 
 def get_ruleset(tournament_id: str) -> tuple[RuleSet, list[str]]:
@@ -82,7 +129,7 @@ def create_tournament(
     def run():
         return client().table("tournaments").insert(payload).execute()
 
-    created = single(call(run))
+    created = single(write(run, touches=group_id))
     if not created:
         raise AppError("大会を作成できませんでした。")
     return created["id"]
@@ -110,20 +157,11 @@ def update_tournament(
     def run():
         return client().table("tournaments").update(payload).eq("id", tournament_id).execute()
 
-    call(run)
+    write(run, touches=tournament_id)
 
 
 def delete_tournament(tournament_id: str) -> None:
-    def run():
-        return (
-            client()
-            .table("tournaments")
-            .update({"deleted_at": now_iso()})
-            .eq("id", tournament_id)
-            .execute()
-        )
-
-    call(run)
+    soft_delete("tournaments", tournament_id)
 
 
 # --- 開催日 -----------------------------------------------------------------
@@ -145,7 +183,37 @@ def list_days(tournament_id: str) -> list[dict[str, Any]]:
             .execute()
         )
 
-    return rows(call(run))
+    return memo(
+        ("tournament_days", "tournament_id", tournament_id),
+        lambda: rows(read(run)),
+        owner=tournament_id,
+    )
+
+
+def list_days_with_games(tournament_id: str) -> list[dict[str, Any]]:
+    """開催日を新しい順に、その日の卓（作成順）と半荘数を付けて返す。
+
+    旧実装は画面が開催日ごとに list_games() を呼んでおり、6日ある大会で6往復していた。
+    ここでは大会まるごとの v_game_seats を1回読み、day_id ごとに振り分ける。
+    開催日の一覧と合わせて2往復で済む（卓の無い開催日も一覧に出すため、日付は別に読む）。
+
+    各開催日に足すキー: games（`games.list_games()` と同じ形）/ round_count。
+    """
+    by_day: dict[str, list[dict[str, Any]]] = {}
+    for game in games.list_games_in_tournament(tournament_id):
+        by_day.setdefault(game["day_id"], []).append(game)
+
+    found = []
+    for day in list_days(tournament_id):
+        day_games = sorted(by_day.get(day["id"], []), key=lambda g: g["created_at"])
+        found.append(
+            {
+                **day,
+                "games": day_games,
+                "round_count": sum(g["round_count"] for g in day_games),
+            }
+        )
+    return found
 
 
 def get_day(day_id: str) -> dict[str, Any] | None:
@@ -160,7 +228,7 @@ def get_day(day_id: str) -> dict[str, Any] | None:
             .execute()
         )
 
-    return single(call(run))
+    return memo(("tournament_days", "id", day_id), lambda: single(read(run)), owner=day_id)
 
 
 def create_day(
@@ -181,7 +249,7 @@ def create_day(
     def run():
         return client().table("tournament_days").insert(payload).execute()
 
-    created = single(call(run))
+    created = single(write(run, touches=group_id))
     if not created:
         raise AppError("開催日を追加できませんでした。")
     return created["id"]
@@ -206,17 +274,8 @@ def update_day(
     def run():
         return client().table("tournament_days").update(payload).eq("id", day_id).execute()
 
-    call(run)
+    write(run, touches=day_id)
 
 
 def delete_day(day_id: str) -> None:
-    def run():
-        return (
-            client()
-            .table("tournament_days")
-            .update({"deleted_at": now_iso()})
-            .eq("id", day_id)
-            .execute()
-        )
-
-    call(run)
+    soft_delete("tournament_days", day_id)
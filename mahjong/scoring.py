@@ -14,8 +14,10 @@ floor(abs(v) + 0.4) が 5 ではなく 4 を返して静かに壊れるため。
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Sequence
 
 from .rules import (
+    KAZE_NAMES,
     KAZE_ORDER,
     ROUND_CEIL,
     ROUND_FLOOR,
@@ -266,3 +268,74 @@ def recalculate(
         )
         for r in stored_rounds
     ]
+
+
+# --- まとめて入力（記録表の写し） -------------------------------------------
+
+
+def kazes_for_dealer(dealer: int, n: int) -> list[str]:
+    """並びの dealer 番目の人が東家のときの、各人の風。
+
+    親は打順（東→南→西→北）の向きに移るので、東家の次の人が南家になる。
+    """
+    return [KAZE_NAMES[(i - dealer) % n] for i in range(n)]
+
+
+@dataclass(frozen=True)
+class SheetLine:
+    """`calc_sheet()` の1行ぶん。
+
+    Attributes:
+        row: 入力の何行目か（0始まり）。空欄の行は返さないので連番とは限らない。
+        dealer: 東家の並び位置。入力が空なら前の行の東家の次の人。
+        results: 計算結果。計算できなければ None。
+        error: 計算できなかった理由（そのまま画面に出せる文）。
+    """
+
+    row: int
+    dealer: int
+    results: list[SeatResult] | None = None
+    error: str | None = None
+
+
+def calc_sheet(
+    scores: Sequence[Sequence[int | None]],
+    dealers: Sequence[int | None],
+    rules: RuleSet,
+    seats: list[int] | None = None,
+    first_dealer: int = 0,
+    strict: bool = True,
+) -> list[SheetLine]:
+    """記録表の行をまとめて計算する。1行が1半荘、列が席の並び。
+
+    紙の記録表には東家を毎回は書かないので、東家の空いた行は前の行の次の人にする
+    （1行目は first_dealer）。最後の席だけ空いている行は、`score_entry` の自動計算と
+    同じく合計から埋める。全部空いている行は飛ばす。
+
+    計算できない行があっても止めずに、その行の error に理由を入れて続ける。
+    何行目が悪いかを一度に全部見せるため。
+    """
+    n = rules.player_count
+    lines = []
+    next_dealer = first_dealer
+    for row, (values, given) in enumerate(zip(scores, dealers)):
+        if all(v is None for v in values):
+            continue
+        dealer = next_dealer if given is None else given
+        next_dealer = (dealer + 1) % n
+        filled = list(values)
+        if len(filled) == n and filled[-1] is None and None not in filled[:-1]:
+            filled[-1] = rules.total_score - sum(filled[:-1])
+        if None in filled:
+            lines.append(SheetLine(row, dealer, error="空欄があります（空けてよいのは最後の席だけです）。"))
+            continue
+        try:
+            results = calc_round(
+                [int(v) for v in filled], kazes_for_dealer(dealer, n), rules,
+                seats=seats, strict=strict,
+            )
+        except ScoringError as exc:
+            lines.append(SheetLine(row, dealer, error=str(exc)))
+            continue
+        lines.append(SheetLine(row, dealer, results=results))
+    return lines
@@ -8,12 +8,21 @@ from __future__ import annotations
 
 from collections import defaultdict
 from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping, Sequence
 
 from .rules import RuleSet
 
+if TYPE_CHECKING:
+    from .columnar import EntryColumns
+
 # 麻雀の1卓の上限。順位の段数がこれを超えることはない。
 MAX_SEATS = 4
 
+# これより記録が多いときは、列持ちの集計（`columnar`）で数える。
+# 少ないうちは numpy を読み込む時間の方が長い。
+COLUMNAR_MIN_ENTRIES = 5000
+
 
 @dataclass(frozen=True)
 class RoundEntry:
@@ -64,8 +73,75 @@ class PlayerStats:
         return self.rank_counts[rank - 1] / self.games
 
 
+@dataclass(frozen=True)
+class PlayerTally:
+    """1プレイヤーの集計の素。足し算と最大・最小だけで作れる量に限る。
+
+    `aggregate()` はこれを経由して PlayerStats を作る。サーバー側の集計 RPC
+    （`scope_standings`、migrations/006）も同じ形を返すので、
+    全記録を取り寄せなくても `from_tallies()` で同じ順位表が作れる。
+
+    Attributes:
+        rank_sum: 順位の合計（平均順位用）。範囲外の順位もそのまま足す。
+        rank_counts: 1〜4位の回数（長さ MAX_SEATS）。範囲外の順位は数えない。
+        last_count: 「その卓の人数と同じ順位」だった回数。
+    """
+
+    player_id: str
+    games: int
+    total_point: int
+    rank_sum: int
+    rank_counts: tuple[int, ...]
+    last_count: int
+    tobi_count: int
+    best_point: int
+    worst_point: int
+
+
+def tally(entries: list[RoundEntry], player_count: int) -> dict[str, PlayerTally]:
+    """半荘ごとの記録を、プレイヤーごとの集計の素にまとめる。
+
+    Args:
+        player_count: table_size が 0 の記録で、ラスの判定に代わりに使う人数。
+    """
+    by_player: dict[str, list[RoundEntry]] = defaultdict(list)
+    for entry in entries:
+        by_player[entry.player_id].append(entry)
+
+    tallies: dict[str, PlayerTally] = {}
+    for player_id, rows in by_player.items():
+        points = [r.point for r in rows]
+        counts = [0] * MAX_SEATS
+        for r in rows:
+            # 想定外の順位が紛れ込んでも集計全体を落とさない
+            if 1 <= r.rank <= MAX_SEATS:
+                counts[r.rank - 1] += 1
+        tallies[player_id] = PlayerTally(
+            player_id=player_id,
+            games=len(rows),
+            total_point=sum(points),
+            rank_sum=sum(r.rank for r in rows),
+            rank_counts=tuple(counts),
+            # ラスは「その卓の人数と同じ順位」。3人卓と4人卓が混ざっても正しく数える。
+            last_count=sum(1 for r in rows if r.rank == (r.table_size or player_count)),
+            tobi_count=sum(1 for r in rows if r.tobi),
+            best_point=max(points),
+            worst_point=min(points),
+        )
+    return tallies
+
+
+def round_count(tallies: dict[str, PlayerTally]) -> int:
+    """集計範囲の半荘数。
+
+    round_results に UNIQUE (round_id, rank) があり、どの半荘にも1位がちょうど1人いる。
+    そのため1位の回数の合計が半荘数になる（全記録を数え直さずに済む）。
+    """
+    return sum(t.rank_counts[0] for t in tallies.values() if t.rank_counts)
+
+
 def aggregate(
-    entries: list[RoundEntry],
+    entries: Sequence[RoundEntry] | EntryColumns,
     players: dict[str, str],
     rules: RuleSet,
 ) -> list[PlayerStats]:
@@ -78,33 +154,49 @@ def aggregate(
 
     Args:
         entries: 全半荘・全プレイヤー分の記録。順序は問わない。
+            `COLUMNAR_MIN_ENTRIES` 件以上か、すでに列持ち（`columnar.EntryColumns`）なら
+            列持ちの集計で数える（結果は同じ）。
         players: player_id -> 表示名。ここに含まれる全員分を返す。
         rules: 人数（順位の段数の下限）とレート（金額換算）に使う。
 
     Returns:
         合計ポイントの降順。同点は平均順位の良い方を上位にする。
     """
-    by_player: dict[str, list[RoundEntry]] = defaultdict(list)
-    for entry in entries:
-        by_player[entry.player_id].append(entry)
+    if isinstance(entries, (list, tuple)) and len(entries) < COLUMNAR_MIN_ENTRIES:
+        return from_tallies(tally(entries, rules.player_count), players, rules)
+    from . import columnar
 
+    tallies = columnar.tally(columnar.as_columns(entries), rules.player_count)
+    return from_tallies(tallies, players, rules)
+
+
+def from_tallies(
+    tallies: dict[str, PlayerTally],
+    players: dict[str, str],
+    rules: RuleSet,
+) -> list[PlayerStats]:
+    """集計の素から通算成績を作る。引数と戻り値の約束は `aggregate()` と同じ。"""
     # 名簿に無い player_id を落とさない。落とすと合計が0にならなくなる。
     names = dict(players)
-    for player_id in by_player:
+    for player_id in tallies:
         names.setdefault(player_id, f"(退会者 {player_id[:8]})")
 
     # 順位の段数は「ルールの人数」と「実際に現れた順位」の大きい方に合わせる。
     # 4人打ちの記録がある大会を3人設定に変えても、4着の記録が消えないようにする。
     # 麻雀の順位は最大4なので、壊れた値（rank=9 等）で段数が膨らまないよう上限を設ける。
-    observed = [e.rank for e in entries if 1 <= e.rank <= MAX_SEATS]
+    observed = [
+        rank
+        for t in tallies.values()
+        for rank, count in enumerate(t.rank_counts, start=1)
+        if count and rank <= MAX_SEATS
+    ]
     n = max([rules.player_count] + observed)
 
     result: list[PlayerStats] = []
     for player_id, name in names.items():
-        rows = by_player.get(player_id, [])
-        games = len(rows)
+        t = tallies.get(player_id)
 
-        if games == 0:
+        if t is None or t.games == 0:
             result.append(
                 PlayerStats(
                     player_id=player_id,
@@ -125,35 +217,24 @@ def aggregate(
             )
             continue
 
-        points = [r.point for r in rows]
-        total = sum(points)
-        counts = [0] * n
-        for r in rows:
-            # 想定外の順位が紛れ込んでも集計全体を落とさない
-            if 1 <= r.rank <= n:
-                counts[r.rank - 1] += 1
-
-        # ラスは「その卓の人数と同じ順位」。3人卓と4人卓が混ざっても正しく数える。
-        last_count = sum(
-            1 for r in rows if r.rank == (r.table_size or rules.player_count)
-        )
-
+        games = t.games
+        counts = (list(t.rank_counts) + [0] * n)[:n]
         result.append(
             PlayerStats(
                 player_id=player_id,
                 name=name,
                 games=games,
-                total_point=total,
-                avg_point=total / games,
-                avg_rank=sum(r.rank for r in rows) / games,
+                total_point=t.total_point,
+                avg_point=t.total_point / games,
+                avg_rank=t.rank_sum / games,
                 rank_counts=tuple(counts),
                 top_rate=counts[0] / games,
                 rentai_rate=(counts[0] + counts[1]) / games if n >= 2 else 0.0,
-                last_rate=last_count / games,
-                tobi_count=sum(1 for r in rows if r.tobi),
-                best_point=max(points),
-                worst_point=min(points),
-                money=total * rules.rate,
+                last_rate=t.last_count / games,
+                tobi_count=t.tobi_count,
+                best_point=t.best_point,
+                worst_point=t.worst_point,
+                money=t.total_point * rules.rate,
             )
         )
 
@@ -213,6 +294,10 @@ class Opponent:
     def beat_rate(self) -> float:
         return self.beat / self.games if self.games else 0.0
 
+    @property
+    def my_avg_point(self) -> float:
+        return self.my_total_point / self.games if self.games else 0.0
+
 
 @dataclass(frozen=True)
 class KazeStats:
@@ -373,3 +458,152 @@ def point_by_rank(rounds: list[list[RoundEntry]], player_id: str) -> dict[int, f
     for entry in player_rounds(rounds, player_id):
         buckets[entry.rank].append(entry.point)
     return {rank: sum(points) / len(points) for rank, points in sorted(buckets.items())}
+
+
+# --- 全員分の掘り下げを1周で ------------------------------------------------
+
+
+@dataclass(frozen=True)
+class PlayerProfile:
+    """1人を主語にした掘り下げ一式。`profiles()` が全員分を一度に作る。
+
+    各項目は同名の関数に (rounds, player_id) を渡したときと同じ値になる。
+    共有キャッシュに載り、キャッシュの写しは浅いので、中身も書き換えられない形で持つ
+    （point_by_rank は読み取り専用の Mapping）。
+    """
+
+    player_id: str
+    rounds: tuple[RoundEntry, ...]  # player_rounds()
+    opponents: tuple[Opponent, ...]  # head_to_head()
+    kaze: tuple[KazeStats, ...]  # kaze_breakdown()
+    streaks: Streaks
+    point_by_rank: Mapping[int, float]
+
+    def rank_trend(self, window: int = 10) -> list[float]:
+        """`rank_trend()` と同じ。窓は画面で変えられるので、ここで都度作る（1人分なので軽い）。"""
+        trend, total = [], 0
+        ranks = [e.rank for e in self.rounds]
+        for i, rank in enumerate(ranks):
+            total += rank
+            if i >= window:
+                total -= ranks[i - window]
+            trend.append(total / min(i + 1, window))
+        return trend
+
+
+class _Walk:
+    """`profiles()` が1人ぶんを数えるための入れ物。"""
+
+    __slots__ = (
+        "rounds", "vs_games", "vs_rank", "vs_point", "vs_beat", "kaze", "by_rank",
+        "top", "last", "rentai", "longest_top", "longest_last", "longest_rentai",
+    )
+
+    def __init__(self) -> None:
+        self.rounds: list[RoundEntry] = []
+        self.vs_games: dict[str, int] = defaultdict(int)
+        self.vs_rank: dict[str, int] = defaultdict(int)
+        self.vs_point: dict[str, int] = defaultdict(int)
+        self.vs_beat: dict[str, int] = defaultdict(int)
+        # 風 → [半荘, 順位の合計, ポイントの合計, トップ]
+        self.kaze: dict[str, list[int]] = {}
+        # 着順 → [ポイントの合計, 回数]
+        self.by_rank: dict[int, list[int]] = {}
+        self.top = self.last = self.rentai = 0
+        self.longest_top = self.longest_last = self.longest_rentai = 0
+
+
+def profiles(rounds: list[list[RoundEntry]]) -> dict[str, PlayerProfile]:
+    """記録に出てくる全員の `PlayerProfile` を、半荘の並びを1周して作る。
+
+    旧実装の個人成績の画面は、player_rounds / streaks / kaze_breakdown / rank_trend /
+    point_by_rank / head_to_head を順に呼び、それぞれが全半荘をなめて、
+    半荘ごとに本人を先頭から探していた。プレイヤーを切り替えるたびにこれを繰り返す。
+
+    同じ半荘に同じ人が2回出てくる壊れた記録では、各関数と同じく最初の1件を使う。
+    """
+    walks: dict[str, _Walk] = {}
+    for entries in rounds:
+        seen: set[str] = set()
+        for me in entries:
+            if me.player_id in seen:
+                continue
+            seen.add(me.player_id)
+            walk = walks.get(me.player_id)
+            if walk is None:
+                walk = walks[me.player_id] = _Walk()
+            walk.rounds.append(me)
+
+            for other in entries:
+                if other.player_id == me.player_id:
+                    continue
+                walk.vs_games[other.player_id] += 1
+                walk.vs_rank[other.player_id] += me.rank
+                walk.vs_point[other.player_id] += me.point
+                if me.rank < other.rank:
+                    walk.vs_beat[other.player_id] += 1
+
+            if me.kaze:
+                bucket = walk.kaze.setdefault(me.kaze, [0, 0, 0, 0])
+                bucket[0] += 1
+                bucket[1] += me.rank
+                bucket[2] += me.point
+                bucket[3] += me.rank == 1
+            by_rank = walk.by_rank.setdefault(me.rank, [0, 0])
+            by_rank[0] += me.point
+            by_rank[1] += 1
+
+            # streaks() と同じ。卓の人数が無ければその半荘の参加人数で代用する
+            walk.top = walk.top + 1 if me.rank == 1 else 0
+            walk.last = walk.last + 1 if me.rank == (me.table_size or len(entries)) else 0
+            walk.rentai = walk.rentai + 1 if me.rank <= 2 else 0
+            walk.longest_top = max(walk.longest_top, walk.top)
+            walk.longest_last = max(walk.longest_last, walk.last)
+            walk.longest_rentai = max(walk.longest_rentai, walk.rentai)
+
+    return {player_id: _profile(player_id, walk) for player_id, walk in walks.items()}
+
+
+def _profile(player_id: str, walk: _Walk) -> PlayerProfile:
+    from .rules import KAZE_NAMES
+
+    opponents = [
+        Opponent(
+            player_id=pid,
+            games=count,
+            my_avg_rank=walk.vs_rank[pid] / count,
+            my_total_point=walk.vs_point[pid],
+            beat=walk.vs_beat[pid],
+        )
+        for pid, count in walk.vs_games.items()
+    ]
+    opponents.sort(key=lambda o: (-o.games, o.my_avg_rank))
+    kaze = [
+        KazeStats(
+            kaze=k,
+            games=games,
+            avg_rank=rank_sum / games,
+            avg_point=total / games,
+            total_point=total,
+            top_rate=tops / games,
+        )
+        for k in KAZE_NAMES
+        if k in walk.kaze
+        for games, rank_sum, total, tops in [walk.kaze[k]]
+    ]
+    return PlayerProfile(
+        player_id=player_id,
+        rounds=tuple(walk.rounds),
+        opponents=tuple(opponents),
+        kaze=tuple(kaze),
+        streaks=Streaks(
+            longest_top=walk.longest_top,
+            longest_last=walk.longest_last,
+            longest_rentai=walk.longest_rentai,
+            current_top=walk.top,
+            current_last=walk.last,
+        ),
+        point_by_rank=MappingProxyType(
+            {rank: total / count for rank, (total, count) in sorted(walk.by_rank.items())}
+        ),
+    )
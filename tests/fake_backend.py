@@ -7,13 +7,15 @@ RLS や SQL の再現はしない（そこは SQL 側のテストとプリフラ
 
 from __future__ import annotations
 
+import copy
 import itertools
 from datetime import date, datetime, timezone
 from typing import Any
 
+from mahjong.columnar import EntryColumns
 from mahjong.errors import AppError
 from mahjong.rules import DEFAULT_RULESET, RuleSet
-from mahjong.stats import RoundEntry
+from mahjong.stats import RoundEntry, profiles, tally
 
 _ids = itertools.count(1)
 
@@ -110,10 +112,28 @@ class FakeBackend:
         self.rounds: list[dict[str, Any]] = []
         self.calls: list[str] = []
 
+    def tournament_overview(self) -> list[dict[str, Any]]:
+        """v_tournament_overview と同じ形。大会は1つしかないので全記録がその大会のもの。"""
+        played = {r["player_id"] for rnd in self.rounds for r in rnd["results"]}
+        return [
+            {
+                **t,
+                "day_count": len(self.days),
+                "round_count": len(self.rounds),
+                "player_count": len(played),
+                "last_played_on": self.days[0]["held_on"] if self.rounds else None,
+            }
+            for t in self.tournaments
+        ]
+
     # --- 記録 ---------------------------------------------------------
 
-    def add_round(self, game_id, results, seat_to_player):
+    def add_round(self, game_id, results, seat_to_player, client_key=None):
         self.calls.append("add_round")
+        if client_key is not None:
+            for rnd in self.rounds:
+                if rnd.get("client_key") == client_key:
+                    return rnd["id"]
         round_id = _uid("rnd")
         self.rounds.append(
             {
@@ -123,6 +143,7 @@ class FakeBackend:
                 "created_at": _now(),
                 "ruleset": self.rules.to_dict(),
                 "no": len(self.rounds) + 1,
+                "client_key": client_key,
                 "results": [
                     {
                         "player_id": seat_to_player[r.seat],
@@ -165,6 +186,23 @@ class FakeBackend:
                 return
         raise AppError("半荘が見つかりません。")
 
+    def save_rounds(self, game_id, rounds, seat_to_player):
+        """1回の呼び出しで全部を保存する（RPC 1往復）。途中で弾かれたら何も残さない。"""
+        self.calls.append("save_rounds")
+        before = copy.deepcopy(self.rounds)
+        saved = []
+        try:
+            for round_id, results in rounds:
+                if round_id is None:
+                    saved.append(self.add_round(game_id, results, seat_to_player))
+                else:
+                    self.update_round(round_id, results, seat_to_player)
+                    saved.append(round_id)
+        except AppError:
+            self.rounds = before
+            raise
+        return saved
+
     def delete_round(self, round_id):
         self.calls.append("delete_round")
         self.rounds = [r for r in self.rounds if r["id"] != round_id]
@@ -203,6 +241,24 @@ class FakeBackend:
             for r in rnd["results"]
         ]
 
+    def rounds_in_order(self) -> list[list[RoundEntry]]:
+        # 本物の queries._entry と同じ形にすること。table_size / kaze を落とすと
+        # 風別成績や連続記録の不具合がテストをすり抜ける。
+        return [
+            [
+                RoundEntry(
+                    player_id=r["player_id"],
+                    rank=r["rank"],
+                    point=r["point"],
+                    tobi=r["tobi"],
+                    table_size=len(rnd["results"]),
+                    kaze=r["kaze"],
+                )
+                for r in rnd["results"]
+            ]
+            for rnd in self.rounds
+        ]
+
 
 def install(monkeypatch, backend: FakeBackend) -> FakeBackend:
     """auth と repo を偽物に差し替える。"""
@@ -226,6 +282,9 @@ def install(monkeypatch, backend: FakeBackend) -> FakeBackend:
     monkeypatch.setattr(groups, "list_invites", lambda gid: [])
 
     monkeypatch.setattr(tournaments, "list_tournaments", lambda gid: backend.tournaments)
+    monkeypatch.setattr(
+        tournaments, "list_tournament_overview", lambda gid: backend.tournament_overview()
+    )
     monkeypatch.setattr(
         tournaments,
         "get_tournament",
@@ -233,6 +292,20 @@ def install(monkeypatch, backend: FakeBackend) -> FakeBackend:
     )
     monkeypatch.setattr(tournaments, "get_ruleset", lambda tid: (backend.rules, []))
     monkeypatch.setattr(tournaments, "list_days", lambda tid: backend.days)
+    monkeypatch.setattr(
+        tournaments,
+        "list_days_with_games",
+        lambda tid: [
+            {
+                **day,
+                "games": [g for g in backend.games if g["day_id"] == day["id"]],
+                "round_count": sum(
+                    g["round_count"] for g in backend.games if g["day_id"] == day["id"]
+                ),
+            }
+            for day in backend.days
+        ],
+    )
     monkeypatch.setattr(
         tournaments, "get_day", lambda did: next((d for d in backend.days if d["id"] == did), None)
     )
@@ -246,29 +319,31 @@ def install(monkeypatch, backend: FakeBackend) -> FakeBackend:
     monkeypatch.setattr(games, "add_round", backend.add_round)
     monkeypatch.setattr(games, "update_round", backend.update_round)
     monkeypatch.setattr(games, "delete_round", backend.delete_round)
+    monkeypatch.setattr(games, "save_rounds", backend.save_rounds)
 
     monkeypatch.setattr(queries, "fetch_entries", lambda scope, value: backend.entries())
-    # 本物の queries._entry と同じ形にすること。table_size / kaze を落とすと
-    # 風別成績や連続記録の不具合がテストをすり抜ける。
     monkeypatch.setattr(
         queries,
-        "fetch_rounds_in_order",
-        lambda scope, value: [
-            [
-                RoundEntry(
-                    player_id=r["player_id"],
-                    rank=r["rank"],
-                    point=r["point"],
-                    tobi=r["tobi"],
-                    table_size=len(rnd["results"]),
-                    kaze=r["kaze"],
-                )
-                for r in rnd["results"]
-            ]
-            for rnd in backend.rounds
-        ],
+        "fetch_entry_columns",
+        lambda scope, value: EntryColumns.from_entries(backend.entries()),
+    )
+    monkeypatch.setattr(
+        queries,
+        "fetch_standings",
+        lambda scope, value: tally(backend.entries(), backend.rules.player_count),
+    )
+    monkeypatch.setattr(
+        queries, "fetch_rounds_in_order", lambda scope, value: backend.rounds_in_order()
+    )
+    monkeypatch.setattr(
+        queries, "fetch_profiles", lambda scope, value: profiles(backend.rounds_in_order())
     )
     monkeypatch.setattr(queries, "count_rounds", lambda scope, value: len(backend.rounds))
+    monkeypatch.setattr(
+        queries,
+        "fetch_entries_with_count",
+        lambda scope, value: (backend.entries(), len(backend.rounds)),
+    )
     monkeypatch.setattr(
         queries, "fetch_stored_rounds_for_recalc", lambda tid: backend.stored_for_recalc()
     )
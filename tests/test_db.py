@@ -0,0 +1,170 @@
+"""セッションごとのクライアントと、プロセスで共有する接続プール。
+
+接続プールは共有しても、JWT と Cookie はセッションの間で混ざらないこと。
+通信は httpx.MockTransport で受け、実際に送られたヘッダを調べる。
+"""
+
+from __future__ import annotations
+
+import json
+
+import httpx
+import pytest
+
+from mahjong import db
+
+URL = "https://example.supabase.co"
+KEY = "sb_publishable_test"
+
+
+class Recorder:
+    """Supabase の代わりに応答し、受け取ったリクエストを覚える。"""
+
+    def __init__(self):
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path == "/auth/v1/token":
+            email = json.loads(request.content)["email"]
+            return httpx.Response(
+                200,
+                json=_session(token=f"jwt-of-{email}", email=email),
+                # 共有の接続プールがこれを覚えると、次の訪問者に載ってしまう
+                headers={"set-cookie": f"sb-session={email}; Path=/"},
+            )
+        return httpx.Response(200, json=[])
+
+    def rest(self) -> list[httpx.Request]:
+        return [r for r in self.requests if r.url.path.startswith("/rest/v1/")]
+
+
+def _session(token: str, email: str) -> dict:
+    user = {
+        "id": f"id-{email}",
+        "aud": "authenticated",
+        "email": email,
+        "app_metadata": {},
+        "user_metadata": {},
+        "created_at": "2026-01-01T00:00:00Z",
+    }
+    return {
+        "access_token": token,
+        "refresh_token": f"refresh-{email}",
+        "token_type": "bearer",
+        "expires_in": 3600,
+        "expires_at": 4_000_000_000,
+        "user": user,
+    }
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setenv(db.ENV_URL, URL)
+    monkeypatch.setenv(db.ENV_KEY, KEY)
+    monkeypatch.setattr(db, "_transport", lambda: httpx.MockTransport(recorder))
+    monkeypatch.setattr(db, "_http", None)
+    yield recorder
+    if db._http is not None:
+        db._http.shutdown()
+
+
+def test_sessions_share_one_connection_pool(recorder):
+    a, b = db._new_client(), db._new_client()
+
+    assert a is not b
+    assert a.postgrest.session is b.postgrest.session is db._shared_http()
+    assert a.auth._http_client is db._shared_http()
+
+
+def test_tokens_never_cross_sessions(recorder):
+    a, b, guest = db._new_client(), db._new_client(), db._new_client()
+    a.auth.sign_in_with_password({"email": "a@example.com", "password": "x"})
+    b.auth.sign_in_with_password({"email": "b@example.com", "password": "x"})
+
+    for client in (a, b, guest):
+        client.table("players").select("*").execute()
+
+    sent = [r.headers.get("authorization") for r in recorder.rest()]
+    assert sent == [
+        "Bearer jwt-of-a@example.com",
+        "Bearer jwt-of-b@example.com",
+        f"Bearer {KEY}",  # ログインしていない訪問者は publishable key のまま
+    ]
+    assert all("cookie" not in r.headers for r in recorder.requests)
+
+
+def test_sign_out_does_not_affect_other_sessions(recorder):
+    a, b = db._new_client(), db._new_client()
+    a.auth.sign_in_with_password({"email": "a@example.com", "password": "x"})
+    b.auth.sign_in_with_password({"email": "b@example.com", "password": "x"})
+
+    b.auth.sign_out()
+    a.table("players").select("*").execute()
+
+    assert recorder.rest()[-1].headers["authorization"] == "Bearer jwt-of-a@example.com"
+
+
+def test_closing_one_client_keeps_the_pool_open(recorder):
+    a, b = db._new_client(), db._new_client()
+
+    a.postgrest.aclose()
+    b.table("players").select("*").execute()
+
+    assert not db._shared_http().is_closed
+    assert len(recorder.rest()) == 1
+
+
+def test_client_builds_only_what_it_uses(recorder):
+    client = db._new_client()
+
+    assert client._postgrest is None  # 最初の読み書きまで作らない
+    assert not hasattr(client, "realtime")
+    client.table("players").select("*").execute()
+    assert client._postgrest is not None
+    assert client._storage is None and client._functions is None
+
+
+def test_sign_in_rebuilds_postgrest_with_the_new_token(recorder):
+    client = db._new_client()
+    before = client.postgrest
+
+    client.auth.sign_in_with_password({"email": "a@example.com", "password": "x"})
+
+    assert client.postgrest is not before
+    assert client.postgrest.headers["authorization"] == "Bearer jwt-of-a@example.com"
+
+
+def test_first_visit_shows_the_login_form_without_a_client(recorder, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    from mahjong import auth
+
+    # AppTest の st.context.cookies は MagicMock を返すので、Cookie 無しを明示する
+    monkeypatch.setattr(auth, "_read_token", lambda: None)
+
+    def page():
+        from mahjong import auth
+
+        auth.require_login()
+
+    app = AppTest.from_function(page, default_timeout=10).run()
+
+    assert not app.exception
+    assert app.text_input  # ログイン画面が出ている
+    assert db.SESSION_CLIENT_KEY not in app.session_state
+    assert recorder.requests == []
+
+
+def test_request_timeout_applies_only_inside_the_block(recorder):
+    client = db._new_client()
+
+    with db.request_timeout(2.5):
+        client.table("players").select("*").execute()
+    client.table("players").select("*").execute()
+
+    inside, outside = recorder.rest()
+    assert inside.extensions["timeout"]["read"] == 2.5
+    assert inside.extensions["timeout"]["connect"] == 2.5
+    assert outside.extensions["timeout"]["read"] == db.HTTP_TIMEOUT
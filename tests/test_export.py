@@ -0,0 +1,119 @@
+"""記録の書き出し（mahjong.export）のテスト。
+
+サーバーからの読み取り（queries.stream_*）を手元の行に差し替え、
+形式ごとに読み戻せることと、1ページ読むごとに少しずつ返すことを押さえる。
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Iterator
+
+import pytest
+
+from mahjong import export
+from mahjong.errors import AppError
+from mahjong.repo import queries
+
+TOURNAMENT = {"id": "t1", "name": "春", "ruleset": {"uma": [10, 5, -5, -10]}, "note": None,
+              "created_at": "2024-04-01T00:00:00+00:00", "group_id": "g1"}
+
+
+def entry(i: int) -> dict[str, Any]:
+    return {
+        "group_id": "g1", "tournament_id": "t1", "day_id": "d1", "held_on": "2024-05-01",
+        "game_id": "x", "game_name": "卓1", "round_id": f"r{i // 4:03d}",
+        "round_created_at": f"2024-05-01T10:{i // 4:02d}:00+00:00", "seat": i % 4,
+        "player_id": f"p{i % 4}", "raw_score": 25000, "point": 0, "rank": i % 4 + 1,
+        "kaze": "東南西北"[i % 4], "tobi": i % 4 == 3,
+    }
+
+
+@pytest.fixture
+def reads(monkeypatch) -> list[str]:
+    """読み取りの記録。1ページ（PAGE_SIZE 行）を返すたびに1つ増える。"""
+    monkeypatch.setattr(queries, "PAGE_SIZE", 8)
+    log: list[str] = []
+
+    def stream_entry_rows(scope, value, profile="display", page_size=None) -> Iterator[dict]:
+        assert (scope, value, profile) == ("group_id", "g1", "export")
+        for start in range(0, 20, queries.PAGE_SIZE):
+            log.append("v_round_entries")
+            yield from (entry(i) for i in range(start, min(start + queries.PAGE_SIZE, 20)))
+
+    def stream_group_rows(table, columns, group_id, active_only=False, page_size=None):
+        log.append(table)
+        return iter([TOURNAMENT] if table == "tournaments" else [])
+
+    monkeypatch.setattr(queries, "stream_entry_rows", stream_entry_rows)
+    monkeypatch.setattr(queries, "stream_group_rows", stream_group_rows)
+    return log
+
+
+def test_csv_has_one_line_per_seat(reads):
+    text = export.export_bytes("g1", "rounds", "csv").decode("utf-8")
+
+    found = list(csv.DictReader(io.StringIO(text)))
+    assert len(found) == 20
+    assert list(found[0]) == [name for name, _ in export.DATASETS["rounds"].columns]
+    assert "group_id" not in found[0]
+    assert (found[3]["kaze"], found[3]["tobi"]) == ("北", "True")
+
+
+def test_ndjson_keeps_types_and_rules_become_text(reads):
+    lines = export.export_bytes("g1", "tournaments", "ndjson").decode("utf-8").splitlines()
+
+    (row,) = map(json.loads, lines)
+    assert row["name"] == "春" and json.loads(row["ruleset"]) == TOURNAMENT["ruleset"]
+    assert "group_id" not in row
+
+
+def test_parquet_reads_back_with_its_types(reads):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(export.export_bytes("g1", "rounds", "parquet")))
+
+    assert table.num_rows == 20
+    assert str(table.schema.field("raw_score").type) == "int64"
+    assert table.column("tobi").to_pylist()[:4] == [False, False, False, True]
+
+
+@pytest.mark.parametrize("fmt", list(export.FORMATS))
+def test_each_page_is_encoded_as_it_arrives(reads, fmt):
+    chunks = export.iter_export("g1", "rounds", fmt)
+    assert reads == []  # 読み始めるまで通信しない
+
+    next(chunks)
+    assert reads == ["v_round_entries"]
+    assert len(list(chunks)) >= 2
+
+
+def test_empty_table_still_has_a_header(reads):
+    assert export.export_bytes("g1", "players", "csv").decode("utf-8").startswith("id,name,")
+
+
+def test_file_is_replaced_only_when_complete(reads, tmp_path, monkeypatch):
+    path = tmp_path / export.file_name("rounds", "csv")
+    path.write_text("前回の書き出し", encoding="utf-8")
+
+    def broken(group_id):
+        yield entry(0)
+        raise AppError("つながりません")
+
+    monkeypatch.setitem(
+        export.DATASETS, "rounds", export.Dataset("半荘の結果", export._ROUND_COLUMNS, broken)
+    )
+    with pytest.raises(AppError):
+        export.write_file("g1", "rounds", "csv", path)
+
+    assert path.read_text(encoding="utf-8") == "前回の書き出し"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_unknown_dataset_or_format_is_refused():
+    with pytest.raises(AppError):
+        export.iter_export("g1", "secrets", "csv")
+    with pytest.raises(AppError):
+        export.iter_export("g1", "rounds", "xlsx")
@@ -0,0 +1,292 @@
+"""過去の記録の取り込み（mahjong.importer）のテスト。
+
+repo の関数を手元の表に差し替え、「何半荘が何回の呼び出しで届いたか」と
+「途中で止めて流し直しても二重にならないか」を押さえる。
+"""
+
+from __future__ import annotations
+
+import io
+import json
+from typing import Any
+
+import pytest
+
+from mahjong import importer
+from mahjong.errors import AppError, NetworkError
+from mahjong.importer import Record, RecordError, iter_rows, parse_record, run_import
+from mahjong.repo import games, groups, tournaments
+from mahjong.rules import PRESETS_3P, PRESETS_4P
+
+HEADER = "held_on,table,player1,score1,player2,score2,player3,score3,player4,score4,dealer"
+
+
+class Store:
+    """取り込みが使う repo の関数だけを真似た、手元の大会1つ。"""
+
+    def __init__(self, rules=PRESETS_4P["ゴットー (5-10)"]):
+        self.rules = rules
+        self.players: dict[str, str] = {"p-東": "東", "p-西": "西"}
+        self.days: dict[str, str] = {}
+        self.games: list[dict[str, Any]] = []
+        # (game_id, client_key) -> 結果
+        self.rounds: dict[tuple[str, str], list[Any]] = {}
+        self.calls: list[str] = []
+        self.fail_after: int | None = None
+
+    def install(self, monkeypatch) -> "Store":
+        monkeypatch.setattr(tournaments, "get_tournament", lambda tid: {"id": tid, "group_id": "g"})
+        monkeypatch.setattr(tournaments, "get_ruleset", lambda tid: (self.rules, []))
+        monkeypatch.setattr(tournaments, "list_days", self.list_days)
+        monkeypatch.setattr(tournaments, "create_day", self.create_day)
+        monkeypatch.setattr(groups, "list_players", self.list_players)
+        monkeypatch.setattr(groups, "create_player", self.create_player)
+        monkeypatch.setattr(games, "list_games", self.list_games)
+        monkeypatch.setattr(games, "create_game", self.create_game)
+        monkeypatch.setattr(games, "get_game", self.get_game)
+        monkeypatch.setattr(games, "save_rounds", self.save_rounds)
+        return self
+
+    def list_days(self, tournament_id):
+        self.calls.append("list_days")
+        return [{"id": day_id, "held_on": held_on} for held_on, day_id in self.days.items()]
+
+    def create_day(self, tournament_id, group_id, held_on):
+        self.calls.append("create_day")
+        self.days[held_on] = f"d{len(self.days) + 1}"
+        return self.days[held_on]
+
+    def list_players(self, group_id):
+        self.calls.append("list_players")
+        return [{"id": pid, "name": name} for pid, name in self.players.items()]
+
+    def create_player(self, group_id, name):
+        self.calls.append("create_player")
+        self.players[f"p-{name}"] = name
+        return f"p-{name}"
+
+    def list_games(self, day_id):
+        self.calls.append("list_games")
+        return [g for g in self.games if g["day_id"] == day_id]
+
+    def create_game(self, day_id, name, seats, player_count):
+        self.calls.append("create_game")
+        game = {
+            "id": f"g{len(self.games) + 1}",
+            "day_id": day_id,
+            "name": name,
+            "seats": [{"seat": i, "player_id": s.player_id} for i, s in enumerate(seats)],
+        }
+        self.games.append(game)
+        return game["id"]
+
+    def get_game(self, game_id):
+        return next(g for g in self.games if g["id"] == game_id)
+
+    def save_rounds(self, game_id, rounds, seat_to_player, client_keys=None):
+        self.calls.append("save_rounds")
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise NetworkError("つながりません")
+            self.fail_after -= 1
+        for (_, results), key in zip(rounds, client_keys):
+            for r in results:
+                assert seat_to_player[r.seat]
+            self.rounds.setdefault((game_id, key), results)
+        return list(client_keys)
+
+
+def row(held_on="2024-05-01", table="A", scores=(40000, 30000, 20000, 10000),
+        names=("東", "南", "西", "北"), dealer="") -> str:
+    cells = [held_on, table]
+    for name, score in zip(names, scores):
+        cells += [name, str(score)]
+    return ",".join(cells + [dealer])
+
+
+def write(tmp_path, lines: list[str], name: str = "old.csv"):
+    path = tmp_path / name
+    path.write_text("\n".join([HEADER, *lines]) + "\n", encoding="utf-8")
+    return path
+
+
+# --- 読み込み ---
+
+
+def test_csv_row_becomes_a_record():
+    record = parse_record(2, {
+        "日付": "2024/5/1", "卓": " A ", "名前1": "東", "点数1": "40,000", "名前2": "南",
+        "点数2": "60000", "東家": "2",
+    })
+
+    assert record == Record(2, "2024-05-01", "A", ("東", "南"), (40000, 60000), dealer=1)
+
+
+def test_three_player_rows_may_leave_the_fourth_seat_blank():
+    record = parse_record(2, {
+        "held_on": "2024-05-01", "player1": "東", "score1": "50000", "player2": "南",
+        "score2": "30000", "player3": "西", "score3": "25000", "player4": "", "score4": "",
+        "dealer": "南",
+    })
+
+    assert record.players == ("東", "南", "西") and record.dealer == 1
+    assert record.table == importer.DEFAULT_TABLE
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        {"held_on": "5/1", "players": ["a", "b"], "scores": [1, 2]},
+        {"held_on": "2024-02-30", "players": ["a", "b"], "scores": [1, 2]},
+        {"held_on": "2024-05-01", "players": ["a", "a"], "scores": [1, 2]},
+        {"held_on": "2024-05-01", "players": ["a", "b"], "scores": [1]},
+        {"held_on": "2024-05-01", "players": ["a", "b"], "scores": [1, "x"]},
+        {"held_on": "2024-05-01", "players": ["a", "b"], "scores": [1, 2], "dealer": "c"},
+        ["not", "an", "object"],
+    ],
+)
+def test_unreadable_rows_are_record_errors(value):
+    with pytest.raises(RecordError):
+        parse_record(1, value)
+
+
+def test_json_array_is_read_one_object_at_a_time(monkeypatch):
+    monkeypatch.setattr(importer, "_READ_CHUNK", 7)  # オブジェクトの途中で読みを切る
+    text = io.StringIO(json.dumps([{"a": i, "b": "東" * i} for i in range(5)], ensure_ascii=False))
+
+    assert [v["a"] for _, v in iter_rows(text, "json")] == [0, 1, 2, 3, 4]
+
+
+def test_broken_json_lines_are_reported_per_line():
+    text = io.StringIO('{"a": 1}\n\n{"a": \n{"a": 3}\n')
+
+    found = list(iter_rows(text, "jsonl"))
+
+    assert [line for line, _ in found] == [1, 3, 4]
+    assert isinstance(found[1][1], RecordError)
+
+
+# --- 取り込み ---
+
+
+def test_rows_are_validated_and_saved_in_one_call_per_table(monkeypatch, tmp_path):
+    store = Store().install(monkeypatch)
+    path = write(tmp_path, [row(), row(scores=(10000, 20000, 30000, 40000)), row(table="B")])
+
+    progress = run_import(path, "t")
+
+    assert (progress.rows, progress.saved, progress.rejected) == (3, 3, 0)
+    assert store.calls.count("save_rounds") == 2  # 卓 A と B で1回ずつ
+    assert store.calls.count("create_day") == 1
+    # 名前の無かった2人は作ってから使う
+    assert store.calls.count("create_player") == 2
+    # 東家を書かなければ、同じ卓の前の半荘の次の人
+    first, second = [r for (gid, _), r in store.rounds.items() if gid == "g1"]
+    assert [r.kaze for r in first] == ["東", "南", "西", "北"]
+    assert [r.kaze for r in second] == ["北", "東", "南", "西"]
+    assert [r.rank for r in second] == [4, 3, 2, 1]
+    assert not importer.checkpoint_path(path).exists()
+
+
+def test_bad_rows_are_rejected_and_the_rest_goes_on(monkeypatch, tmp_path):
+    store = Store().install(monkeypatch)
+    rejected: list[tuple[int, str]] = []
+    path = write(tmp_path, [row(), row(scores=(40000, 30000, 20000, 9000)), row(held_on="x")])
+
+    progress = run_import(path, "t", on_reject=lambda line, reason: rejected.append((line, reason)))
+
+    assert (progress.saved, progress.rejected) == (1, 2)
+    assert [line for line, _ in rejected] == [3, 4]
+    assert len(store.rounds) == 1
+
+
+def test_mismatched_totals_can_be_let_through(monkeypatch, tmp_path):
+    Store().install(monkeypatch)
+    path = write(tmp_path, [row(scores=(40000, 30000, 20000, 9000))])
+
+    assert run_import(path, "t", strict=False).saved == 1
+
+
+def test_unknown_players_can_be_refused(monkeypatch, tmp_path):
+    store = Store().install(monkeypatch)
+    path = write(tmp_path, [row(), row(names=("東", "西", "北", "南"))])
+
+    progress = run_import(path, "t", create_players=False)
+
+    assert progress.rejected == 2
+    assert "create_player" not in store.calls
+
+
+def test_same_table_name_with_other_players_is_a_separate_table(monkeypatch, tmp_path):
+    store = Store().install(monkeypatch)
+    path = write(tmp_path, [row(), row(names=("東", "南", "西", "白"))])
+
+    run_import(path, "t")
+
+    assert [g["name"] for g in store.games] == ["A", "A (2)"]
+
+
+def test_three_player_rules_refuse_four_player_rows(monkeypatch, tmp_path):
+    Store(rules=PRESETS_3P["三人麻雀 ウマなし"]).install(monkeypatch)
+    path = write(tmp_path, [row()])
+
+    assert run_import(path, "t").rejected == 1
+
+
+def test_large_files_are_sent_in_batches(monkeypatch, tmp_path):
+    monkeypatch.setattr(importer, "BATCH_ROUNDS", 10)
+    store = Store().install(monkeypatch)
+    seen: list[int] = []
+    path = write(tmp_path, [row() for _ in range(25)])
+
+    run_import(path, "t", on_progress=lambda p: seen.append(p.saved))
+
+    assert store.calls.count("save_rounds") == 3
+    assert seen == [10, 20, 25]
+    assert len(store.rounds) == 25
+
+
+def test_stopped_import_resumes_without_duplicates(monkeypatch, tmp_path):
+    monkeypatch.setattr(importer, "BATCH_ROUNDS", 10)
+    store = Store().install(monkeypatch)
+    path = write(tmp_path, [row(dealer="") for _ in range(25)])
+
+    store.fail_after = 1
+    with pytest.raises(NetworkError):
+        run_import(path, "t")
+    assert len(store.rounds) == 10
+    assert json.loads(importer.checkpoint_path(path).read_text())["progress"]["rows"] == 10
+
+    store.fail_after = None
+    store.calls.clear()
+    progress = run_import(path, "t")
+
+    assert (progress.skipped, progress.saved) == (10, 25)
+    assert store.calls.count("save_rounds") == 2
+    assert "create_game" not in store.calls  # 前回の卓に足す
+    # 東家の回り方も前回の続きから
+    kazes = [r[0].kaze for r in store.rounds.values()]
+    assert kazes[10] == "西" and kazes[11] == "南"  # 11半荘目の東家は3番目の席
+
+
+def test_running_again_from_the_start_adds_nothing(monkeypatch, tmp_path):
+    store = Store().install(monkeypatch)
+    path = write(tmp_path, [row(), row()])
+
+    run_import(path, "t")
+    run_import(path, "t", restart=True)
+
+    assert len(store.rounds) == 2
+    assert store.calls.count("create_game") == 1
+
+
+def test_checkpoint_of_another_file_is_not_used(monkeypatch, tmp_path):
+    Store().install(monkeypatch)
+    path = write(tmp_path, [row()])
+    importer.checkpoint_path(path).write_text(
+        json.dumps({"tournament_id": "t", "size": 1, "progress": {}, "dealers": {}})
+    )
+
+    with pytest.raises(AppError):
+        run_import(path, "t")
+    assert run_import(path, "t", restart=True).saved == 1
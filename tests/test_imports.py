@@ -0,0 +1,34 @@
+"""起動時の import に重い部品が紛れ込んでいないこと。
+
+時間は機械によって揺れるので、ここでは「何を読んだか」だけを見る。
+時間の予算は `python -m mahjong.bench imports --check` で確かめる。
+"""
+
+from __future__ import annotations
+
+from mahjong import bench
+
+
+def test_targets_cover_every_module_and_view():
+    targets = bench.import_targets()
+
+    assert "mahjong.repo.queries" in targets
+    assert "views/game.py" in targets
+    assert "mahjong.bench" not in targets
+    # numpy そのもの。記録の多い集計で初めて読む
+    assert "mahjong.columnar" not in targets
+
+
+def test_chart_libraries_are_read_after_the_first_paint():
+    statements = bench.import_targets()["views/stats.py"]
+
+    assert "streamlit" in statements
+    assert "pandas" not in statements and "altair" not in statements
+
+
+def test_startup_does_not_load_heavy_modules():
+    statements = "\n".join(bench.import_targets().values())
+
+    _, heavy = bench.measure_import(statements, repeat=1)
+
+    assert heavy == ()
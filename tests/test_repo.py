@@ -0,0 +1,1720 @@
+"""データアクセス層のテスト。Supabase には繋がず、クライアントを記録用の偽物に差し替える。
+
+画面テスト（test_views.py）は repo の関数ごと差し替えるので、
+「何回通信したか」「書き込みのあとに古い値を返さないか」はここで押さえる。
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import pytest
+
+from mahjong import repo
+from mahjong.repo import _base, _cache, _retry, games, groups, outbox, queries, tournaments
+from mahjong.rules import PRESETS_3P, PRESETS_4P
+from mahjong.stats import aggregate, from_tallies, round_count
+
+
+class FakeQuery:
+    """PostgREST のクエリビルダの形だけ真似たもの。execute() で応答を返す。"""
+
+    def __init__(self, client: "FakeClient", target: str, kind: str = "table"):
+        self.client = client
+        self.target = target
+        self.kind = kind
+        self.ops: list[tuple[str, tuple[Any, ...]]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., "FakeQuery"]:
+        def chain(*args: Any, **kwargs: Any) -> "FakeQuery":
+            self.ops.append((name, args))
+            return self
+
+        return chain
+
+    def execute(self) -> SimpleNamespace:
+        self.client.sent.append(self)
+        return SimpleNamespace(data=self.client.respond(self))
+
+
+class FakeClient:
+    def __init__(self, respond: Callable[[FakeQuery], Any] | None = None):
+        self.sent: list[FakeQuery] = []
+        self.respond = respond or (lambda query: [])
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict[str, Any]) -> FakeQuery:
+        query = FakeQuery(self, name, kind="rpc")
+        query.ops.append(("params", (params,)))
+        return query
+
+    def sent_to(self, target: str) -> list[FakeQuery]:
+        return [q for q in self.sent if q.target == target]
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    """共有キャッシュはプロセス全体で1つなので、テストごとに空にする。"""
+    _cache.clear()
+    yield
+    _cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh_retry(monkeypatch):
+    """再試行の予算と所要時間の記録もプロセスで1つ。待ち時間は飛ばす。"""
+    _retry.reset()
+    monkeypatch.setattr(_retry, "_sleep", lambda seconds: None)
+    yield
+    _retry.reset()
+
+
+@pytest.fixture
+def state(monkeypatch) -> dict[str, Any]:
+    """Streamlit の session_state の代わり。あるとメモが有効になる。"""
+    store: dict[str, Any] = {}
+    monkeypatch.setattr(_base, "_session_state", lambda: store)
+    return store
+
+
+def install(monkeypatch, respond: Callable[[FakeQuery], Any] | None = None) -> FakeClient:
+    fake = FakeClient(respond)
+    monkeypatch.setattr(_base, "get_client", lambda: fake)
+    return fake
+
+
+TOURNAMENT = {"id": "t1", "group_id": "g1", "name": "春", "ruleset": {}, "note": None,
+              "created_by": None, "created_at": "2026-04-01T00:00:00+00:00"}
+
+
+# --- 再実行内の読み取りメモ -------------------------------------------------
+
+
+def test_get_ruleset_reuses_the_tournament_read(monkeypatch, state):
+    """開催日の画面は get_tournament と get_ruleset を続けて呼ぶ。2回目は通信しない。"""
+    fake = install(monkeypatch, lambda q: [TOURNAMENT])
+
+    assert tournaments.get_tournament("t1")["name"] == "春"
+    tournaments.get_ruleset("t1")
+
+    assert len(fake.sent_to("tournaments")) == 1
+
+
+def test_entries_and_rounds_share_one_fetch(monkeypatch, state):
+    """成績画面の fetch_entries と fetch_rounds_in_order は同じビューを同じ条件で引く。"""
+    row = {"round_id": "r1", "game_id": "x", "round_created_at": "2026-04-01", "player_id": "a",
+           "seat": 0, "raw_score": 40000, "point": 30, "rank": 1, "kaze": "東", "tobi": False,
+           "table_size": 4}
+    fake = install(monkeypatch, lambda q: [row] if q.target == "v_round_entries" else [])
+
+    queries.fetch_entries("group_id", "g1")
+    queries.fetch_rounds_in_order("group_id", "g1")
+    queries.fetch_entries_with_count("group_id", "g1")
+
+    assert len(fake.sent_to("v_round_entries")) == 1
+
+
+def test_profiles_are_built_once_per_scope(monkeypatch, state):
+    """個人成績でプレイヤーを切り替えても、全員分の掘り下げは作り直さない。"""
+    built = []
+    monkeypatch.setattr(queries, "profiles", lambda rounds: built.append(rounds) or {"a": "A"})
+    fake = install(monkeypatch, lambda q: [dict(ENTRY)] if q.target == "v_round_entries" else [])
+
+    assert queries.fetch_profiles("group_id", "g1")["a"] == "A"
+    queries.fetch_profiles("group_id", "g1")
+    queries.fetch_rounds_in_order("group_id", "g1")
+
+    assert len(built) == 1
+    assert len(fake.sent_to("v_round_entries")) == 1
+
+
+def test_different_scopes_are_not_confused(monkeypatch, state):
+    fake = install(monkeypatch)
+    queries.fetch_entries("group_id", "g1")
+    queries.fetch_entries("tournament_id", "g1")
+    queries.fetch_entries("group_id", "g2")
+    assert len(fake.sent_to("v_round_entries")) == 3
+
+
+def test_write_clears_the_memo(monkeypatch, state):
+    """保存した直後の読み取りが、保存前の値を返してはいけない。"""
+    fake = install(monkeypatch, lambda q: [TOURNAMENT] if q.target == "tournaments" else None)
+
+    tournaments.get_tournament("t1")
+    tournaments.update_tournament("t1", name="夏")
+    tournaments.get_tournament("t1")
+
+    assert len(fake.sent_to("tournaments")) == 3  # 読む・書く・読み直す
+
+
+def test_failed_write_also_clears_the_memo(monkeypatch, state):
+    """応答だけ届かなかった書き込みもありうるので、失敗しても捨てる。"""
+
+    def respond(query: FakeQuery):
+        if query.kind == "rpc":
+            raise ConnectionError("切れた")
+        return []
+
+    fake = install(monkeypatch, respond)
+    games.list_rounds("x")
+    with pytest.raises(_base.AppError):
+        games.add_round("x", [], {})
+    games.list_rounds("x")
+
+    assert len(fake.sent_to("v_round_entries")) == 2
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        lambda: games.rename_game("x", "卓2"),
+        lambda: games.delete_game("x"),
+        lambda: groups.rename_player("p", "たろう"),
+        lambda: groups.create_player("g1", "じろう"),
+        lambda: tournaments.delete_day("d1"),
+    ],
+)
+def test_every_write_module_clears_the_memo(monkeypatch, state, write):
+    install(monkeypatch, lambda q: [{"id": "new"}])
+    groups.list_my_groups()
+    assert _base._MEMO_KEY in state
+    write()
+    assert _base._MEMO_KEY not in state
+
+
+def test_begin_run_drops_the_previous_run(monkeypatch, state):
+    """他の人の書き込みは次の再実行で見えてほしい。"""
+    fake = install(monkeypatch)
+    groups.list_my_groups()
+    _base.begin_run()
+    groups.list_my_groups()
+    assert len(fake.sent_to("v_my_groups")) == 2
+
+
+def test_failed_read_is_not_memoized(monkeypatch, state):
+    calls = {"n": 0}
+
+    def respond(query: FakeQuery):
+        calls["n"] += 1
+        if calls["n"] <= _retry.MAX_ATTEMPTS:
+            raise ConnectionError("切れた")
+        return []
+
+    install(monkeypatch, respond)
+    with pytest.raises(_base.AppError):
+        groups.list_my_groups()
+    assert groups.list_my_groups() == []
+
+
+def test_memo_is_off_outside_streamlit(monkeypatch):
+    """CLI・テストでは実行の区切りが無いので使い回さない。"""
+    monkeypatch.setattr(_base, "_session_state", lambda: None)
+    fake = install(monkeypatch)
+    groups.list_my_groups()
+    groups.list_my_groups()
+    assert len(fake.sent_to("v_my_groups")) == 2
+
+
+# --- セッションをまたぐ共有キャッシュ ---------------------------------------
+
+ENTRY = {"group_id": "g1", "tournament_id": "t1", "day_id": "d1", "game_id": "x",
+         "round_id": "r1", "round_created_at": "2026-04-01", "player_id": "a", "seat": 0,
+         "raw_score": 40000, "point": 30, "rank": 1, "kaze": "東", "tobi": False,
+         "table_size": 4}
+
+SEAT = {"game_id": "x", "group_id": "g1", "tournament_id": "t1", "day_id": "d1",
+        "held_on": "2026-04-01", "game_name": "卓1", "game_created_at": "2026-04-01",
+        "seat": 0, "player_id": "a", "player_name": "たろう", "user_id": None,
+        "total_point": 30, "round_count": 1}
+
+
+def game_state(round_id: str = "r1") -> dict[str, Any]:
+    """*_returning_state（migrations/011）の応答。卓 x に半荘が1つ。"""
+    return {"seats": [SEAT], "entries": [ENTRY], "tournament": TOURNAMENT, "round_id": round_id,
+            "round_ids": [round_id]}
+
+
+def member_of(*group_ids: str) -> Callable[[FakeQuery], Any]:
+    """v_my_groups にはその所属を、成績ビューには ENTRY を返す応答。"""
+
+    def respond(query: FakeQuery):
+        if query.target == "v_my_groups":
+            return [{"group_id": g} for g in group_ids]
+        if query.target == "v_round_entries":
+            return [dict(ENTRY)]
+        return []
+
+    return respond
+
+
+def browser(monkeypatch, respond: Callable[[FakeQuery], Any]) -> FakeClient:
+    """別のブラウザセッションに切り替える。session_state もクライアントも別物になる。"""
+    store: dict[str, Any] = {}
+    monkeypatch.setattr(_base, "_session_state", lambda: store)
+    return install(monkeypatch, respond)
+
+
+def test_members_share_one_read(monkeypatch):
+    """同じグループの2人目以降は、成績ビューを取り直さない。"""
+    first = browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+    second = browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+
+    assert len(first.sent_to("v_round_entries")) == 1
+    assert len(second.sent_to("v_round_entries")) == 0
+    assert _cache.stats().hits == 1
+
+
+def test_non_member_is_never_served_from_the_cache(monkeypatch):
+    """別グループの人は、自分の JWT で読む（RLS が 0 件を返す）。"""
+    browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+    outsider = browser(monkeypatch, member_of("g2"))
+    outsider.respond = lambda q: [{"group_id": "g2"}] if q.target == "v_my_groups" else []
+
+    assert queries.fetch_entries("group_id", "g1") == []
+    assert len(outsider.sent_to("v_round_entries")) == 1
+    assert _cache.stats().bypassed == 1
+
+
+def test_narrower_scopes_use_the_learned_group(monkeypatch):
+    """大会・卓で絞る読み取りも、行の group_id から所属を覚えて共有する。"""
+    browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")  # ここで t1 / x が g1 のものと分かる
+    queries.fetch_entries("tournament_id", "t1")
+    games.list_rounds("x")
+    other = browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("tournament_id", "t1")
+    games.list_rounds("x")
+
+    assert len(other.sent_to("v_round_entries")) == 0
+
+
+def test_unknown_scope_goes_direct(monkeypatch):
+    """所属の分からない ID では、キャッシュを使わない（申告された group は信じない）。"""
+    fake = browser(monkeypatch, member_of("g1"))
+    fake.respond = lambda q: [{"group_id": "g1"}] if q.target == "v_my_groups" else []
+    queries.fetch_entries("tournament_id", "t-unknown")
+    browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("tournament_id", "t-unknown")
+
+    assert _cache.stats().hits == 0
+    assert _cache.stats().entries == 0
+
+
+def test_write_invalidates_only_that_group(monkeypatch):
+    def respond(query: FakeQuery):
+        if query.target == "v_my_groups":
+            return [{"group_id": "g1"}, {"group_id": "g2"}]
+        if query.target == "v_round_entries":
+            value = query.ops[1][1][1]  # .eq(scope, value)
+            return [{**ENTRY, "group_id": value, "round_id": f"r-{value}"}]
+        if query.kind == "rpc":
+            return game_state()
+        return None
+
+    browser(monkeypatch, respond)
+    queries.fetch_entries("group_id", "g1")
+    queries.fetch_entries("group_id", "g2")
+    games.delete_round("r-g1")
+    writer_after = browser(monkeypatch, respond)
+    queries.fetch_entries("group_id", "g1")
+    queries.fetch_entries("group_id", "g2")
+
+    assert len(writer_after.sent_to("v_round_entries")) == 1  # g1 だけ読み直す
+
+
+def test_write_to_an_unknown_id_expires_everything(monkeypatch):
+    browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+    groups.revoke_invite("inv-1")
+    after = browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+    assert len(after.sent_to("v_round_entries")) == 1
+
+
+def test_entries_expire(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(_cache, "_now", lambda: clock["now"])
+    browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+    clock["now"] += _cache.TTL_SECONDS + 1
+    late = browser(monkeypatch, member_of("g1"))
+    queries.fetch_entries("group_id", "g1")
+
+    assert len(late.sent_to("v_round_entries")) == 1
+
+
+def test_least_recently_used_is_evicted(monkeypatch):
+    monkeypatch.setattr(_cache, "MAX_ENTRIES", 2)
+    _cache.learn({"group_id": "g1"})
+    for key in ("a", "b", "a", "c"):  # b が一番使われていない
+        _cache.shared("g1", key, lambda: [], lambda g: True)
+
+    assert _cache.stats().evictions == 1
+    loads = []
+    _cache.shared("g1", "a", lambda: loads.append("a") or [], lambda g: True)
+    _cache.shared("g1", "b", lambda: loads.append("b") or [], lambda g: True)
+    assert loads == ["b"]
+
+
+def test_returned_rows_are_private_copies(monkeypatch):
+    """ある人の画面が行を書き換えても、他の人の分は変わらない。"""
+    _cache.learn({"group_id": "g1"})
+    first = _cache.shared("g1", "k", lambda: [{"name": "春"}], lambda g: True)
+    first[0]["name"] = "書き換え"
+    second = _cache.shared("g1", "k", lambda: [], lambda g: True)
+    assert second == [{"name": "春"}]
+
+
+def test_concurrent_identical_reads_are_coalesced():
+    """読み込み中に同じ読み取りが来たら、通信せずにその結果を待つ。"""
+    _cache.learn({"group_id": "g1"})
+    release = threading.Event()
+    calls: list[str] = []
+
+    def slow_load():
+        calls.append("load")
+        release.wait(5)
+        return [{"v": 1}]
+
+    results: list[Any] = []
+    leader = threading.Thread(
+        target=lambda: results.append(_cache.shared("g1", "k", slow_load, lambda g: True))
+    )
+    leader.start()
+    while not calls:
+        pass
+    follower = threading.Thread(
+        target=lambda: results.append(_cache.shared("g1", "k", slow_load, lambda g: True))
+    )
+    follower.start()
+    time.sleep(0.1)  # 追いつけなかった場合もヒット扱いになるだけで、通信は増えない
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert calls == ["load"]
+    assert results == [[{"v": 1}], [{"v": 1}]]
+
+
+def test_follower_reloads_when_the_leader_fails():
+    """他のセッションの失敗（期限切れ JWT など）を、自分の失敗として受け取らない。"""
+    _cache.learn({"group_id": "g1"})
+    flight = _cache._Flight()
+    _cache._flights[("g1", "k")] = flight
+    flight.done.set()  # 先行した読み込みが ok=False のまま終わった
+
+    assert _cache.shared("g1", "k", lambda: ["自分の結果"], lambda g: True) == ["自分の結果"]
+    _cache._flights.clear()
+
+
+def test_read_racing_a_write_is_not_stored():
+    """読み込み中に書き込みがあったら、その結果は保存しない（古い値が30秒残るのを防ぐ）。"""
+    _cache.learn({"group_id": "g1", "game_id": "x"})
+
+    def load():
+        _cache.invalidate("x")
+        return ["書き込み前"]
+
+    _cache.shared("g1", "k", load, lambda g: True)
+    assert _cache.stats().entries == 0
+
+
+# --- グループの版数 ---------------------------------------------------------
+
+
+class MissingTable(Exception):
+    """PostgREST の「テーブルが無い」（004 未適用）。"""
+
+    code = "PGRST205"
+
+
+def versioned(revision: dict[str, Any], feed: Any = MissingTable) -> Callable[[FakeQuery], Any]:
+    """member_of("g1") に、group_revisions（revision["g1"]）と round_changes（feed）を足したもの。"""
+    base = member_of("g1")
+
+    def respond(query: FakeQuery):
+        if query.target == "group_revisions":
+            if revision.get("g1") is MissingTable:
+                raise MissingTable("relation not found")
+            return [{"revision": revision["g1"]}] if "g1" in revision else []
+        if query.target == "round_changes":
+            if feed is MissingTable:
+                raise MissingTable("relation not found")
+            return feed
+        return base(query)
+
+    return respond
+
+
+def test_unchanged_revision_skips_the_download_even_after_ttl(monkeypatch):
+    """ウィジェット操作だけの再実行は、版数の1行だけで済む。"""
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(_cache, "_now", lambda: clock["now"])
+    revision = {"g1": 7}
+    browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+    clock["now"] += _cache.TTL_SECONDS * 10
+    later = browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+
+    assert len(later.sent_to("v_round_entries")) == 0
+    assert len(later.sent_to("group_revisions")) == 1
+
+
+def test_moved_revision_without_feed_refetches_within_ttl(monkeypatch):
+    """別プロセス（別のサーバーや SQL Editor）からの変更も、次の再実行で見える。"""
+    revision = {"g1": 7}
+    browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+    revision["g1"] = 8
+    later = browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+
+    assert len(later.sent_to("v_round_entries")) == 1
+
+
+def test_revision_is_read_once_per_run(monkeypatch):
+    fake = browser(monkeypatch, versioned({"g1": 1}))
+    queries.fetch_entries("group_id", "g1")
+    groups.list_players("g1")
+    tournaments.list_tournaments("g1")
+
+    assert len(fake.sent_to("group_revisions")) == 1
+
+
+def test_missing_revision_table_falls_back_to_ttl(monkeypatch):
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(_cache, "_now", lambda: clock["now"])
+    revision: dict[str, Any] = {"g1": MissingTable}
+    browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+    soon = browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+    clock["now"] += _cache.TTL_SECONDS + 1
+    late = browser(monkeypatch, versioned(revision))
+    queries.fetch_entries("group_id", "g1")
+
+    assert len(soon.sent_to("v_round_entries")) == 0
+    assert len(late.sent_to("v_round_entries")) == 1
+
+
+def test_get_revision_reports_missing_as_none(monkeypatch, state):
+    install(monkeypatch, versioned({"g1": MissingTable}))
+    assert groups.get_revision("g1") is None
+    install(monkeypatch, versioned({}))
+    _base.begin_run()
+    assert groups.get_revision("g1") is None
+    install(monkeypatch, versioned({"g1": 3}))
+    _base.begin_run()
+    assert groups.get_revision("g1") == 3
+
+
+# --- 変更フィードによる差分同期 ---------------------------------------------
+
+
+def entry_row(round_id: str, created: str, seat: int = 0, point: int = 30) -> dict[str, Any]:
+    return {**ENTRY, "round_id": round_id, "round_created_at": created, "seat": seat,
+            "player_id": f"p{seat}", "point": point}
+
+
+class History:
+    """v_round_entries の中身と、変更フィードを持つ偽の DB。"""
+
+    def __init__(self, entries: list[dict[str, Any]]):
+        self.entries = entries
+        self.revision = 1
+        self.feed: list[dict[str, Any]] = []
+        self.pruned = 0
+
+    def change(self, op: str, round_id: str | None = None) -> None:
+        self.revision += 1
+        self.feed.append(
+            {"id": len(self.feed) + 1, "revision": self.revision, "op": op, "round_id": round_id}
+        )
+
+    def prune(self, through: int) -> None:
+        """版数 through までのフィードを消す（005 のトリガの掃除）。"""
+        self.feed = [c for c in self.feed if c["revision"] > through]
+        self.pruned = max(self.pruned, through)
+
+    def respond(self, query: FakeQuery):
+        if query.target == "v_my_groups":
+            return [{"group_id": "g1"}]
+        if query.target == "group_revisions":
+            return [{"revision": self.revision}]
+        if query.target == "round_changes_pruned":
+            return [{"revision": self.pruned}] if self.pruned else []
+        if query.target == "round_changes":
+            ops = dict(query.ops)
+            found = [c for c in self.feed if c["revision"] > ops["gt"][1]]
+            if "or_" in ops:  # (revision, id) のキーセット
+                import re
+
+                after = re.fullmatch(r"revision\.gt\.(\d+),and\(.*,id\.gt\.(\d+)\)", ops["or_"][0])
+                key = (int(after[1]), int(after[2]))
+                found = [c for c in found if (c["revision"], c["id"]) > key]
+            # max-rows は queries.PAGE_SIZE と同じ
+            return found[: min(ops.get("limit", (queries.PAGE_SIZE,))[0], queries.PAGE_SIZE)]
+        if query.target == "v_round_entries":
+            wanted = dict(query.ops).get("in_")
+            found = [dict(e) for e in self.entries]
+            if wanted:
+                found = [e for e in found if e["round_id"] in wanted[1]]
+            return found
+        return []
+
+    def delta_reads(self, fake: FakeClient) -> int:
+        return sum("in_" in dict(q.ops) for q in fake.sent_to("v_round_entries"))
+
+    def full_reads(self, fake: FakeClient) -> int:
+        return sum("in_" not in dict(q.ops) for q in fake.sent_to("v_round_entries"))
+
+
+def sync(monkeypatch, db: History) -> tuple[FakeClient, list[dict[str, Any]]]:
+    """新しいブラウザセッションでグループ通算を読む。"""
+    fake = browser(monkeypatch, db.respond)
+    return fake, queries.entry_rows("group_id", "g1")
+
+
+def test_new_round_is_fetched_alone(monkeypatch):
+    """半荘が1つ増えたら、その半荘だけを取り直して写しに足す。"""
+    db = History([entry_row("r1", "2026-04-01T10:00"), entry_row("r1", "2026-04-01T10:00", 1)])
+    sync(monkeypatch, db)
+    db.entries += [entry_row("r2", "2026-04-01T11:00"), entry_row("r2", "2026-04-01T11:00", 1)]
+    db.change("round", "r2")
+
+    fake, found = sync(monkeypatch, db)
+
+    assert db.full_reads(fake) == 0 and db.delta_reads(fake) == 1
+    assert [(r["round_id"], r["seat"]) for r in found] == [
+        ("r1", 0), ("r1", 1), ("r2", 0), ("r2", 1)
+    ]
+    assert _cache.stats().patched == 1
+
+
+def test_edited_old_round_is_replaced(monkeypatch):
+    """update_round は作成日時を変えないので、日時の目印では拾えない。"""
+    db = History([entry_row("r1", "2026-04-01T10:00"), entry_row("r2", "2026-04-01T11:00")])
+    sync(monkeypatch, db)
+    db.entries[0] = entry_row("r1", "2026-04-01T10:00", point=-12)
+    db.change("round", "r1")
+
+    _, found = sync(monkeypatch, db)
+
+    assert [(r["round_id"], r["point"]) for r in found] == [("r1", -12), ("r2", 30)]
+
+
+def test_deleted_round_is_dropped(monkeypatch):
+    db = History([entry_row("r1", "2026-04-01T10:00"), entry_row("r2", "2026-04-01T11:00")])
+    sync(monkeypatch, db)
+    del db.entries[0]  # 論理削除でビューから消える
+    db.change("round", "r1")
+
+    _, found = sync(monkeypatch, db)
+
+    assert [r["round_id"] for r in found] == ["r2"]
+
+
+def test_reset_falls_back_to_a_full_read(monkeypatch):
+    """卓の改名などは半荘をまたいで見え方が変わるので、全部読み直す。"""
+    db = History([entry_row("r1", "2026-04-01T10:00")])
+    sync(monkeypatch, db)
+    db.entries[0]["game_name"] = "改名"
+    db.change("reset")
+
+    fake, found = sync(monkeypatch, db)
+
+    assert db.full_reads(fake) == 1 and db.delta_reads(fake) == 0
+    assert found[0]["game_name"] == "改名"
+
+
+def test_copy_older_than_the_pruned_feed_is_read_again(monkeypatch):
+    """掃除で消えた変更は差分で当てられない。残りのフィードだけ当てると取りこぼす。"""
+    db = History([entry_row("r1", "2026-04-01T10:00")])
+    sync(monkeypatch, db)
+    db.entries[0] = entry_row("r1", "2026-04-01T10:00", point=-12)
+    db.change("round", "r1")
+    db.entries.append(entry_row("r2", "2026-04-01T11:00"))
+    db.change("round", "r2")
+    db.prune(db.revision - 1)
+
+    fake, found = sync(monkeypatch, db)
+
+    assert db.full_reads(fake) == 1 and db.delta_reads(fake) == 0
+    assert [(r["round_id"], r["point"]) for r in found] == [("r1", -12), ("r2", 30)]
+
+
+def test_copy_newer_than_the_pruned_feed_is_still_patched(monkeypatch):
+    db = History([entry_row("r1", "2026-04-01T10:00")])
+    db.change("round", "r1")
+    db.prune(db.revision)
+    sync(monkeypatch, db)
+    db.entries.append(entry_row("r2", "2026-04-01T11:00"))
+    db.change("round", "r2")
+
+    fake, _ = sync(monkeypatch, db)
+
+    assert db.full_reads(fake) == 0 and db.delta_reads(fake) == 1
+
+
+def test_many_changes_are_refetched_in_chunks(monkeypatch):
+    db = History([])
+    sync(monkeypatch, db)
+    for i in range(250):
+        db.entries.append(entry_row(f"r{i:03d}", f"2026-04-01T10:{i // 60:02d}:{i % 60:02d}"))
+        db.change("round", f"r{i:03d}")
+
+    fake, found = sync(monkeypatch, db)
+
+    assert db.delta_reads(fake) == 3
+    assert len(found) == 250
+
+
+def test_feed_longer_than_max_rows_is_read_to_the_end(monkeypatch):
+    """フィードも max-rows で切り詰められる。最初のページだけで追いついたことにしない。"""
+    monkeypatch.setattr(queries, "PAGE_SIZE", 4)
+    db = History([])
+    sync(monkeypatch, db)
+    for i in range(10):
+        db.entries.append(entry_row(f"r{i}", f"2026-04-01T10:0{i}"))
+        db.change("round", f"r{i}")
+
+    fake, found = sync(monkeypatch, db)
+
+    assert len(fake.sent_to("round_changes")) == 3
+    assert [r["round_id"] for r in found] == [f"r{i}" for i in range(10)]
+
+
+def test_patching_does_not_touch_the_shared_copy(monkeypatch):
+    """古い写しを見ているセッションがあっても、差分の適用で中身が変わらない。"""
+    db = History([entry_row("r1", "2026-04-01T10:00")])
+    _, before = sync(monkeypatch, db)
+    held = _cache._entries[("g1", ("v_round_entries", "group_id", "g1"))].value
+    db.entries.append(entry_row("r2", "2026-04-01T11:00"))
+    db.change("round", "r2")
+    sync(monkeypatch, db)
+
+    assert [r["round_id"] for r in held] == ["r1"]
+    assert [r["round_id"] for r in before] == ["r1"]
+
+
+def test_own_write_keeps_the_copy_for_patching(monkeypatch):
+    """このプロセスからの書き込みでも、写しは捨てずに差分で追いつく。"""
+    db = History([entry_row("r1", "2026-04-01T10:00")])
+    fake, _ = sync(monkeypatch, db)
+
+    def respond(query: FakeQuery):
+        if query.kind == "rpc":
+            db.entries.append(entry_row("r2", "2026-04-01T11:00"))
+            db.change("round", "r2")
+            return "r2"
+        return db.respond(query)
+
+    fake.respond = respond
+    _base.write(lambda: fake.rpc("add_round_with_results", {}).execute(), touches="x")
+    found = queries.entry_rows("group_id", "g1")
+
+    assert db.full_reads(fake) == 1  # 最初の1回だけ
+    assert [r["round_id"] for r in found] == ["r1", "r2"]
+
+
+# --- 順位表のサーバー側集計 -------------------------------------------------
+
+
+def random_entries(seed: int) -> list[dict[str, Any]]:
+    """3人卓と4人卓が混ざった v_round_entries の行。名簿に無い "gone" も座る。"""
+    rng = random.Random(seed)
+    pool = ["a", "b", "c", "d", "gone"]
+    found = []
+    for i in range(rng.randint(1, 40)):
+        seated = rng.sample(pool, rng.choice([3, 4]))
+        for seat, (player_id, rank) in enumerate(zip(seated, rng.sample(range(1, 5), 4))):
+            found.append({**ENTRY, "round_id": f"r{i}", "round_created_at": f"2026-04-01T{i:05d}",
+                          "player_id": player_id, "seat": seat, "rank": rank,
+                          "point": rng.randint(-80, 80), "tobi": rng.random() < 0.1,
+                          "table_size": len(seated)})
+        # 同じ半荘の中で順位を 1..人数 に詰める（round_results の制約と同じ形）
+        seated_rows = found[-len(seated):]
+        for new_rank, row in enumerate(sorted(seated_rows, key=lambda r: r["rank"]), start=1):
+            row["rank"] = new_rank
+    return found
+
+
+def scope_standings(found: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """migrations/006 の scope_standings を、SQL の GROUP BY / FILTER の書き方どおりに真似る。"""
+    grouped: dict[str, list[dict[str, Any]]] = {}
+    for e in found:
+        grouped.setdefault(e["player_id"], []).append(e)
+    return [
+        {
+            "player_id": player_id,
+            "games": len(g),
+            "total_point": sum(e["point"] for e in g),
+            "rank_sum": sum(e["rank"] for e in g),
+            "rank_counts": [sum(1 for e in g if e["rank"] == k) for k in (1, 2, 3, 4)],
+            "last_count": sum(1 for e in g if e["rank"] == e["table_size"]),
+            "tobi_count": sum(1 for e in g if e["tobi"]),
+            "best_point": max(e["point"] for e in g),
+            "worst_point": min(e["point"] for e in g),
+        }
+        for player_id, g in grouped.items()
+    ]
+
+
+def standings_of(found: list[dict[str, Any]]) -> Callable[[FakeQuery], Any]:
+    """g1 のメンバーとして、成績ビューには found を、RPC にはその集計を返す応答。"""
+    base = member_of("g1")
+
+    def respond(query: FakeQuery):
+        if query.target == "scope_standings":
+            return scope_standings(found)
+        if query.target == "scope_round_count":
+            return len({e["round_id"] for e in found})
+        if query.target == "v_round_entries":
+            return found
+        return base(query)
+
+    return respond
+
+
+@pytest.mark.parametrize("seed", range(25))
+@pytest.mark.parametrize("rules", [PRESETS_4P["ウマなし"], PRESETS_3P["三人麻雀 ウマなし"]])
+def test_server_standings_match_aggregate(monkeypatch, state, seed, rules):
+    """RPC の1人1行から作った順位表が、全記録から作ったものと一致する。"""
+    found = random_entries(seed)
+    install(monkeypatch, standings_of(found))
+    names = {"a": "アキラ", "b": "ボブ", "c": "チカ", "d": "ダイ", "idle": "見学"}
+
+    standings = queries.fetch_standings("group_id", "g1")
+
+    assert from_tallies(standings, names, rules) == aggregate(
+        queries.fetch_entries("group_id", "g1"), names, rules
+    )
+    assert round_count(standings) == queries.count_rounds("group_id", "g1")
+
+
+def test_standings_skip_the_entries_download(monkeypatch, state):
+    found = random_entries(0)
+    fake = install(monkeypatch, standings_of(found))
+
+    queries.fetch_standings("tournament_id", "t1")
+
+    (call,) = fake.sent_to("scope_standings")
+    assert call.kind == "rpc"
+    assert not fake.sent_to("v_round_entries")
+    assert call.ops == [("params", ({"p_scope": "tournament_id", "p_id": "t1"},))]
+
+
+class MissingFunction(Exception):
+    """PostgREST の「関数が無い」（006 未適用）。"""
+
+    code = "PGRST202"
+
+
+def test_standings_fall_back_to_entries_without_the_rpc(monkeypatch, state):
+    found = random_entries(3)
+
+    def respond(query: FakeQuery):
+        if query.target == "scope_standings":
+            raise MissingFunction("function not found")
+        return standings_of(found)(query)
+
+    install(monkeypatch, respond)
+    rules = PRESETS_4P["ウマなし"]
+
+    standings = queries.fetch_standings("day_id", "d1")
+
+    entries = queries.fetch_entries("day_id", "d1")
+    assert from_tallies(standings, {}, rules) == aggregate(entries, {}, rules)
+
+
+def test_standings_reject_unknown_scope(monkeypatch, state):
+    install(monkeypatch)
+    with pytest.raises(queries.AppError):
+        queries.fetch_standings("player_id", "a")
+
+
+# --- 大会一覧の要約 ---------------------------------------------------------
+
+
+def test_tournament_overview_is_one_request(monkeypatch, state):
+    overview = [{**TOURNAMENT, "day_count": 3, "round_count": 40, "player_count": 6,
+                 "last_played_on": "2026-04-12"}]
+    fake = install(monkeypatch, lambda q: overview if q.target == "v_tournament_overview" else [])
+
+    found = tournaments.list_tournament_overview("g1")
+
+    assert found[0]["round_count"] == 40
+    assert [q.target for q in fake.sent if q.target != "v_my_groups"] == ["v_tournament_overview"]
+
+
+def test_tournament_overview_falls_back_without_the_view(monkeypatch, state):
+    day = {"id": "d1", "tournament_id": "t1", "group_id": "g1", "held_on": "2026-04-05"}
+
+    def respond(query: FakeQuery):
+        if query.target == "v_tournament_overview":
+            raise MissingTable("relation not found")
+        if query.target == "tournaments":
+            return [TOURNAMENT]
+        if query.target == "tournament_days":
+            return [day]
+        if query.target == "v_round_entries":
+            return [{**ENTRY, "held_on": "2026-04-05"},
+                    {**ENTRY, "player_id": "b", "seat": 1, "held_on": "2026-04-05"},
+                    {**ENTRY, "round_id": "r2", "held_on": "2026-04-05"}]
+        return []
+
+    install(monkeypatch, respond)
+
+    (found,) = tournaments.list_tournament_overview("g1")
+
+    assert found["name"] == "春"
+    assert (found["day_count"], found["round_count"], found["player_count"]) == (1, 2, 2)
+    assert found["last_played_on"] == "2026-04-05"
+
+
+# --- 大会の詳細 -------------------------------------------------------------
+
+
+def seat_row(game_id: str, day_id: str, created: str, seat: int, rounds: int) -> dict[str, Any]:
+    return {"game_id": game_id, "group_id": "g1", "tournament_id": "t1", "day_id": day_id,
+            "held_on": None, "game_name": game_id, "game_created_at": created, "seat": seat,
+            "player_id": f"p{seat}", "player_name": f"p{seat}", "user_id": None,
+            "total_point": 0, "round_count": rounds}
+
+
+def test_days_with_games_read_the_seats_once(monkeypatch, state):
+    days = [{"id": "d2", "tournament_id": "t1", "group_id": "g1", "held_on": "2026-04-12"},
+            {"id": "d1", "tournament_id": "t1", "group_id": "g1", "held_on": "2026-04-05"},
+            {"id": "d0", "tournament_id": "t1", "group_id": "g1", "held_on": "2026-03-29"}]
+    seats = [seat_row(game, day, created, seat, rounds)
+             for game, day, created, rounds in [("late", "d1", "2026-04-05T12", 2),
+                                                ("early", "d1", "2026-04-05T10", 3),
+                                                ("final", "d2", "2026-04-12T10", 5)]
+             for seat in range(4)]
+
+    def respond(query: FakeQuery):
+        return {"tournament_days": days, "v_game_seats": seats}.get(query.target, [])
+
+    fake = install(monkeypatch, respond)
+
+    found = tournaments.list_days_with_games("t1")
+
+    assert [d["id"] for d in found] == ["d2", "d1", "d0"]
+    assert [g["id"] for g in found[1]["games"]] == ["early", "late"]
+    assert [d["round_count"] for d in found] == [5, 5, 0]
+    assert len(found[1]["games"][0]["seats"]) == 4
+    assert len(fake.sent_to("v_game_seats")) == 1
+    assert len(fake.sent_to("tournament_days")) == 1
+
+
+# --- 半荘数 -----------------------------------------------------------------
+
+
+def test_round_count_is_one_integer(monkeypatch, state):
+    """「全 N 半荘」のために記録をまるごと取り寄せない。"""
+    found = random_entries(5)
+    fake = install(monkeypatch, standings_of(found))
+
+    assert queries.count_rounds("group_id", "g1") == len({e["round_id"] for e in found})
+    (call,) = fake.sent_to("scope_round_count")
+    assert call.ops == [("params", ({"p_scope": "group_id", "p_id": "g1"},))]
+    assert not fake.sent_to("v_round_entries")
+
+
+def test_round_count_falls_back_without_the_rpc(monkeypatch, state):
+    found = random_entries(6)
+
+    def respond(query: FakeQuery):
+        if query.target == "scope_round_count":
+            raise MissingFunction("function not found")
+        return standings_of(found)(query)
+
+    install(monkeypatch, respond)
+
+    assert queries.count_rounds("day_id", "d1") == len({e["round_id"] for e in found})
+
+
+def test_entries_with_count_is_one_read(monkeypatch, state):
+    found = random_entries(7)
+    fake = install(monkeypatch, standings_of(found))
+
+    entries, count = queries.fetch_entries_with_count("tournament_id", "t1")
+
+    assert len(entries) == len(found)
+    assert count == len({e["round_id"] for e in found})
+    assert len(fake.sent_to("v_round_entries")) == 1
+    assert not fake.sent_to("scope_round_count")
+
+
+# --- 読む列の組 -------------------------------------------------------------
+
+
+def projected(found: list[dict[str, Any]]) -> Callable[[FakeQuery], Any]:
+    """select() に渡した列だけを返す v_round_entries。列の組の取りこぼしを KeyError で見つける。"""
+
+    def respond(query: FakeQuery):
+        if query.target != "v_round_entries":
+            return []
+        (columns,) = next(args for op, args in query.ops if op == "select")
+        if columns == "*":
+            return found
+        keep = [c.strip() for c in columns.split(",")]
+        return [{c: row[c] for c in keep} for row in found]
+
+    return respond
+
+
+def server_order(found: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return sorted(found, key=lambda r: (r["round_created_at"], r["round_id"], r["seat"]))
+
+
+def test_stats_reads_only_the_columns_it_uses(monkeypatch, state):
+    found = [{**row, "round_ruleset": {"uma": [10, 5, -5, -10]}, "player_name": "アキラ"}
+             for row in random_entries(8)]
+    fake = install(monkeypatch, projected(found))
+
+    entries = queries.fetch_entries("group_id", "g1")
+    rounds = queries.fetch_rounds_in_order("group_id", "g1")
+    queries.fetch_entries_with_count("group_id", "g1")
+
+    (read,) = fake.sent_to("v_round_entries")
+    assert ("select", ("*",)) not in read.ops
+    assert sum(len(r) for r in rounds) == len(entries) == len(found)
+    # 卓の人数が載るので、3人卓のラスを4人ルールで取り違えない
+    assert {e.table_size for e in entries} <= {3, 4}
+
+
+def test_rounds_in_order_match_group_rounds(monkeypatch, state):
+    """行は (作成日時, round_id, 席) 順で届く。隣り合う行をまとめた結果が group_rounds と一致する。"""
+    found = random_entries(9)
+    fake = install(monkeypatch, projected(server_order(found)))
+
+    rounds = queries.fetch_rounds_in_order("group_id", "g1")
+
+    (read,) = fake.sent_to("v_round_entries")
+    assert [args for op, args in read.ops if op == "order"] == [
+        ("round_created_at",), ("round_id",), ("seat",)
+    ]
+    assert [[e.player_id for e in rnd] for rnd in rounds] == [
+        [r["player_id"] for r in rnd["results"]] for rnd in _base.group_rounds(found)
+    ]
+
+
+def test_recalc_reads_raw_scores_without_names(monkeypatch, state):
+    found = [{**row, "game_id": "x", "raw_score": 25000} for row in random_entries(10)]
+    fake = install(monkeypatch, projected(found))
+
+    stored = queries.fetch_stored_rounds_for_recalc("t1")
+
+    assert stored and all(set(s["raw_scores"]) == {25000} for s in stored)
+    (read,) = fake.sent_to("v_round_entries")
+    (columns,) = next(args for op, args in read.ops if op == "select")
+    assert "raw_score" in columns and "player_name" not in columns
+
+
+def test_unknown_profile_is_rejected(monkeypatch, state):
+    install(monkeypatch)
+    with pytest.raises(queries.AppError):
+        queries.entry_rows("group_id", "g1", "everything")
+
+
+# --- ページ単位の読み取り ---------------------------------------------------
+
+
+def paged(found: list[dict[str, Any]], max_rows: int) -> Callable[[FakeQuery], Any]:
+    """max-rows を持つ PostgREST の真似。limit と、_after() の条件（前ページの最後の行）を読む。"""
+    import re
+
+    ordered = server_order(found)
+
+    def respond(query: FakeQuery):
+        if query.target != "v_round_entries":
+            return []
+        limit = next(args[0] for op, args in query.ops if op == "limit")
+        start = 0
+        after = [args[0] for op, args in query.ops if op == "or_"]
+        if after:
+            created, round_id, seat = re.search(
+                r'round_created_at\.eq\."([^"]+)",round_id\.eq\.([^,]+),seat\.gt\.(\d+)', after[0]
+            ).groups()
+            key = (created, round_id, int(seat))
+            start = next(
+                (i for i, r in enumerate(ordered)
+                 if (r["round_created_at"], r["round_id"], r["seat"]) > key),
+                len(ordered),
+            )
+        return ordered[start : start + min(limit, max_rows)]
+
+    return respond
+
+
+def test_long_history_is_read_in_pages(monkeypatch, state):
+    """max-rows を超える履歴も切り詰めずに全部読む。"""
+    found = random_entries(11)
+    for extra in range(3):
+        found += [{**row, "round_id": f"{row['round_id']}-{extra}"} for row in random_entries(12)]
+    monkeypatch.setattr(queries, "PAGE_SIZE", 7)
+    fake = install(monkeypatch, paged(found, max_rows=7))
+
+    entries = queries.fetch_entries("group_id", "g1")
+
+    assert len(entries) == len(found)
+    assert len(fake.sent_to("v_round_entries")) == len(found) // 7 + 1
+
+
+def test_stream_yields_each_page_as_it_arrives(monkeypatch):
+    found = random_entries(13)
+    fake = install(monkeypatch, paged(found, max_rows=5))
+
+    stream = queries.stream_entry_rows("tournament_id", "t1", "recalc", page_size=5)
+    first = [next(stream) for _ in range(5)]
+
+    assert first == server_order(found)[:5]
+    assert len(fake.sent) == 1
+    assert first + list(stream) == server_order(found)
+
+
+def test_recalc_loader_streams_whole_rounds_across_pages(monkeypatch):
+    found = [{**row, "game_id": "x", "raw_score": 25000 + row["seat"]}
+             for row in random_entries(14)]
+    install(monkeypatch, paged(found, max_rows=5))
+    monkeypatch.setattr(queries, "PAGE_SIZE", 5)
+
+    stored = queries.fetch_stored_rounds_for_recalc("t1")
+
+    assert [s["round_id"] for s in stored] == [r["id"] for r in _base.group_rounds(found)]
+    assert all(s["seats"] == sorted(s["seats"]) for s in stored)
+
+
+def test_group_tables_are_read_in_pages_by_id(monkeypatch):
+    players = [{"id": f"p{i:02d}", "name": str(i)} for i in range(12)]
+
+    def respond(query: FakeQuery):
+        limit = next(args[0] for op, args in query.ops if op == "limit")
+        after = [args[1] for op, args in query.ops if op == "gt"]
+        found = [p for p in players if not after or p["id"] > after[0]]
+        return found[:limit]
+
+    fake = install(monkeypatch, respond)
+
+    found = list(queries.stream_group_rows("players", "id, name", "g1", page_size=5))
+
+    assert found == players
+    assert len(fake.sent) == 3
+    assert all(("eq", ("group_id", "g1")) in q.ops for q in fake.sent)
+
+
+# --- 並行読み取り -----------------------------------------------------------
+
+
+def test_gather_runs_calls_at_the_same_time():
+    """全部が同時に走っていないと、この Barrier は越えられない。"""
+    barrier = threading.Barrier(3, timeout=5)
+
+    def wait(value):
+        def run():
+            barrier.wait()
+            return value
+
+        return run
+
+    assert repo.gather(a=wait(1), b=wait(2), c=wait(3)) == {"a": 1, "b": 2, "c": 3}
+
+
+def test_gather_maps_errors_and_raises_the_first_declared():
+    def slow_failure():
+        time.sleep(0.05)
+        raise MissingTable("relation not found")
+
+    def fast_failure():
+        raise ConnectionError("offline")
+
+    with pytest.raises(queries.SchemaOutOfDate):
+        repo.gather(first=slow_failure, ok=lambda: 1, second=fast_failure)
+
+
+def test_gather_can_return_failures_in_place():
+    found = repo.gather(
+        ok=lambda: 1, broken=lambda: (_ for _ in ()).throw(ConnectionError("offline")),
+        return_exceptions=True,
+    )
+
+    assert found["ok"] == 1
+    assert isinstance(found["broken"], repo.NetworkError)
+
+
+def test_parallel_identical_reads_share_one_request(monkeypatch, state):
+    """get_ruleset と get_tournament を並べても、大会は1回しか読まない。"""
+    started = threading.Event()
+
+    def respond(query: FakeQuery):
+        started.set()
+        time.sleep(0.05)
+        return [TOURNAMENT]
+
+    fake = install(monkeypatch, respond)
+
+    found = repo.gather(
+        tournament=lambda: tournaments.get_tournament("t1"),
+        ruleset=lambda: tournaments.get_ruleset("t1"),
+        again=lambda: tournaments.get_tournament("t1"),
+    )
+
+    assert found["tournament"]["name"] == "春"
+    assert len(fake.sent_to("tournaments")) == 1
+
+
+def test_failed_parallel_read_is_retried_by_the_waiter(monkeypatch, state):
+    calls = []
+
+    def respond(query: FakeQuery):
+        calls.append(query)
+        if len(calls) == 1:
+            time.sleep(0.05)
+        if len(calls) <= _retry.MAX_ATTEMPTS:
+            raise ConnectionError("offline")
+        return [TOURNAMENT]
+
+    install(monkeypatch, respond)
+
+    found = repo.gather(
+        first=lambda: tournaments.get_tournament("t1"),
+        second=lambda: (time.sleep(0.01), tournaments.get_tournament("t1"))[1],
+        return_exceptions=True,
+    )
+
+    assert isinstance(found["first"], repo.NetworkError)
+    assert found["second"]["name"] == "春"
+
+
+
+def test_deferred_call_leaves_the_shared_thread_without_a_session(monkeypatch):
+    """ダウンロードの関数は Streamlit の既定の executor で呼ばれる（asyncio.to_thread）。
+
+    そのスレッドは他のセッションの仕事にも使われるので、終わったらセッションを外す。
+    """
+    import asyncio
+
+    from mahjong.repo import _parallel
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    session = SimpleNamespace(pages_manager=SimpleNamespace(main_script_hash="h"))
+    monkeypatch.setattr(_parallel, "_script_run_ctx", lambda: session)
+    download = repo.deferred(lambda: get_script_run_ctx(suppress_warning=True))
+
+    async def click_then_other_work():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        during = await asyncio.to_thread(download)
+        after = await asyncio.to_thread(get_script_run_ctx, True)
+        return during, after
+
+    during, after = asyncio.run(click_then_other_work())
+
+    assert during is session
+    assert after is None
+
+# --- 再試行・追い掛け -------------------------------------------------------
+
+
+@pytest.fixture
+def no_memo(monkeypatch):
+    """メモも共有キャッシュも通さず、通信の回数をそのまま数える。"""
+    monkeypatch.setattr(_base, "_session_state", lambda: None)
+
+
+class Denied(Exception):
+    code = "42501"
+    message = "permission denied for table players"
+
+
+def flaky(failures: int, then: Any = ()) -> Callable[[FakeQuery], Any]:
+    """最初の failures 回だけ通信に失敗する応答。RPC には卓の状態（011）を返す。"""
+    calls = {"n": 0}
+
+    def respond(query: FakeQuery):
+        calls["n"] += 1
+        if calls["n"] <= failures:
+            raise ConnectionError("切れた")
+        if query.target.endswith("_returning_state"):
+            return game_state()
+        return list(then)
+
+    return respond
+
+
+def test_read_is_retried_after_a_dropped_connection(monkeypatch, no_memo):
+    fake = install(monkeypatch, flaky(1, [TOURNAMENT]))
+
+    assert tournaments.get_tournament("t1")["name"] == "春"
+    assert len(fake.sent) == 2
+    assert _retry.stats().retries == 1
+
+
+def test_read_gives_up_after_max_attempts(monkeypatch, no_memo):
+    fake = install(monkeypatch, flaky(99))
+
+    with pytest.raises(repo.NetworkError):
+        tournaments.get_tournament("t1")
+    assert len(fake.sent) == _retry.MAX_ATTEMPTS
+
+
+def test_refusals_are_not_retried(monkeypatch, no_memo):
+    def respond(query: FakeQuery):
+        raise Denied()
+
+    fake = install(monkeypatch, respond)
+
+    with pytest.raises(repo.PermissionDenied):
+        groups.list_players("g1")
+    assert len(fake.sent) == 1
+
+
+def test_adding_a_round_is_never_sent_twice(monkeypatch, no_memo):
+    """追加の RPC は、届いたのに応答だけ落ちた場合に2件になるので再試行しない。"""
+    fake = install(monkeypatch, flaky(1))
+
+    with pytest.raises(repo.NetworkError):
+        games.add_round("x", [], {})
+    assert len(fake.sent) == 1
+
+
+def test_soft_delete_is_retried_with_the_same_timestamp(monkeypatch, no_memo):
+    fake = install(monkeypatch, flaky(1))
+
+    tournaments.delete_day("d1")
+
+    stamps = [dict(q.ops)["update"][0]["deleted_at"] for q in fake.sent_to("tournament_days")]
+    assert len(stamps) == 2 and stamps[0] == stamps[1]
+
+
+def test_retry_budget_stops_a_retry_storm(monkeypatch, no_memo):
+    """サーバーが落ちているとき、再試行は通常の呼び出しの一定割合までに抑える。"""
+    monkeypatch.setattr(_retry, "BUDGET_CAP", 2.0)
+    _retry.reset()
+    fake = install(monkeypatch, flaky(10_000))
+
+    for _ in range(50):
+        with pytest.raises(repo.NetworkError):
+            groups.list_players("g1")
+
+    retries = _retry.stats().retries
+    assert retries <= 2 + 50 * _retry.BUDGET_RATIO
+    assert len(fake.sent) == 50 + retries
+    assert _retry.stats().throttled > 0
+
+
+def known_latency(seconds: float) -> None:
+    """追い掛けを始められるだけの所要時間を覚えさせる。"""
+    for _ in range(_retry.HEDGE_MIN_SAMPLES):
+        _retry._latencies.append(seconds)
+
+
+def test_stalled_read_is_answered_by_the_hedge(monkeypatch, no_memo):
+    """1本目が止まっても時間切れまで待たず、先に返った追い掛けの結果を使う。"""
+    monkeypatch.setattr(_retry, "HEDGE_FLOOR", 0.01)
+    known_latency(0.01)
+    release = threading.Event()
+    calls = []
+
+    def respond(query: FakeQuery):
+        calls.append(query)
+        if len(calls) == 1:
+            release.wait(5)  # 止まった1本目
+            return [{**TOURNAMENT, "name": "遅い"}]
+        return [TOURNAMENT]
+
+    fake = install(monkeypatch, respond)
+
+    started = time.monotonic()
+    try:
+        assert tournaments.get_tournament("t1")["name"] == "春"
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+
+    assert elapsed < 1
+    assert len(fake.sent) == 2
+    found = _retry.stats()
+    assert (found.hedges, found.hedge_wins, found.retries) == (1, 1, 0)
+
+
+def test_failed_read_falls_back_to_the_hedge_without_a_retry(monkeypatch, no_memo):
+    """1本目が切れたら、投げ直しを待たずに走っている追い掛けを待つ。"""
+    monkeypatch.setattr(_retry, "HEDGE_FLOOR", 0.01)
+    known_latency(0.01)
+    hedged = threading.Event()
+    calls = []
+
+    def respond(query: FakeQuery):
+        calls.append(query)
+        if len(calls) == 1:
+            hedged.wait(5)
+            raise ConnectionError("切れた")
+        hedged.set()
+        time.sleep(0.05)  # 1本目が切れたあとに返る
+        return [TOURNAMENT]
+
+    fake = install(monkeypatch, respond)
+
+    assert tournaments.get_tournament("t1")["name"] == "春"
+
+    assert len(fake.sent) == 2
+    found = _retry.stats()
+    assert (found.hedges, found.hedge_wins, found.retries) == (1, 1, 0)
+
+
+def test_concurrent_reads_do_not_queue_behind_the_hedge_pool(monkeypatch, no_memo):
+    """追い掛けのプールより多くの人が同時に読んでも、1本目は待たされず、追い掛けも出ない。"""
+    known_latency(0.1)
+    install(monkeypatch, lambda q: time.sleep(0.1) or [TOURNAMENT])
+    readers = _retry.HEDGE_WORKERS * 4
+    barrier = threading.Barrier(readers, timeout=5)
+
+    def read():
+        barrier.wait()
+        return tournaments.get_tournament("t1")["name"]
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=readers) as pool:
+        names = list(pool.map(lambda _: read(), range(readers)))
+    elapsed = time.monotonic() - started
+
+    assert names == ["春"] * readers
+    assert elapsed < _retry.HEDGE_FLOOR
+    assert _retry.stats().hedges == 0
+
+
+def test_hedging_is_skipped_when_the_pool_is_full(monkeypatch, no_memo):
+    monkeypatch.setattr(_retry, "HEDGE_WORKERS", 1)
+    monkeypatch.setattr(_retry, "HEDGE_FLOOR", 0.01)
+    known_latency(0.01)
+    install(monkeypatch, lambda q: time.sleep(0.2) or [TOURNAMENT])
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda _: tournaments.get_tournament("t1"), range(3)))
+
+    found = _retry.stats()
+    assert (found.hedges, found.saturated) == (1, 2)
+
+
+def test_hedge_thread_does_not_keep_the_session(monkeypatch, no_memo):
+    """プールのスレッドは使い回す。追い掛けが終わったら、呼び出し元のセッションを外す。"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    session = SimpleNamespace(pages_manager=SimpleNamespace(main_script_hash="h"))
+    monkeypatch.setattr(_retry, "_script_run_ctx", lambda: session)
+    monkeypatch.setattr(_retry, "HEDGE_FLOOR", 0.01)
+    known_latency(0.01)
+    seen = []
+
+    def respond(query: FakeQuery):
+        seen.append(get_script_run_ctx(suppress_warning=True))
+        if len(seen) == 1:
+            time.sleep(0.1)
+        return [TOURNAMENT]
+
+    install(monkeypatch, respond)
+    tournaments.get_tournament("t1")
+    time.sleep(0.05)  # 追い掛けが返りきるまで
+
+    assert seen[1] is session
+    probe = _retry._executor().submit(lambda: get_script_run_ctx(suppress_warning=True))
+    assert probe.result() is None
+
+
+def test_no_hedging_until_latencies_are_known(monkeypatch, no_memo):
+    fake = install(monkeypatch, lambda q: [TOURNAMENT])
+
+    tournaments.get_tournament("t1")
+
+    assert len(fake.sent) == 1
+    assert _retry.stats().hedges == 0
+
+
+# --- 保存待ちの列 -----------------------------------------------------------
+
+
+@pytest.fixture
+def queue(monkeypatch) -> dict[str, Any]:
+    """保存待ちの列の置き場所。no_memo と同じく通信の回数はそのまま数える。"""
+    store: dict[str, Any] = {}
+    monkeypatch.setattr(_base, "_session_state", lambda: None)
+    monkeypatch.setattr(outbox, "_session_state", lambda: store)
+    return store
+
+
+def round_keys(fake: FakeClient, target: str = "add_round_returning_state") -> list[str | None]:
+    return [dict(q.ops)["params"][0].get("p_client_key") for q in fake.sent_to(target)]
+
+
+def test_client_key_makes_adding_a_round_retryable(monkeypatch, no_memo):
+    fake = install(monkeypatch, flaky(1))
+
+    games.add_round("x", [], {}, client_key="k1")
+
+    assert round_keys(fake) == ["k1", "k1"]
+
+
+def test_client_key_is_dropped_before_migration_010(monkeypatch, no_memo):
+    def respond(query: FakeQuery):
+        if query.target != "add_round_with_results" or "p_client_key" in dict(query.ops)["params"][0]:
+            raise MissingFunction()
+        return "r1"
+
+    fake = install(monkeypatch, respond)
+
+    assert games.add_round("x", [], {}, client_key="k1") == "r1"
+    assert round_keys(fake, "add_round_with_results") == ["k1", None]
+
+
+def test_outbox_sends_in_order_and_empties(monkeypatch, queue):
+    fake = install(monkeypatch, lambda q: game_state())
+    first = outbox.enqueue("x", [], {})
+    second = outbox.enqueue("x", [], {})
+
+    done = outbox.flush()
+
+    assert done.sent == 2 and done.error is None
+    assert round_keys(fake) == [first.key, second.key]
+    assert outbox.pending() == []
+
+
+def test_outbox_stops_at_a_network_error_and_keeps_the_rest(monkeypatch, queue):
+    fake = install(monkeypatch, flaky(99))
+    first = outbox.enqueue("x", [], {})
+    outbox.enqueue("y", [], {})
+
+    done = outbox.flush()
+
+    assert isinstance(done.error, repo.NetworkError)
+    assert done.sent == 0
+    assert len(outbox.pending()) == 2
+    assert set(round_keys(fake)) == {first.key}  # 2件目は送っていない
+
+
+def test_outbox_waits_before_retrying_on_its_own(monkeypatch, queue):
+    fake = install(monkeypatch, flaky(_retry.MAX_ATTEMPTS))
+    outbox.enqueue("x", [], {})
+    outbox.flush()
+    sent = len(fake.sent)
+
+    assert outbox.flush().sent == 0  # 失敗の直後は自動では送らない
+    assert len(fake.sent) == sent
+    assert outbox.flush(force=True).sent == 1
+
+
+def test_resending_after_a_lost_reply_uses_the_same_key(monkeypatch, queue):
+    """届いたが応答だけ落ちた半荘を送り直しても、同じキーなのでサーバーで1件になる。"""
+    fake = install(monkeypatch, flaky(_retry.MAX_ATTEMPTS))
+    entry = outbox.enqueue("x", [], {})
+
+    outbox.flush()
+    outbox.flush(force=True)
+
+    assert set(round_keys(fake)) == {entry.key}
+    assert outbox.pending() == []
+
+
+def test_outbox_drops_refused_rounds_and_goes_on(monkeypatch, queue):
+    def respond(query: FakeQuery):
+        if dict(query.ops)["params"][0]["p_game_id"] == "gone":
+            raise Denied()
+        return game_state()
+
+    install(monkeypatch, respond)
+    refused = outbox.enqueue("gone", [], {})
+    outbox.enqueue("x", [], {})
+
+    done = outbox.flush()
+
+    assert done.sent == 1
+    assert [entry for entry, _ in done.rejected] == [refused]
+    assert outbox.pending() == []
+
+
+def test_pending_and_discard_by_game(monkeypatch, queue):
+    a = outbox.enqueue("x", [], {})
+    outbox.enqueue("y", [], {})
+
+    outbox.discard(a.key)
+
+    assert outbox.pending("x") == []
+    assert [e.game_id for e in outbox.pending()] == ["y"]
+
+
+# --- 保存の応答に載る卓の状態 -----------------------------------------------
+
+
+def reads_of_the_game_page(fake: FakeClient) -> int:
+    """スコア入力の画面が頭で読むもの（get_game・get_ruleset・list_rounds）の通信回数。"""
+    games.get_game("x")
+    tournaments.get_ruleset("t1")
+    games.list_rounds("x")
+    return sum(len(fake.sent_to(t)) for t in ("v_game_seats", "tournaments", "v_round_entries"))
+
+
+def test_saving_a_round_answers_the_next_page_reads(monkeypatch, state):
+    fake = install(monkeypatch, lambda q: game_state("r9"))
+
+    assert games.add_round("x", [], {}) == "r9"
+    _base.begin_run()  # 保存のあとの再実行
+
+    assert reads_of_the_game_page(fake) == 0
+    assert len(fake.sent) == 1  # 書き込みの1往復だけ
+    assert [r["id"] for r in games.list_rounds("x")] == ["r1"]
+
+
+@pytest.mark.parametrize(
+    "save",
+    [
+        lambda: games.update_round("r1", [], {}),
+        lambda: games.delete_round("r1"),
+    ],
+)
+def test_editing_and_deleting_also_answer_the_page_reads(monkeypatch, state, save):
+    fake = install(monkeypatch, lambda q: game_state())
+
+    save()
+    _base.begin_run()
+
+    assert reads_of_the_game_page(fake) == 0
+
+
+def test_remembered_state_lasts_one_run(monkeypatch, state):
+    def respond(query: FakeQuery):
+        if query.kind == "rpc":
+            return game_state()
+        return [TOURNAMENT] if query.target == "tournaments" else []
+
+    fake = install(monkeypatch, respond)
+    monkeypatch.setattr(_base, "_is_member", lambda group_id: False)  # 共有キャッシュを通さない
+
+    games.add_round("x", [], {})
+    _base.begin_run()
+    _base.begin_run()  # その次の実行は、他の人の書き込みも見えるよう読み直す
+
+    assert reads_of_the_game_page(fake) == 3
+
+
+def test_failed_save_remembers_nothing(monkeypatch, state):
+    def respond(query: FakeQuery):
+        if query.kind == "rpc":
+            raise Denied()
+        return [TOURNAMENT] if query.target == "tournaments" else []
+
+    fake = install(monkeypatch, respond)
+    monkeypatch.setattr(_base, "_is_member", lambda group_id: False)
+
+    with pytest.raises(repo.PermissionDenied):
+        games.add_round("x", [], {})
+    _base.begin_run()
+
+    assert reads_of_the_game_page(fake) == 3
+
+
+def test_deleting_a_round_resends_the_same_timestamp(monkeypatch, no_memo):
+    fake = install(monkeypatch, flaky(1))
+
+    games.delete_round("r1")
+
+    sent = [dict(q.ops)["params"][0] for q in fake.sent_to("delete_round_returning_state")]
+    assert len(sent) == 2 and sent[0] == sent[1]
+
+
+def test_round_writes_fall_back_before_migration_011(monkeypatch, no_memo):
+    def respond(query: FakeQuery):
+        if query.target.endswith("_returning_state"):
+            raise MissingFunction()
+        return "r1" if query.kind == "rpc" else []
+
+    fake = install(monkeypatch, respond)
+
+    assert games.add_round("x", [], {}) == "r1"
+    games.update_round("r1", [], {})
+    games.delete_round("r1")
+
+    assert [q.target for q in fake.sent if not q.target.endswith("_returning_state")] == [
+        "add_round_with_results", "update_round_results", "game_rounds",
+    ]
+
+
+# --- まとめて保存 -----------------------------------------------------------
+
+
+def seat_result(seat: int, raw: int, kaze: str, rank: int, point: int) -> SimpleNamespace:
+    return SimpleNamespace(seat=seat, raw_score=raw, kaze=kaze, rank=rank, point=point, tobi=False)
+
+
+SHEET = [seat_result(0, 40000, "東", 1, 30), seat_result(1, 10000, "南", 2, -30)]
+SEATS_OF = {0: "a", 1: "b"}
+
+
+def test_many_rounds_are_saved_in_one_request(monkeypatch, state):
+    def respond(query: FakeQuery):
+        return {**game_state(), "round_ids": ["r1", "n1", "n2"]}
+
+    fake = install(monkeypatch, respond)
+
+    saved = games.save_rounds("x", [("r1", SHEET), (None, SHEET), (None, SHEET)], SEATS_OF)
+    _base.begin_run()
+
+    assert saved == ["r1", "n1", "n2"]
+    assert len(fake.sent) == 1
+    sent = dict(fake.sent[0].ops)["params"][0]["p_rounds"]
+    assert [r["round_id"] for r in sent] == ["r1", None, None]
+    assert sent[0]["client_key"] is None and sent[1]["client_key"] != sent[2]["client_key"]
+    assert reads_of_the_game_page(fake) == 0
+
+
+def test_saving_many_rounds_is_retried_with_the_same_keys(monkeypatch, no_memo):
+    fake = install(monkeypatch, flaky(1))
+
+    games.save_rounds("x", [(None, SHEET), (None, SHEET)], SEATS_OF)
+
+    sent = [dict(q.ops)["params"][0]["p_rounds"] for q in fake.sent_to("save_rounds_returning_state")]
+    assert len(sent) == 2 and sent[0] == sent[1]
+
+
+def test_too_many_rounds_are_refused_before_sending(monkeypatch, no_memo):
+    fake = install(monkeypatch)
+
+    with pytest.raises(repo.AppError):
+        games.save_rounds("x", [(None, SHEET)] * (games.MAX_BATCH_ROUNDS + 1), SEATS_OF)
+    assert fake.sent == []
+
+
+def test_saving_many_rounds_falls_back_before_migration_012(monkeypatch, no_memo):
+    def respond(query: FakeQuery):
+        if query.target == "save_rounds_returning_state":
+            raise MissingFunction()
+        return game_state("n1")
+
+    fake = install(monkeypatch, respond)
+
+    assert games.save_rounds("x", [("r1", SHEET), (None, SHEET)], SEATS_OF) == ["r1", "n1"]
+    assert [q.target for q in fake.sent[1:]] == [
+        "update_round_returning_state", "add_round_returning_state",
+    ]
+
+
+def test_given_client_keys_are_sent_as_is(monkeypatch, no_memo):
+    """取り込みは元データから作ったキーを渡し、別のプロセスからの送り直しでも同じ半荘にする。"""
+    fake = install(monkeypatch, lambda query: {**game_state(), "round_ids": ["n1", "r1"]})
+
+    games.save_rounds("x", [(None, SHEET), ("r1", SHEET)], SEATS_OF, client_keys=["k1", None])
+
+    sent = dict(fake.sent[0].ops)["params"][0]["p_rounds"]
+    assert [r["client_key"] for r in sent] == ["k1", None]
+    with pytest.raises(ValueError):
+        games.save_rounds("x", [(None, SHEET)], SEATS_OF, client_keys=[])
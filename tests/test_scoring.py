@@ -17,12 +17,15 @@ from mahjong.rules import (
 from mahjong.scoring import (
     ScoringError,
     calc_round,
+    calc_sheet,
     determine_ranks,
     effective_oka,
+    kazes_for_dealer,
     recalculate,
     round_to_point,
     validate_total,
 )
+from mahjong.ui import kaze_rotated
 
 NO_UMA = PRESETS_4P["ウマなし"]
 GOTTO = PRESETS_4P["ゴットー (5-10)"]
@@ -370,3 +373,51 @@ def test_recalculate_follows_rule_change():
     assert [r.rank for r in before[1]] == [r.rank for r in after[1]]
     for rnd in after:
         assert sum(r.point for r in rnd) == 0
+
+
+# --- まとめて入力 -----------------------------------------------------------
+
+
+def test_kazes_for_dealer_matches_the_next_round_rotation():
+    assert kazes_for_dealer(0, 4) == ["東", "南", "西", "北"]
+    # 前回の南家（並びの1番目）が次の東家
+    assert kazes_for_dealer(1, 4) == kaze_rotated(["東", "南", "西", "北"], -1)
+    assert kazes_for_dealer(2, 3) == ["南", "西", "東"]
+
+
+def test_sheet_skips_blank_rows_and_carries_the_dealer():
+    rules = RuleSet()
+    lines = calc_sheet(
+        [[40000, 30000, 20000, 10000], [None] * 4, [10000, 20000, 30000, 40000]],
+        [2, None, None],
+        rules,
+    )
+
+    assert [(line.row, line.dealer) for line in lines] == [(0, 2), (2, 3)]
+    assert [r.kaze for r in lines[1].results] == kazes_for_dealer(3, 4)
+
+
+def test_sheet_fills_only_the_last_seat():
+    rules = RuleSet()
+    lines = calc_sheet(
+        [[40000, 30000, 20000, None], [40000, None, 20000, 10000]], [None, None], rules
+    )
+
+    assert [r.raw_score for r in lines[0].results] == [40000, 30000, 20000, 10000]
+    assert lines[1].results is None and "空欄" in lines[1].error
+
+
+def test_sheet_reports_every_bad_row():
+    rules = RuleSet()
+    lines = calc_sheet(
+        [[40000, 30000, 20000, 20000], [25000] * 4, [1, 2, 3, 4]], [None] * 3, rules
+    )
+
+    assert [line.error is not None for line in lines] == [True, False, True]
+
+
+def test_sheet_allows_wrong_totals_when_not_strict():
+    lines = calc_sheet([[40000, 30000, 20000, 20000]], [None], RuleSet(), strict=False)
+
+    assert lines[0].error is None
+    assert sum(r.point for r in lines[0].results) == 0
@@ -85,11 +85,12 @@ def test_generated_schema_does_not_recreate_legacy_tables():
 
 def test_views_are_security_invoker():
     """ビューが security_invoker=true でないと RLS を素通りして全グループ丸見えになる。"""
-    text = (MIGRATIONS / "003d_views_rpc.sql").read_text(encoding="utf-8")
-    created = text.count("CREATE VIEW public.")
-    invoker = text.count("WITH (security_invoker = true)")
-    assert created > 0
-    assert invoker == created, "security_invoker が付いていないビューがある"
+    for path in sorted(MIGRATIONS.glob("*.sql")):
+        text = code_only(path.read_text(encoding="utf-8"))
+        created = text.count("CREATE VIEW public.")
+        invoker = text.count("WITH (security_invoker = true)")
+        assert invoker == created, f"{path.name}: security_invoker が付いていないビューがある"
+    assert "CREATE VIEW public." in (MIGRATIONS / "003d_views_rpc.sql").read_text(encoding="utf-8")
 
 
 def test_security_definer_functions_pin_search_path():
@@ -193,6 +194,17 @@ def test_views_exclude_soft_deleted_parents(view: str, table: str):
         )
 
 
+def test_round_entries_filters_reach_below_table_size():
+    """v_round_entries の table_size を窓関数で数えない。
+
+    窓関数より外の WHERE（スコープ・ページのキーセット）はビューの中へ押し込めないので、
+    ページを読むたびにスコープ全体を数え直すことになる。
+    """
+    body = _view_body("v_round_entries")
+    assert " OVER " not in body.upper()
+    assert "table_size" in body
+
+
 def test_views_keep_soft_deleted_players():
     """★プレイヤーだけは絞らない★
 
@@ -205,3 +217,65 @@ def test_views_keep_soft_deleted_players():
 
         for join in re.findall(r"JOIN\s+public\.players\b[^\n]*", _view_body(view)):
             assert "deleted_at" not in join, f"{view}: players を論理削除で絞っている"
+
+
+def test_change_feed_triggers_fire_after_revision_bump():
+    """同じ操作の AFTER トリガは名前順に走る。フィードには進めたあとの版数を刻みたい。
+
+    `<表>_rev_<操作>`（004）が `<表>_revlog_<操作>`（005）より先に来ることを固定する。
+    """
+    import re
+
+    bump = code_only((MIGRATIONS / "004_group_revisions.sql").read_text(encoding="utf-8"))
+    feed = code_only((MIGRATIONS / "005_round_changes.sql").read_text(encoding="utf-8"))
+    assert "'_rev_ins'" in bump and "'_rev_upd'" in bump and "'_rev_del'" in bump
+    names = set(re.findall(r"\b(\w+)_revlog_(ins|upd|del)\b", feed))
+    assert names
+    for table, op in names:
+        assert f"{table}_rev_{op}" < f"{table}_revlog_{op}"
+
+
+def test_summary_triggers_fire_after_revision_bump():
+    """集計表（007）の作り直しは、004 の版数トリガが握る行ロックで同じグループの書き込みを
+    1本に並べてから行う。`<表>_rev_<操作>` が `<表>_sum_<操作>` より先に来ることを固定する。
+    """
+    import re
+
+    summaries = code_only((MIGRATIONS / "007_player_summaries.sql").read_text(encoding="utf-8"))
+    names = set(re.findall(r"\b(\w+)_sum_(ins|upd|del)\b", summaries))
+    names |= {(t, "upd") for t in re.findall(r"'(\w+)'", _summary_loop(summaries))}
+    assert ("round_results", "del") in names and ("tournaments", "upd") in names
+    for table, op in names:
+        assert f"{table}_rev_{op}" < f"{table}_sum_{op}"
+
+
+def _summary_loop(text: str) -> str:
+    """FOREACH で作る `<表>_sum_upd` の対象表の配列部分。"""
+    import re
+
+    match = re.search(r"FOREACH t IN ARRAY ARRAY\[([^\]]*)\]", text)
+    assert match, "007 の FOREACH が見つからない"
+    return match.group(1)
+
+
+def test_summary_inserts_and_deletes_are_added_up_not_rebuilt():
+    """半荘の追加・差し替え・再計算のたびに、その人の全履歴を数え直さない（007）。
+
+    apply_recalculated_rounds や save_rounds_returning_state は1回の呼び出しで
+    半荘の数だけ INSERT / DELETE を流すので、作り直しだと全履歴×半荘数になる。
+    """
+    import re
+
+    summaries = code_only((MIGRATIONS / "007_player_summaries.sql").read_text(encoding="utf-8"))
+    branches = re.search(
+        r"IF TG_OP = 'INSERT' THEN(.*?)ELSIF TG_OP = 'DELETE' THEN(.*?)ELSE", summaries, re.S
+    )
+    assert branches, "007 の round_results の分岐が見つからない"
+    for body in branches.groups():
+        assert "apply_summary_delta" in body and "refresh_player_summaries" not in body
+
+    # 卓の人数は窓関数で数える（行ごとの相関副問い合わせにしない）
+    summarize = summaries[summaries.index("FUNCTION public.summarize_players"):]
+    summarize = summarize[: summarize.index("$$;")]
+    assert "OVER (PARTITION BY rr.round_id)" in summarize
+    assert "SELECT count(*) FROM public.round_results" not in summarize
@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+import random
+
 import pytest
 
+from mahjong import columnar
+from mahjong import stats as stats_module
 from mahjong.rules import PRESETS_3P, PRESETS_4P, RuleSet
-from mahjong.stats import PlayerStats, RoundEntry, aggregate, cumulative_series
+from mahjong.stats import PlayerStats, RoundEntry, aggregate, cumulative_series, tally
 
 NO_UMA = PRESETS_4P["ウマなし"]
 PLAYERS = {"a": "アキラ", "b": "ボブ", "c": "チカ", "d": "ダイ"}
@@ -254,6 +258,75 @@ def test_last_rate_uses_table_size_for_mixed_arity():
     assert stats.last_rate == 0.5
 
 
+# --- 列持ちの集計（columnar） ---------------------------------------------
+
+
+def random_entries(rng: random.Random, rounds: int) -> list[RoundEntry]:
+    """3人卓と4人卓、table_size の無い記録、範囲外の順位、名簿に無い人を混ぜる。"""
+    pool = list(PLAYERS) + ["e", "gone-1", "gone-2"]
+    entries = []
+    for _ in range(rounds):
+        size = rng.choice((3, 4))
+        for rank, pid in enumerate(rng.sample(pool, size), start=1):
+            entries.append(
+                RoundEntry(
+                    player_id=pid,
+                    rank=rng.choice((0, 9)) if rng.random() < 0.02 else rank,
+                    point=rng.randint(-120, 120),
+                    tobi=rng.random() < 0.1,
+                    table_size=rng.choice((0, size)),
+                    kaze=rng.choice(("", "東", "南", "西", "北")),
+                )
+            )
+    return entries
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_columnar_tally_matches_the_row_by_row_tally(seed):
+    rng = random.Random(seed)
+    entries = random_entries(rng, rng.randint(0, 60))
+    rules = rng.choice([NO_UMA, PRESETS_3P["三人麻雀 ウマなし"], RuleSet(rate=50)])
+    columns = columnar.EntryColumns.from_entries(entries)
+
+    assert columnar.tally(columns, rules.player_count) == tally(entries, rules.player_count)
+    # 順位表は並び（同点の扱い）まで同じ
+    assert aggregate(columns, PLAYERS, rules) == aggregate(entries, PLAYERS, rules)
+
+
+def test_columns_from_view_rows_match_columns_from_entries():
+    entries = random_entries(random.Random(0), 30)
+    rows = [
+        {"player_id": e.player_id, "rank": e.rank, "point": e.point, "tobi": e.tobi,
+         "table_size": e.table_size or None, "kaze": e.kaze or None}
+        for e in entries
+    ]
+
+    from_rows = columnar.EntryColumns.from_rows(rows)
+    from_entries = columnar.EntryColumns.from_entries(entries)
+
+    assert from_rows.player_ids == from_entries.player_ids
+    for name in ("player", "rank", "point", "tobi", "table_size", "kaze"):
+        assert (getattr(from_rows, name) == getattr(from_entries, name)).all()
+
+
+def test_many_entries_are_counted_in_columns(monkeypatch):
+    monkeypatch.setattr(stats_module, "COLUMNAR_MIN_ENTRIES", 10)
+    calls = []
+    monkeypatch.setattr(columnar, "tally", lambda *args: calls.append(args) or {})
+
+    aggregate(random_entries(random.Random(1), 3), PLAYERS, NO_UMA)
+    aggregate(random_entries(random.Random(1), 1), PLAYERS, NO_UMA)
+
+    assert len(calls) == 1
+
+
+def test_empty_columns():
+    columns = columnar.EntryColumns.from_entries([])
+
+    assert len(columns) == 0 and columnar.tally(columns, 4) == {}
+    assert [s.games for s in aggregate(columns, PLAYERS, NO_UMA)] == [0, 0, 0, 0]
+
+
 # --- 個人の掘り下げ ---------------------------------------------------------
 
 
@@ -430,3 +503,126 @@ def test_streaks_ignores_rounds_the_player_missed():
     ]
     # a は1半荘目と3半荘目でラス。間の半荘は不参加なので連続扱い。
     assert streaks(rounds, "a").longest_last == 2
+
+
+# --- 全員分の掘り下げ（profiles） --------------------------------------------
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_profiles_match_the_one_player_functions(seed):
+    from mahjong.stats import (
+        head_to_head, kaze_breakdown, player_rounds, point_by_rank, profiles, rank_trend, streaks,
+    )
+
+    rng = random.Random(seed)
+    rounds = []
+    entries = random_entries(rng, rng.randint(0, 40))
+    while entries:
+        size = rng.choice((3, 4))
+        chunk, entries = entries[:size], entries[size:]
+        if rng.random() < 0.05:
+            chunk.append(chunk[0])  # 同じ人が2回出てくる壊れた記録
+        rounds.append(chunk)
+
+    found = profiles(rounds)
+
+    assert set(found) == {e.player_id for entries in rounds for e in entries}
+    for pid, profile in found.items():
+        assert profile.rounds == tuple(player_rounds(rounds, pid))
+        assert profile.opponents == tuple(head_to_head(rounds, pid))
+        assert profile.kaze == tuple(kaze_breakdown(rounds, pid))
+        assert profile.streaks == streaks(rounds, pid)
+        assert profile.point_by_rank == point_by_rank(rounds, pid)
+        for window in (1, 3, 10):
+            assert profile.rank_trend(window) == rank_trend(rounds, pid, window)
+
+
+def test_profiles_of_no_rounds_is_empty():
+    from mahjong.stats import profiles
+
+    assert profiles([]) == {}
+
+
+def test_profiles_cannot_be_changed_through_a_shared_copy():
+    """profiles() の結果は共有キャッシュに載る。1人が書き換えると全員の画面が変わる。"""
+    from mahjong.stats import profiles
+
+    found = profiles([random_entries(random.Random(5), 1)])
+    profile = next(iter(found.values()))
+
+    with pytest.raises(TypeError):
+        profile.point_by_rank[1] = 0.0
+
+
+def test_profiles_pair_every_table_both_ways():
+    """相性の表は、同卓した組の両側から同じ同卓数が見える。"""
+    from mahjong.stats import profiles
+
+    rng = random.Random(3)
+    rounds = [random_entries(rng, 1) for _ in range(40)]
+
+    found = profiles(rounds)
+    games = {(pid, o.player_id): o for pid, p in found.items() for o in p.opponents}
+
+    for (me, other), opponent in games.items():
+        back = games[(other, me)]
+        assert opponent.games == back.games
+        assert opponent.beat + back.beat <= opponent.games
+        assert opponent.my_avg_point == opponent.my_total_point / opponent.games
+
+
+# --- 調子の推移（columnar.form） ---------------------------------------------
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_form_matches_the_one_player_trend(seed):
+    from mahjong.stats import rank_trend
+
+    rng = random.Random(seed)
+    rounds = [random_entries(rng, 1) for _ in range(rng.randint(0, 50))]
+    entries = [e for entries in rounds for e in entries]
+    windows = (1, 3, 10)
+
+    form = columnar.form(columnar.EntryColumns.from_entries(entries), 4, windows)
+
+    for window in windows:
+        by_player: dict[str, list[tuple[int, float]]] = {}
+        found = form.frame("rank", window)
+        for pid, game, value in zip(found["player_id"], found["game"], found["value"]):
+            by_player.setdefault(pid, []).append((game, value))
+        for pid, series in by_player.items():
+            assert [g for g, _ in series] == list(range(1, len(series) + 1))
+            assert [v for _, v in series] == rank_trend(rounds, pid, window)
+
+
+def test_form_rates_and_smoothing_follow_each_player():
+    entries = [
+        RoundEntry("a", 1, 30, table_size=4), RoundEntry("b", 4, -30, table_size=4),
+        RoundEntry("a", 4, -20, table_size=0), RoundEntry("b", 1, 20, table_size=3),
+        RoundEntry("a", 1, 50, table_size=4), RoundEntry("b", 3, -10, table_size=3),
+    ]
+    form = columnar.form(columnar.EntryColumns.from_entries(entries), 4, (3,))
+
+    def values(metric, kind="mean"):
+        found = form.frame(metric, 3, kind)
+        return {
+            pid: [float(v) for p, v in zip(found["player_id"], found["value"]) if p == pid]
+            for pid in ("a", "b")
+        }
+
+    assert values("top") == {"a": [1, 0.5, 2 / 3], "b": [0, 0.5, 1 / 3]}
+    # table_size が無ければ player_count（4）でラスを判定する。b の3位は3人卓のラス
+    assert values("last") == {"a": [0, 0.5, 1 / 3], "b": [1, 0.5, 2 / 3]}
+    # α = 2 / (3 + 1) = 0.5。最初の半荘はその値そのもの
+    assert values("point", "ewma") == {"a": [30, 5, 27.5], "b": [-30, -5, -7.5]}
+
+
+def test_form_arrays_are_read_only():
+    form = columnar.form(columnar.EntryColumns.from_entries(random_entries(random.Random(2), 5)), 4)
+
+    for array in (form.player, form.game, form.mean[10], form.ewma[100]):
+        with pytest.raises(ValueError):
+            array[0] = 0
+    for by_window in (form.mean, form.ewma):
+        with pytest.raises(TypeError):
+            by_window[10] = form.mean[30]
@@ -11,6 +11,7 @@ import pathlib
 import pytest
 from streamlit.testing.v1 import AppTest
 
+from mahjong.repo import tournaments
 from mahjong.rules import PRESETS_3P
 from tests.fake_backend import FakeBackend, install
 
@@ -233,6 +234,105 @@ def test_winds_rotate_for_the_next_round(monkeypatch, backend):
     assert [s.value for s in new_round_winds(app)] == ["北", "東", "南", "西"]
 
 
+def test_offline_save_is_queued_and_sent_later(monkeypatch, backend):
+    """電波が無くても登録は受け付け、次の半荘に進める。戻ったら1件だけ送る。"""
+    from mahjong.errors import NetworkError
+    from mahjong.repo import games
+
+    app = run("views/game.py", monkeypatch, backend, game=backend.game_id)
+    online = backend.add_round
+
+    def offline(*args, **kwargs):
+        raise NetworkError("通信に失敗しました。")
+
+    monkeypatch.setattr(games, "add_round", offline)
+    for i, value in enumerate([40000, 30000, 20000]):
+        new_round_inputs(app)[i].set_value(value)
+    app = click(app, "半荘目を登録").click().run()
+
+    assert not app.exception
+    assert not backend.rounds
+    assert "保存待ちが 1 半荘" in texts(app)
+    assert any("2半荘目を登録" in b.label for b in app.button)  # 入力は次の半荘へ
+    assert [s.value for s in new_round_winds(app)] == ["北", "東", "南", "西"]
+
+    monkeypatch.setattr(games, "add_round", online)
+    app = click(app, "今すぐ送る").click().run()
+
+    assert len(backend.rounds) == 1
+    assert "保存待ち" not in texts(app)
+
+
+def batch_mode(monkeypatch, backend: FakeBackend) -> AppTest:
+    install(monkeypatch, backend)
+    app = AppTest.from_file(str(ROOT / "views/game.py"), default_timeout=TIMEOUT)
+    app.query_params["game"] = backend.game_id
+    app.session_state[f"entry_mode_{backend.game_id}"] = "まとめて（表）"
+    return app.run()
+
+
+def fill_sheet(app: AppTest, backend: FakeBackend, rows: dict[int, dict]) -> AppTest:
+    """まとめて入力の表に打つ。rows は 行番号 -> {列名: 値}。"""
+    app.session_state[f"batch_{backend.game_id}_0"] = {
+        "edited_rows": rows, "added_rows": [], "deleted_rows": [],
+    }
+    return app.run()
+
+
+def test_sheet_saves_many_rounds_in_one_call(monkeypatch, backend):
+    app = batch_mode(monkeypatch, backend)
+    assert not app.exception
+    names = [s["player_name"] for s in backend.games[0]["seats"]]
+
+    # 2行目は東家も最後の席も空ける: 東家は次の人、最後の席は合計から埋まる
+    app = fill_sheet(app, backend, {
+        0: {names[0]: 40000, names[1]: 30000, names[2]: 20000, names[3]: 10000},
+        1: {names[0]: 10000, names[1]: 50000, names[2]: 30000},
+    })
+    app = click(app, "2半荘をまとめて保存").click().run()
+
+    assert not app.exception
+    assert backend.calls.count("save_rounds") == 1
+    assert len(backend.rounds) == 2
+    second = sorted(backend.rounds[1]["results"], key=lambda r: r["seat"])
+    assert [r["kaze"] for r in second] == ["北", "東", "南", "西"]
+    assert [r["raw_score"] for r in second] == [10000, 50000, 30000, 10000]
+    assert any("2半荘を追加" in s.value for s in app.success)
+
+
+def test_sheet_blocks_saving_while_a_row_is_wrong(monkeypatch, backend):
+    app = batch_mode(monkeypatch, backend)
+    names = [s["player_name"] for s in backend.games[0]["seats"]]
+
+    app = fill_sheet(app, backend, {
+        0: {names[0]: 40000, names[1]: 30000, names[2]: 20000, names[3]: 20000},
+        1: {names[0]: 40000},
+    })
+
+    assert any(e.value.startswith("1行目") for e in app.error)
+    assert any(e.value.startswith("2行目") and "空欄" in e.value for e in app.error)
+    assert click(app, "保存できません").disabled
+    assert not backend.rounds
+
+
+def test_sheet_replaces_only_the_edited_saved_round(monkeypatch, backend):
+    app = run("views/game.py", monkeypatch, backend, game=backend.game_id)
+    for i, value in enumerate([40000, 30000, 20000]):
+        new_round_inputs(app)[i].set_value(value)
+    app = click(app, "半荘目を登録").click().run()
+    app.session_state[f"entry_mode_{backend.game_id}"] = "まとめて（表）"
+    app = app.run()
+    assert click(app, "保存する行がありません").disabled  # 触っていない行は送らない
+
+    name = backend.games[0]["seats"][3]["player_name"]
+    first = backend.games[0]["seats"][0]["player_name"]
+    app = fill_sheet(app, backend, {0: {first: 30000, name: 20000}})
+    app = click(app, "1半荘をまとめて保存").click().run()
+
+    assert len(backend.rounds) == 1
+    assert [r["raw_score"] for r in backend.rounds[0]["results"]] == [30000, 30000, 20000, 20000]
+
+
 # --- ライブ計算 -------------------------------------------------------------
 
 
@@ -483,6 +583,7 @@ def test_stats_page_with_records(monkeypatch, backend):
     app = run("views/stats.py", monkeypatch, backend, group=backend.group_id)
     assert not app.exception
     assert "総合" in texts(app)
+    assert "調子の推移" in texts(app)
 
 
 def test_delete_needs_two_steps_and_then_deletes(monkeypatch, backend):
@@ -633,10 +734,10 @@ def test_stats_aggregates_the_tournament_named_in_the_url(monkeypatch, backend):
     from mahjong.repo import queries
 
     seen: list[tuple[str, str]] = []
-    original = queries.fetch_entries
+    original = queries.fetch_entry_columns
     monkeypatch.setattr(
         queries,
-        "fetch_entries",
+        "fetch_entry_columns",
         lambda scope, value: (seen.append((scope, value)), original(scope, value))[1],
     )
 
@@ -707,3 +808,17 @@ def test_members_page_survives_an_unexpected_role(monkeypatch, backend, role):
 
     app = run("views/members.py", monkeypatch, backend)
     assert not app.exception, f"メンバー画面が落ちた: {app.exception}"
+
+
+def test_tournaments_page_shows_the_overview_counts(monkeypatch, backend):
+    """大会一覧は要約の1行だけで描く。大会ごとの開催日・半荘の読み取りはしない。"""
+    monkeypatch.setattr(
+        tournaments, "list_days", lambda tid: pytest.fail("大会ごとに開催日を読んだ")
+    )
+    backend.add_round(backend.game_id, [], {})
+
+    app = run("views/tournaments.py", monkeypatch, backend)
+
+    assert not app.exception
+    shown = {m.label: m.value for m in app.metric}
+    assert (shown["開催日"], shown["半荘"]) == ("1", "1")
@@ -10,7 +10,7 @@ from __future__ import annotations
 
 import streamlit as st
 
-from mahjong import session, ui
+from mahjong import repo, session, ui
 from mahjong.errors import AppError
 from mahjong.repo import SeatSpec
 from mahjong.repo import games as games_repo
@@ -39,10 +39,14 @@ if not day or day["group_id"] != group["group_id"]:
 
 tournament_id = day["tournament_id"]
 try:
-    tournament = tournaments_repo.get_tournament(tournament_id)
-    rules, _ = tournaments_repo.get_ruleset(tournament_id)
-    players = groups_repo.list_players(group["group_id"])
-    day_games = games_repo.list_games(day_id)
+    found = repo.gather(
+        tournament=lambda: tournaments_repo.get_tournament(tournament_id),
+        ruleset=lambda: tournaments_repo.get_ruleset(tournament_id),
+        players=lambda: groups_repo.list_players(group["group_id"]),
+        day_games=lambda: games_repo.list_games(day_id),
+    )
+    tournament, players, day_games = found["tournament"], found["players"], found["day_games"]
+    rules, _ = found["ruleset"]
 except AppError as exc:
     st.error(str(exc))
     st.stop()
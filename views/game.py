@@ -18,6 +18,10 @@
       （供託が残る卓だけ、明示的に許可すれば押せる）
     * 保存が成功したときだけ入力欄を初期化する
       （`clear_on_submit` は失敗時にも消してしまうので使わない）
+    * 電波が切れていても登録ボタンは効く。結果は「保存待ち」に積み
+      （`repo.outbox`）、つながったら古い順に送る。次の半荘の入力はそのまま進められる
+    * 紙の記録表を写すときは「まとめて」の表に全部打ち、1回で保存する
+      （`games.save_rounds()`。1半荘ずつ送って再実行するのを繰り返さない）
 """
 
 from __future__ import annotations
@@ -25,13 +29,15 @@ from __future__ import annotations
 from typing import Callable, Sequence
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 from mahjong import session, ui
 from mahjong.errors import AppError
 from mahjong.repo import games as games_repo
+from mahjong.repo import outbox
 from mahjong.repo import tournaments as tournaments_repo
 from mahjong.rules import KAZE_NAMES
-from mahjong.scoring import ScoringError, SeatResult, calc_round
+from mahjong.scoring import ScoringError, SeatResult, calc_round, calc_sheet
 from mahjong.timeutil import format_time
 
 ui.show_flashes()
@@ -235,22 +241,48 @@ def next_kazes() -> list[str]:
     前回の北家が次の親になってしまうため -1 を渡す。
     """
     base = list(KAZE_NAMES[: len(seats)])
-    if not rounds:
+    queued = outbox.pending(game_id)
+    if queued:
+        # 保存待ちの半荘も打ち終えた半荘なので、いちばん新しいものからずらす
+        previous = [r.kaze for r in sorted(queued[-1].results, key=lambda x: x.seat)]
+    elif rounds:
+        previous = [r["kaze"] for r in sorted(rounds[-1]["results"], key=lambda x: x["seat"])]
+    else:
         return base
-    previous = [r["kaze"] for r in sorted(rounds[-1]["results"], key=lambda x: x["seat"])]
     if sorted(previous) != sorted(base):
         return base
     return ui.kaze_rotated(previous, -1)
 
 
 def save_new(results: list[SeatResult]) -> None:
-    try:
-        games_repo.add_round(game_id, results, seat_to_player)
-    except AppError as exc:
-        st.error(str(exc))
-        return
-    ui.flash(f"{len(rounds) + 1}半荘目を登録しました。")
-    st.rerun()
+    # まず保存待ちに積む。送れなくても入力は失われず、次の半荘に進める。
+    outbox.enqueue(game_id, results, seat_to_player)
+    send_pending(force=True)
+
+
+def send_pending(force: bool = False) -> None:
+    """保存待ちを送る。1件でも送れたら記録を読み直すため全体を再実行する。"""
+    done = outbox.flush(force=force)
+    for _, reason in done.rejected:
+        ui.flash(f"保存待ちの半荘を登録できませんでした: {reason}", "error")
+    if done.sent:
+        upto = "を" if done.sent == 1 else "まで"
+        ui.flash(f"{len(rounds) + done.sent}半荘目{upto}登録しました。")
+    if done.sent or done.rejected:
+        st.rerun()
+    if force:
+        # 送れなかった。入力欄だけ次の半荘に切り替える（ページ全体の読み込みは通信が要る）
+        rerun_entry_area()
+
+
+def rerun_entry_area() -> None:
+    """入力欄の部分だけ再実行する。
+
+    scope="fragment" はその部分の再実行中にしか使えないので、ページ全体を流している回
+    （テストや、部分の再実行が全体の再実行に吸収されたとき）は全体を再実行する。
+    """
+    ctx = get_script_run_ctx(suppress_warning=True)
+    st.rerun(scope="fragment" if ctx is not None and ctx.fragment_ids_this_run else "app")
 
 
 def make_saver(round_id: str, no: int) -> Callable[[list[SeatResult]], None]:
@@ -266,20 +298,62 @@ def make_saver(round_id: str, no: int) -> Callable[[list[SeatResult]], None]:
     return save_edit
 
 
+def pending_area(queued: list[outbox.PendingRound]) -> None:
+    """保存待ちの半荘。送れるまで、打った内容をここに出しておく。"""
+    st.warning(
+        f"保存待ちが {len(queued)} 半荘あります。電波が戻ったら古い順に自動で送ります。"
+        "このままスコア入力を続けて大丈夫です。"
+    )
+    for no, entry in enumerate(queued, start=len(rounds) + 1):
+        summary = "  ".join(
+            f"{player_names.get(seat_to_player.get(r.seat), '?')} {ui.format_point(r.point)}"
+            for r in sorted(entry.results, key=lambda x: x.seat)
+        )
+        cols = st.columns([5, 1], vertical_alignment="center")
+        cols[0].caption(f"⏳ {no}半荘目（{format_time(entry.queued_at)}） {summary}")
+        if cols[1].button("取消", key=f"outbox_discard_{entry.key}"):
+            outbox.discard(entry.key)
+            rerun_entry_area()
+    if st.button("今すぐ送る", key=f"outbox_send_{game_id}", width="stretch"):
+        send_pending(force=True)
+
+
+ENTRY_MODES = ("1半荘ずつ", "まとめて（表）")
+
+
 @st.fragment
 def entry_area() -> None:
+    ui.show_flashes()
+    mode = st.segmented_control(
+        "入力方法", ENTRY_MODES, default=ENTRY_MODES[0], key=f"entry_mode_{game_id}",
+        label_visibility="collapsed",
+    )
+    if mode == ENTRY_MODES[1]:
+        batch_area()
+        return
+
+    # 入力欄を触るたびにここが再実行されるので、そのついでに保存待ちを送ってみる。
+    # 直前に失敗していれば、outbox が一定時間は送らずに返す。
+    if outbox.pending(game_id):
+        send_pending()
+    queued = outbox.pending(game_id)
+    entered = len(rounds) + len(queued)
+
     st.markdown("### 今回の持ち点を入力")
 
-    # 半荘を1つ保存するたびにキーが変わるので、入力欄は自動的に初期値へ戻る。
-    # 逆に、保存に失敗している間はキーが変わらないので打った値が消えない。
+    # 半荘を1つ登録する（保存待ちに積む）たびにキーが変わるので、入力欄は自動的に
+    # 初期値へ戻る。逆に、計算できずに登録できない間はキーが変わらないので打った値が消えない。
     score_entry(
-        key=f"new_{game_id}_{len(rounds)}",
+        key=f"new_{game_id}_{entered}",
         base_kazes=next_kazes(),
         base_scores=[rules.start_score] * len(seats),
-        submit_label=f"{len(rounds) + 1}半荘目を登録",
+        submit_label=f"{entered + 1}半荘目を登録",
         on_save=save_new,
     )
 
+    if queued:
+        pending_area(queued)
+
     if not rounds:
         st.info("まだ半荘の記録がありません。")
         return
@@ -350,4 +424,132 @@ def entry_area() -> None:
                     st.rerun()
 
 
+# --- まとめて入力（記録表の写し） -------------------------------------------
+# 表の1行が1半荘。保存済みの半荘も行として並べ、書き換えた行だけ差し替える。
+# 別のフラグメントにはせず、entry_area() の中で切り替える（上の注意と同じ理由）。
+
+BATCH_BLANK_ROWS = 8
+
+
+def dealer_of(rnd: dict) -> int:
+    """保存済みの半荘の東家の、席の並びでの位置。"""
+    east = next((r["seat"] for r in rnd["results"] if r["kaze"] == "東"), seat_indexes[0])
+    return seat_indexes.index(east) if east in seat_indexes else 0
+
+
+def cell(value: object) -> int | None:
+    """表のセルの値。空欄は None（data_editor は数値を float で返し、空欄は None か NaN）。"""
+    if value is None or value != value:
+        return None
+    return int(value)
+
+
+def batch_area() -> None:
+    st.markdown("### まとめて入力・修正")
+    if outbox.pending(game_id):
+        st.info("保存待ちの半荘があります。「1半荘ずつ」の画面で送ってから使ってください。")
+        return
+    st.caption(
+        "紙の記録を写すとき用です。1行が1半荘で、空欄の行は無視します。"
+        "東家を空けた行は前の行の次の人、最後の席を空けた行は合計から自動で埋めます。"
+        "保存済みの行を書き換えると、その半荘を差し替えます（削除は「1半荘ずつ」の画面から）。"
+    )
+
+    names = ui.unique_labels([s["player_name"] for s in seats])
+    stored = [
+        {
+            "_id": rnd["id"],
+            "回": rnd["no"],
+            "東家": names[dealer_of(rnd)],
+            **{
+                names[seat_indexes.index(r["seat"])]: r["raw_score"]
+                for r in rnd["results"]
+                if r["seat"] in seat_indexes
+            },
+        }
+        for rnd in rounds
+    ]
+    blank = {"_id": None, "回": None, "東家": None, **{name: None for name in names}}
+
+    # 保存が成功するたびに世代を進め、表を保存済みの内容から作り直す
+    generation = st.session_state.get(f"batch_gen_{game_id}", 0)
+    edited = st.data_editor(
+        stored + [dict(blank) for _ in range(BATCH_BLANK_ROWS)],
+        key=f"batch_{game_id}_{generation}",
+        num_rows="add",
+        hide_index=True,
+        column_config={
+            "_id": None,
+            "回": st.column_config.NumberColumn(disabled=True),
+            "東家": st.column_config.SelectboxColumn(options=names),
+            **{name: st.column_config.NumberColumn(step=100, format="%d") for name in names},
+        },
+    )
+    allow_mismatch = st.checkbox(
+        "合計が合わない行（供託が残った半荘）もそのまま登録する",
+        value=False,
+        key=f"batch_mismatch_{game_id}",
+    )
+
+    lines = calc_sheet(
+        [[cell(row.get(name)) for name in names] for row in edited],
+        [names.index(row["東家"]) if row.get("東家") in names else None for row in edited],
+        rules,
+        seats=seat_indexes,
+        strict=not allow_mismatch,
+    )
+
+    to_save: list[tuple[str | None, list[SeatResult]]] = []
+    preview_rows = []
+    errors = []
+    for line in lines:
+        round_id = stored[line.row]["_id"] if line.row < len(stored) else None
+        if round_id is not None and same_row(stored[line.row], edited[line.row], names):
+            # 触っていない保存済みの行。供託で合計が合わない行もここで素通りさせる
+            continue
+        if line.error is not None:
+            errors.append(f"{line.row + 1}行目: {line.error}")
+            continue
+        to_save.append((round_id, line.results))
+        row = {"行": line.row + 1, "": "差し替え" if round_id else "追加"}
+        for name, r in zip(names, line.results):
+            row[name] = f"{r.rank}位 {ui.format_point(r.point)}"
+        preview_rows.append(row)
+
+    for message in errors:
+        st.error(message)
+    if preview_rows:
+        st.dataframe(preview_rows, hide_index=True)
+
+    if errors:
+        label = f"直す行が{len(errors)}つあるので保存できません"
+    elif to_save:
+        label = f"{len(to_save)}半荘をまとめて保存"
+    else:
+        label = "保存する行がありません"
+    if st.button(
+        label,
+        key=f"batch_save_{game_id}",
+        type="primary",
+        width="stretch",
+        disabled=bool(errors) or not to_save,
+    ):
+        try:
+            games_repo.save_rounds(game_id, to_save, seat_to_player)
+        except AppError as exc:
+            st.error(str(exc))
+            return
+        st.session_state[f"batch_gen_{game_id}"] = generation + 1
+        added = sum(1 for round_id, _ in to_save if round_id is None)
+        ui.flash(f"{added}半荘を追加し、{len(to_save) - added}半荘を差し替えました。")
+        st.rerun()
+
+
+def same_row(before: dict, after: dict, names: list[str]) -> bool:
+    """表の行が保存済みのまま（持ち点も東家も書き換えていない）か。"""
+    return before["東家"] == after.get("東家") and all(
+        cell(before.get(name)) == cell(after.get(name)) for name in names
+    )
+
+
 entry_area()
@@ -8,12 +8,12 @@ from __future__ import annotations
 
 import streamlit as st
 
-from mahjong import session, ui
+from mahjong import repo, session, ui
 from mahjong.errors import AppError
 from mahjong.repo import games as games_repo
 from mahjong.repo import groups as groups_repo
 from mahjong.repo import queries, tournaments as tournaments_repo
-from mahjong.stats import aggregate
+from mahjong.stats import from_tallies, round_count
 from mahjong.timeutil import format_jst
 
 ui.show_flashes()
@@ -41,10 +41,19 @@ if not tournaments:
 # 直近に対戦が行われた開催日を探して、そこへの導線を最上段に出す。
 
 latest = tournaments[0]
-try:
-    recent_games = games_repo.list_games_in_tournament(latest["id"])
-except AppError as exc:
-    st.error(str(exc))
+# ここから下の読み取りは互いに依存しないので、まとめて投げて一番遅い1本だけ待つ。
+# 卓の一覧が読めなくても成績は出したいので、失敗はそれぞれの場所で扱う。
+found = repo.gather(
+    recent_games=lambda: games_repo.list_games_in_tournament(latest["id"]),
+    standings=lambda: queries.fetch_standings("group_id", group["group_id"]),
+    names=lambda: groups_repo.player_names(group["group_id"]),
+    ruleset=lambda: tournaments_repo.get_ruleset(latest["id"]),
+    return_exceptions=True,
+)
+
+recent_games = found["recent_games"]
+if isinstance(recent_games, AppError):
+    st.error(str(recent_games))
     recent_games = []
 
 if recent_games:
@@ -63,19 +72,21 @@ if recent_games:
 # --- 自分の成績 -------------------------------------------------------------
 
 st.markdown("### 📊 このグループの通算成績")
-try:
-    entries = queries.fetch_entries("group_id", group["group_id"])
-    names = groups_repo.player_names(group["group_id"])
-except AppError as exc:
-    st.error(str(exc))
+failed = next((found[k] for k in ("standings", "names") if isinstance(found[k], AppError)), None)
+if failed:
+    st.error(str(failed))
     st.stop()
+standings, names = found["standings"], found["names"]
 
-if not entries:
+if not standings:
     st.info("まだ対戦記録がありません。")
 else:
     # 通算表示なので、レートは直近の大会のものを借りる（金額列の有無だけに使う）
-    rules, _ = tournaments_repo.get_ruleset(latest["id"])
-    stats = aggregate(entries, names, rules)
+    if isinstance(found["ruleset"], AppError):
+        st.error(str(found["ruleset"]))
+        st.stop()
+    rules, _ = found["ruleset"]
+    stats = from_tallies(standings, names, rules)
     me = next((s for s in stats if s.player_id == group.get("my_player_id")), None)
     if me and me.games:
         col1, col2, col3 = st.columns(3)
@@ -84,7 +95,7 @@ else:
         col3.metric("平均順位", f"{me.avg_rank:.2f}")
     ui.stats_table(stats, rules, key="home_stats")
 
-    st.caption(f"全 {queries.count_rounds('group_id', group['group_id'])} 半荘")
+    st.caption(f"全 {round_count(standings)} 半荘")
 
 
 # --- 大会一覧（抜粋） -------------------------------------------------------
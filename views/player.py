@@ -9,24 +9,14 @@
 
 from __future__ import annotations
 
-import altair as alt
-import pandas as pd
 import streamlit as st
 
-from mahjong import session, ui
+from mahjong import repo, session, ui
 from mahjong.errors import AppError
 from mahjong.repo import groups as groups_repo
 from mahjong.repo import queries, tournaments as tournaments_repo
 from mahjong.rules import DEFAULT_RULESET
-from mahjong.stats import (
-    aggregate,
-    head_to_head,
-    kaze_breakdown,
-    player_rounds,
-    point_by_rank,
-    rank_trend,
-    streaks,
-)
+from mahjong.stats import from_tallies
 
 ui.show_flashes()
 group = session.require_group()
@@ -34,8 +24,11 @@ group = session.require_group()
 st.title("🧑 個人成績")
 
 try:
-    names = groups_repo.player_names(group["group_id"])
-    tournaments = tournaments_repo.list_tournaments(group["group_id"])
+    found = repo.gather(
+        names=lambda: groups_repo.player_names(group["group_id"]),
+        tournaments=lambda: tournaments_repo.list_tournaments(group["group_id"]),
+    )
+    names, tournaments = found["names"], found["tournaments"]
 except AppError as exc:
     st.error(str(exc))
     st.stop()
@@ -75,26 +68,33 @@ with col2:
     target_id, scope, _ = next(c for c in scope_choices if c[0] == chosen_scope_id)
 
 value = group["group_id"] if scope == "group_id" else target_id
-if scope == "group_id":
-    rules = DEFAULT_RULESET
-    if tournaments:
-        rules, _ = tournaments_repo.get_ruleset(tournaments[0]["id"])
-else:
-    rules, _ = tournaments_repo.get_ruleset(target_id)
+# 通算のときはルールが無いので、レート表示だけ直近の大会に合わせる
+rules_from = target_id if scope != "group_id" else (tournaments[0]["id"] if tournaments else None)
 
+# 掘り下げは範囲内の全員分をまとめて作ってある（queries.fetch_profiles）。
+# プレイヤーを切り替えても、ここは辞書を引くだけで全半荘をなめ直さない。
 try:
-    rounds = queries.fetch_rounds_in_order(scope, value)
+    found = repo.gather(
+        profiles=lambda: queries.fetch_profiles(scope, value),
+        standings=lambda: queries.fetch_standings(scope, value),
+        ruleset=lambda: (
+            tournaments_repo.get_ruleset(rules_from) if rules_from else (DEFAULT_RULESET, [])
+        ),
+    )
 except AppError as exc:
     st.error(str(exc))
     st.stop()
+rules, _ = found["ruleset"]
 
-mine = player_rounds(rounds, player_id)
-if not mine:
+profile = found["profiles"].get(player_id)
+if profile is None:
     st.info(f"{names[player_id]} さんの記録はこの範囲にはまだありません。")
     st.stop()
+mine = profile.rounds
 
-entries = [e for rnd in rounds for e in rnd]
-me = next(s for s in aggregate(entries, names, rules) if s.player_id == player_id)
+me = next(
+    s for s in from_tallies(found["standings"], names, rules) if s.player_id == player_id
+)
 
 
 # --- サマリー ---------------------------------------------------------------
@@ -117,7 +117,7 @@ col2.metric("最低", ui.format_point(me.worst_point))
 if rules.rate:
     col3.metric("収支", ui.format_money(me.money))
 
-run = streaks(rounds, player_id)
+run = profile.streaks
 col1, col2, col3 = st.columns(3)
 col1.metric("最長連続トップ", f"{run.longest_top}")
 col2.metric("最長連続ラス", f"{run.longest_last}")
@@ -135,10 +135,15 @@ tab_trend, tab_rank, tab_vs, tab_kaze, tab_log = st.tabs(
 
 # --- 調子 -------------------------------------------------------------------
 
+# pandas と altair は読み込みに1秒近くかかる。先頭で読むと、ここまでの指標まで
+# 出るのが遅れるので、グラフの直前で読む（Streamlit は上から順に画面へ送る）。
+import altair as alt  # noqa: E402
+import pandas as pd  # noqa: E402
+
 with tab_trend:
     st.caption("直近の平均着順の推移。下にあるほど good（1位に近い）。")
     window = st.slider("移動平均の窓（半荘）", 3, 30, 10, key="player_window")
-    trend = rank_trend(rounds, player_id, window=window)
+    trend = profile.rank_trend(window)
     frame = pd.DataFrame({"半荘": range(1, len(trend) + 1), "平均着順": trend})
     line = (
         alt.Chart(frame)
@@ -188,7 +193,7 @@ with tab_rank:
     st.altair_chart(bars, width="stretch")
 
     st.caption("着順ごとの平均ポイント。トップは取れているのにラスが重い、などが見える。")
-    by_rank = point_by_rank(rounds, player_id)
+    by_rank = profile.point_by_rank
     st.dataframe(
         [
             {
@@ -210,7 +215,7 @@ with tab_vs:
         "「勝率」は相手より上の着順で終えた割合。"
     )
     rows = []
-    for opponent in head_to_head(rounds, player_id):
+    for opponent in profile.opponents:
         rows.append(
             {
                 "相手": names.get(opponent.player_id, "(不明)"),
@@ -230,7 +235,7 @@ with tab_vs:
 
 with tab_kaze:
     st.caption("風（席）別の成績。起家に近いほど有利、といった偏りが見える。")
-    kaze_rows = kaze_breakdown(rounds, player_id)
+    kaze_rows = profile.kaze
     if not kaze_rows:
         st.info("風の記録がありません。")
     else:
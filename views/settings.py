@@ -1,4 +1,4 @@
-"""設定。グループ名、大会のルール、削除。
+"""設定。グループ名、大会のルール、削除、記録の書き出し。
 
 ルールを変えても過去の記録は自動では変わらない。変えたければ「再計算」を押す。
 再計算は保存済みの持ち点(raw_score)から全半荘を計算し直し、
@@ -13,7 +13,7 @@ from __future__ import annotations
 
 import streamlit as st
 
-from mahjong import session, ui
+from mahjong import export, repo, session, ui
 from mahjong.errors import AppError
 from mahjong.repo import groups as groups_repo
 from mahjong.repo import queries, tournaments as tournaments_repo
@@ -209,6 +209,28 @@ with tab_group:
                 ui.flash("グループの設定を保存しました。")
                 st.rerun()
 
+    st.markdown("#### 記録の書き出し")
+    st.caption(
+        "バックアップや手元での分析用に、グループの記録を表ごとに書き出します。"
+        "何年分もあるときは `python -m mahjong.export` の方が速く、メモリも使いません。"
+    )
+    col1, col2 = st.columns(2)
+    dataset = col1.selectbox(
+        "表", list(export.DATASETS), format_func=lambda k: export.DATASETS[k].label,
+        key="export_dataset",
+    )
+    fmt = col2.selectbox("形式", list(export.FORMATS), format_func=str.upper, key="export_format")
+    group_id = group["group_id"]
+    # 押されたときに初めて読む。再実行のたびに作り直さない。
+    st.download_button(
+        "ダウンロード",
+        repo.deferred(lambda: export.export_bytes(group_id, dataset, fmt)),
+        file_name=export.file_name(dataset, fmt),
+        mime=export.FORMATS[fmt][1],
+        key="export_download",
+        width="stretch",
+    )
+
     st.markdown("#### 別のグループ")
     ui.link_button(
         "グループを作る／招待コードで参加する", "views/onboarding.py",
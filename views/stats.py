@@ -6,16 +6,17 @@
 
 from __future__ import annotations
 
-import altair as alt
-import pandas as pd
+import csv
+import io
+
 import streamlit as st
 
-from mahjong import session, ui
+from mahjong import repo, session, ui
 from mahjong.errors import AppError
 from mahjong.repo import groups as groups_repo
 from mahjong.repo import queries, tournaments as tournaments_repo
 from mahjong.rules import DEFAULT_RULESET
-from mahjong.stats import aggregate, cumulative_series, head_to_head
+from mahjong.stats import aggregate, cumulative_series
 
 ui.show_flashes()
 group = session.require_group()
@@ -23,8 +24,11 @@ group = session.require_group()
 st.title("📊 成績")
 
 try:
-    tournaments = tournaments_repo.list_tournaments(group["group_id"])
-    names = groups_repo.player_names(group["group_id"])
+    found = repo.gather(
+        tournaments=lambda: tournaments_repo.list_tournaments(group["group_id"]),
+        names=lambda: groups_repo.player_names(group["group_id"]),
+    )
+    tournaments, names = found["tournaments"], found["names"]
 except AppError as exc:
     st.error(str(exc))
     st.stop()
@@ -60,9 +64,16 @@ if scope == "group_id":
         rules, _ = tournaments_repo.get_ruleset(tournaments[0]["id"])
 else:
     value = target_id
-    rules, _ = tournaments_repo.get_ruleset(target_id)
-
-    days = tournaments_repo.list_days(target_id)
+    try:
+        found = repo.gather(
+            ruleset=lambda: tournaments_repo.get_ruleset(target_id),
+            days=lambda: tournaments_repo.list_days(target_id),
+        )
+    except AppError as exc:
+        st.error(str(exc))
+        st.stop()
+    rules, _ = found["ruleset"]
+    days = found["days"]
     if days:
         ALL_DAYS = ""
         day_labels = ["すべての開催日"] + [
@@ -80,13 +91,13 @@ else:
             scope, value = "day_id", chosen_day
 
 try:
-    entries = queries.fetch_entries(scope, value)
+    entries = queries.fetch_entry_columns(scope, value)
     rounds = queries.fetch_rounds_in_order(scope, value)
 except AppError as exc:
     st.error(str(exc))
     st.stop()
 
-if not entries:
+if not len(entries):
     st.info("この範囲にはまだ記録がありません。")
     st.stop()
 
@@ -104,9 +115,21 @@ col3.metric("首位", played[0].name if played else "-")
 st.markdown("### 総合")
 ui.stats_table(stats, rules, key="stats_main")
 
+
+def stats_csv() -> str:
+    csv_rows = ui.stats_table_rows(stats, rules, detailed=True)
+    text = io.StringIO()
+    fieldnames = list(csv_rows[0]) if csv_rows else []
+    writer = csv.DictWriter(text, fieldnames=fieldnames, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(csv_rows)
+    return text.getvalue()
+
+
+# 押されたときに初めて作る。旧実装は再実行のたびに全員分を文字列にしていた。
 st.download_button(
     "CSVでダウンロード",
-    pd.DataFrame(ui.stats_table_rows(stats, rules, detailed=True)).to_csv(index=False),
+    stats_csv,
     file_name="mahjong_stats.csv",
     mime="text/csv",
     width="stretch",
@@ -115,6 +138,13 @@ st.download_button(
 
 # --- 推移 -------------------------------------------------------------------
 
+# pandas と altair は読み込みに1秒近くかかる。先頭で読むと、ここまでの表と指標まで
+# 出るのが遅れるので、グラフの直前で読む（Streamlit は上から順に画面へ送る）。
+import altair as alt  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from mahjong.columnar import FORM_WINDOWS  # noqa: E402
+
 st.markdown("### ポイントの推移")
 
 series = cumulative_series(rounds, {s.player_id: s.name for s in played})
@@ -138,6 +168,65 @@ chart = (
 st.altair_chart(chart, width="stretch")
 
 
+# --- 調子の推移 -------------------------------------------------------------
+
+st.markdown("### 調子の推移")
+
+# 全員・全指標・全窓の推移をまとめて作ってある（queries.fetch_form）。
+# 切り替えても作り直さず、選んだ1本ぶんを取り出すだけ。
+FORM_METRICS = {"rank": "平均着順", "point": "平均ポイント", "top": "トップ率", "last": "ラス率"}
+col1, col2, col3 = st.columns(3)
+with col1:
+    form_metric = ui.select_one(
+        "指標", list(FORM_METRICS), list(FORM_METRICS.values()),
+        key="stats_form_metric", radio=True, horizontal=True,
+    )
+with col2:
+    form_window = ui.select_one(
+        "窓", list(FORM_WINDOWS), [f"{w}半荘" for w in FORM_WINDOWS],
+        key="stats_form_window", radio=True, horizontal=True,
+    )
+with col3:
+    form_kind = ui.select_one(
+        "平らし方", ["mean", "ewma"], ["移動平均", "指数平滑"],
+        key="stats_form_kind", radio=True, horizontal=True,
+    )
+
+try:
+    form = queries.fetch_form(scope, value, rules.player_count)
+except AppError as exc:
+    st.error(str(exc))
+    st.stop()
+
+trend = pd.DataFrame(form.frame(form_metric, form_window, form_kind))
+trend = trend[trend["player_id"].isin({s.player_id for s in played})]
+# 何千半荘もあるグループ通算で全点を送ると描画が重い。1人あたり300点ほどに間引き、
+# 最新の1点は必ず残す。
+step = max(1, -(-int(trend["game"].max()) // 300)) if len(trend) else 1
+latest = trend.groupby("player_id")["game"].transform("max")
+trend = trend[(trend["game"] % step == 0) | (trend["game"] == latest)]
+trend = trend.assign(プレイヤー=trend["player_id"].map(names).fillna("?")).rename(
+    columns={"game": "半荘", "value": FORM_METRICS[form_metric]}
+)
+y = alt.Y(
+    f"{FORM_METRICS[form_metric]}:Q",
+    # 着順は小さいほど良いので軸を反転させる
+    scale=alt.Scale(reverse=form_metric == "rank", zero=False),
+    axis=alt.Axis(format=".0%") if form_metric in ("top", "last") else alt.Axis(),
+)
+form_chart = (
+    alt.Chart(trend)
+    .mark_line()
+    .encode(
+        x=alt.X("半荘:Q", title="その人の何半荘目か"),
+        y=y,
+        color=alt.Color("プレイヤー:N", title=None),
+        tooltip=["プレイヤー", "半荘", alt.Tooltip(f"{FORM_METRICS[form_metric]}:Q", format=".2f")],
+    )
+)
+st.altair_chart(form_chart, width="stretch")
+
+
 # --- 順位分布 ---------------------------------------------------------------
 
 st.markdown("### 順位の分布")
@@ -165,15 +254,78 @@ st.altair_chart(bars, width="stretch")
 # --- 対戦相手ごとの相性 -----------------------------------------------------
 
 st.markdown("### 相性")
-st.caption("行の人から見て、列の人と同卓したときの平均着順。低いほど勝てている。")
-
-matrix = []
-for me in played:
-    row = {"": me.name}
-    for opponent in head_to_head(rounds, me.player_id):
-        row[names.get(opponent.player_id, "?")] = round(opponent.my_avg_rank, 2)
-    matrix.append(row)
-st.dataframe(matrix, hide_index=True)
+st.caption(
+    "行の人から見て、列の人と同卓したときの平均着順。緑ほど勝てている。"
+    "同卓していない組は空白。"
+)
+
+# 旧実装は参加者ごとに head_to_head() を呼び、そのたびに全半荘をなめていた
+# （参加者が100人を超えるグループでは人数×半荘数）。全員分の相手別成績は
+# 個人成績の画面と同じ queries.fetch_profiles() が1周で作って共有キャッシュに
+# 載せているので、ここでは同卓した組だけを1マスずつ並べる。
+try:
+    found_profiles = queries.fetch_profiles(scope, value)
+except AppError as exc:
+    st.error(str(exc))
+    st.stop()
+
+# 行と列は同じ player_id → 表示名 の対応で書く。片方だけ names から引くと、
+# 同名の2人が1行にまとまったり、行と列で別の名前になったりする。
+# 集計範囲に居ない相手（範囲外で同卓した人など）は列の後ろに並べる。
+label_ids = list(
+    dict.fromkeys(
+        [s.player_id for s in played]
+        + [
+            opponent.player_id
+            for s in played
+            if s.player_id in found_profiles
+            for opponent in found_profiles[s.player_id].opponents
+        ]
+    )
+)
+played_names = {s.player_id: s.name for s in played}
+label_of = dict(
+    zip(
+        label_ids,
+        ui.unique_labels([played_names.get(i) or names.get(i, "?") for i in label_ids]),
+    )
+)
+order = [label_of[s.player_id] for s in played]
+cells = pd.DataFrame(
+    [
+        {
+            "本人": label_of[s.player_id],
+            "相手": label_of[opponent.player_id],
+            "同卓": opponent.games,
+            "平均着順": round(opponent.my_avg_rank, 2),
+            "平均ポイント": round(opponent.my_avg_point, 1),
+            "勝率": f"{opponent.beat_rate:.0%}",
+        }
+        for s in played
+        if s.player_id in found_profiles
+        for opponent in found_profiles[s.player_id].opponents
+    ],
+    columns=["本人", "相手", "同卓", "平均着順", "平均ポイント", "勝率"],
+)
+heatmap = (
+    alt.Chart(cells)
+    .mark_rect()
+    .encode(
+        x=alt.X("相手:N", sort=list(label_of.values()), title=None, axis=alt.Axis(orient="top", labelAngle=-45)),
+        y=alt.Y("本人:N", sort=order, title=None),
+        # 卓の真ん中の着順（4人なら2.5）を境に色を分ける
+        color=alt.Color(
+            "平均着順:Q",
+            scale=alt.Scale(
+                scheme="redyellowgreen", reverse=True, domainMid=(rules.player_count + 1) / 2
+            ),
+        ),
+        tooltip=["本人", "相手", "同卓", "平均着順", "平均ポイント", "勝率"],
+    )
+    # 1人ぶんの行を一定の高さに保つ。大人数でもマスが潰れない
+    .properties(height=max(160, 18 * len(order)))
+)
+st.altair_chart(heatmap, width="stretch")
 
 
 # --- 個人別 -----------------------------------------------------------------
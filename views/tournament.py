@@ -11,10 +11,9 @@ import streamlit as st
 
 from mahjong import session, ui
 from mahjong.errors import AppError
-from mahjong.repo import games as games_repo
 from mahjong.repo import groups as groups_repo
 from mahjong.repo import queries, tournaments as tournaments_repo
-from mahjong.stats import aggregate
+from mahjong.stats import from_tallies
 
 ui.show_flashes()
 group = session.require_group()
@@ -53,7 +52,7 @@ if warnings:
 st.markdown("### 📅 開催日")
 
 try:
-    days = tournaments_repo.list_days(tournament_id)
+    days = tournaments_repo.list_days_with_games(tournament_id)
 except AppError as exc:
     st.error(str(exc))
     st.stop()
@@ -75,13 +74,6 @@ with st.expander("🆕 開催日を追加", expanded=not days):
                 st.rerun()
 
 for day in days:
-    try:
-        day_games = games_repo.list_games(day["id"])
-    except AppError as exc:
-        st.error(str(exc))
-        day_games = []
-
-    rounds = sum(g["round_count"] for g in day_games)
     title = f"{day['held_on']}"
     if day.get("label"):
         title += f"（{day['label']}）"
@@ -90,7 +82,7 @@ for day in days:
         st.markdown(f"**{title}**")
         if day.get("note"):
             st.caption(day["note"])
-        st.caption(f"{len(day_games)}卓 ／ {rounds}半荘")
+        st.caption(f"{len(day['games'])}卓 ／ {day['round_count']}半荘")
         ui.link_button(
             "開く", "views/day.py", key=f"day_{day['id']}", primary=True,
             group=group["group_id"], tournament=tournament_id, day=day["id"],
@@ -101,19 +93,22 @@ for day in days:
 
 st.markdown("### 📊 この大会の成績")
 
-try:
-    entries = queries.fetch_entries("tournament_id", tournament_id)
-    names = groups_repo.player_names(group["group_id"])
-except AppError as exc:
-    st.error(str(exc))
-    st.stop()
+# 半荘数は上で読んだ卓の一覧から分かる。記録が無ければ成績は読みに行かない。
+total_rounds = sum(day["round_count"] for day in days)
 
-if not entries:
+if not total_rounds:
     st.info("まだ記録がありません。開催日を開いて卓を作りましょう。")
 else:
-    stats = aggregate(entries, names, rules)
+    try:
+        standings = queries.fetch_standings("tournament_id", tournament_id)
+        names = groups_repo.player_names(group["group_id"])
+    except AppError as exc:
+        st.error(str(exc))
+        st.stop()
+
+    stats = from_tallies(standings, names, rules)
     ui.stats_table(stats, rules, key="tournament_stats")
-    st.caption(f"全 {queries.count_rounds('tournament_id', tournament_id)} 半荘")
+    st.caption(f"全 {total_rounds} 半荘")
 
     ui.link_button(
         "📊 くわしい成績・グラフ", "views/stats.py", key="t_stats",
@@ -9,7 +9,7 @@ import streamlit as st
 
 from mahjong import session, ui
 from mahjong.errors import AppError
-from mahjong.repo import queries, tournaments as tournaments_repo
+from mahjong.repo import tournaments as tournaments_repo
 from mahjong.rules import DEFAULT_RULESET, load_ruleset
 from mahjong.timeutil import format_jst
 
@@ -19,7 +19,7 @@ group = session.require_group()
 st.title("🏆 大会")
 
 try:
-    tournaments = tournaments_repo.list_tournaments(group["group_id"])
+    tournaments = tournaments_repo.list_tournament_overview(group["group_id"])
 except AppError as exc:
     st.error(str(exc))
     st.stop()
@@ -75,17 +75,14 @@ for tournament in tournaments:
         if warnings:
             st.warning("ルール設定に不備があったため補正して表示しています: " + " / ".join(warnings))
 
-        try:
-            days = tournaments_repo.list_days(tournament["id"])
-            rounds = queries.count_rounds("tournament_id", tournament["id"])
-        except AppError as exc:
-            st.error(str(exc))
-            days, rounds = [], 0
-
         col1, col2, col3 = st.columns(3)
-        col1.metric("開催日", len(days))
-        col2.metric("半荘", rounds)
+        col1.metric("開催日", tournament["day_count"])
+        col2.metric("半荘", tournament["round_count"])
         col3.metric("作成", format_jst(tournament["created_at"], "%y/%m/%d"))
+        if tournament.get("last_played_on"):
+            st.caption(
+                f"参加 {tournament['player_count']} 人 ・ 最終開催 {tournament['last_played_on']}"
+            )
 
         ui.link_button(
             "開く", "views/tournament.py", key=f"open_{tournament['id']}", primary=True,